@@ -0,0 +1,274 @@
+"""Offline analysis of saved simulation data.
+
+Frames saved by :class:`crowddynamics.io.TrajectoryStore` are streamed chunk
+by chunk and reduced into quantities such as density, flow and speed by
+reducers. Spans of frames are processed in parallel and the results are
+merged into columns.
+
+Examples:
+    >>> results = analyse('.', OrderedDict([
+    >>>     ('speed', ('mean_speed', {})),
+    >>>     ('flow', ('line_crossing', {'line': ((0, 0), (0, 10))})),
+    >>>     ('density', ('density_voronoi', {'region': polygon})),
+    >>> ]), output='.')
+"""
+import multiprocessing
+from collections import OrderedDict
+
+import numpy as np
+from scipy.spatial import Voronoi
+from shapely.geometry import Polygon
+from shapely.vectorized import contains
+
+from crowddynamics.core.quantities import voronoi_finite_polygons_2d
+from crowddynamics.io import TrajectoryReader, save_columns
+
+REDUCERS = OrderedDict()
+
+
+def reducer(name):
+    """Register function as reducer. Reducer is called for each frame as
+    ``function(frame, previous, **params)`` where ``frame`` is the decoded
+    frame of agents and ``previous`` is the previous frame or None for the
+    first frame. Reducer returns a number or a dictionary of numbers.
+
+    Args:
+        name (str): Name of the reducer.
+    """
+    def decorator(function):
+        REDUCERS[name] = function
+        return function
+    return decorator
+
+
+def _active(frame):
+    if 'active' in frame.dtype.names:
+        return frame[frame['active']]
+    return frame
+
+
+@reducer('active')
+def count_active(frame, previous):
+    """Number of active agents. Exit curve is the number of agents minus the
+    number of active agents."""
+    return len(_active(frame))
+
+
+@reducer('count')
+def count_in_regions(frame, previous, regions):
+    """Number of active agents inside each region.
+
+    Args:
+        regions (List[Polygon]):
+    """
+    position = _active(frame)['position']
+    return OrderedDict(
+        (str(i), int(np.sum(contains(region, position[:, 0], position[:, 1]))))
+        for i, region in enumerate(regions))
+
+
+@reducer('mean_speed')
+def mean_speed(frame, previous, region=None):
+    """Mean speed of active agents, optionally inside a region.
+
+    Args:
+        region (Polygon, optional):
+    """
+    agents = _active(frame)
+    if region is not None:
+        position = agents['position']
+        agents = agents[contains(region, position[:, 0], position[:, 1])]
+    if len(agents) == 0:
+        return np.nan
+    return float(np.mean(np.hypot(agents['velocity'][:, 0],
+                                  agents['velocity'][:, 1])))
+
+
+@reducer('density_voronoi')
+def density_voronoi(frame, previous, region):
+    r"""Voronoi density inside a region. [Steffen2010]_
+
+    .. math::
+        D_V = \frac{1}{|A|} \sum_{i} \frac{|A \cap A_i|}{|A_i|}
+
+    Voronoi cells are clipped to the bounding box of the positions and the
+    region.
+
+    Args:
+        region (Polygon):
+    """
+    points = _active(frame)['position']
+    if len(points) < 3:
+        return np.nan
+    vor = Voronoi(points)
+    regions, vertices = voronoi_finite_polygons_2d(vor)
+    minx, miny, maxx, maxy = region.bounds
+    xmin, ymin = np.minimum(points.min(axis=0), (minx, miny))
+    xmax, ymax = np.maximum(points.max(axis=0), (maxx, maxy))
+    bounds = Polygon(((xmin, ymin), (xmin, ymax), (xmax, ymax), (xmax, ymin)))
+    density = 0.0
+    for indices in regions:
+        cell = Polygon(vertices[indices]) & bounds
+        if cell.area > 0:
+            density += (cell & region).area / cell.area
+    return density / region.area
+
+
+@reducer('line_crossing')
+def line_crossing(frame, previous, line):
+    """Number of agents that crossed a line segment between the previous and
+    the current frame. Crossings to the left side of the line from its start
+    point to its end point are positive and to the right side negative.
+
+    Args:
+        line: Start and end points of the line ``((x0, y0), (x1, y1))``.
+    """
+    if previous is None:
+        return OrderedDict([('positive', 0), ('negative', 0)])
+    mask = previous['active'] & frame['active'] \
+        if 'active' in frame.dtype.names else slice(None)
+    p0, p1 = previous['position'][mask], frame['position'][mask]
+    (a, b) = np.asarray(line, dtype=np.float64)
+    u = b - a
+
+    def side(p):
+        return u[0] * (p[:, 1] - a[1]) - u[1] * (p[:, 0] - a[0])
+
+    def cross(w):
+        v = p1 - p0
+        return v[:, 0] * w[:, 1] - v[:, 1] * w[:, 0]
+
+    s0, s1 = side(p0), side(p1)
+    # Line of the movement of the agent separates the end points of the line
+    within = cross(a - p0) * cross(b - p0) <= 0
+    return OrderedDict([
+        ('positive', int(np.sum(within & (s0 <= 0) & (s1 > 0)))),
+        ('negative', int(np.sum(within & (s0 > 0) & (s1 <= 0))))])
+
+
+def iter_frames(reader, start=0, stop=None):
+    """Iterate decoded frames chunk by chunk.
+
+    Args:
+        reader (TrajectoryReader):
+        start (int):
+        stop (int, optional):
+
+    Yields:
+        (int, numpy.ndarray): Tuple of (frame index, frame)
+    """
+    stop = len(reader) if stop is None else min(stop, len(reader))
+    for chunk, first, last in reader.spans(start, stop):
+        frames = reader.decode(reader.read(chunk, first, last))
+        offset = int(reader.starts[chunk])
+        for i, frame in enumerate(frames):
+            yield offset + first + i, frame
+
+
+def _columns(name, value):
+    if isinstance(value, dict):
+        return [('{}_{}'.format(name, key), v) for key, v in value.items()]
+    return [(name, value)]
+
+
+def reduce_frames(reader, reducers, start=0, stop=None):
+    """Apply reducers to frames from start to stop.
+
+    Args:
+        reader (TrajectoryReader):
+        reducers (OrderedDict):
+            Mapping of name to tuple of (reducer, params) where reducer is
+            the name of a registered reducer or a function.
+        start (int):
+        stop (int, optional):
+
+    Returns:
+        OrderedDict: Columns ``frame`` and ``time`` and the columns of the
+        reducers.
+    """
+    functions = [(name, REDUCERS.get(function, function), params)
+                 for name, (function, params) in reducers.items()]
+    previous = None
+    if start > 0:
+        chunk, offset = reader.locate(start - 1)
+        previous = reader.decode(reader.read(chunk, offset, offset + 1))[0]
+
+    rows = []
+    for index, frame in iter_frames(reader, start, stop):
+        row = [('frame', index), ('time', reader.time[index])]
+        for name, function, params in functions:
+            row.extend(_columns(name, function(frame, previous, **params)))
+        rows.append(row)
+        previous = frame
+
+    if not rows:
+        return OrderedDict()
+    return OrderedDict(
+        (key, np.array([row[i][1] for row in rows]))
+        for i, (key, _) in enumerate(rows[0]))
+
+
+def _reduce_span(args):
+    directory, basename, reducers, start, stop = args
+    reader = TrajectoryReader(directory, basename)
+    return reduce_frames(reader, reducers, start, stop)
+
+
+def analyse(directory, reducers, basename='agents', output=None,
+            output_basename='analysis', processes=None, frames_per_task=None):
+    """Analyse saved frames in parallel. Frames are split into spans that
+    are reduced in a process pool and merged in order.
+
+    Args:
+        directory (str|Path): Directory of the saved frames.
+        reducers (OrderedDict):
+            Mapping of name to tuple of (reducer, params). Reducers that
+            are not registered must be picklable.
+        basename (str):
+        output (str|Path, optional):
+            Directory where results are saved using
+            :func:`crowddynamics.io.save_columns`.
+        output_basename (str):
+        processes (int, optional):
+            Number of processes. Defaults to number of CPUs. If 1 frames are
+            analysed in the current process.
+        frames_per_task (int, optional):
+            Number of frames in one task. Defaults to the chunks of the
+            store.
+
+    Returns:
+        OrderedDict: Mapping of column name to numpy.ndarray.
+    """
+    reader = TrajectoryReader(directory, basename)
+    if frames_per_task is None:
+        bounds = reader.starts
+    else:
+        bounds = np.append(np.arange(0, len(reader), frames_per_task),
+                           len(reader))
+    tasks = [(directory, basename, reducers, int(start), int(stop))
+             for start, stop in zip(bounds[:-1], bounds[1:]) if stop > start]
+
+    if processes == 1:
+        parts = [reduce_frames(reader, reducers, start, stop)
+                 for _, _, _, start, stop in tasks]
+    else:
+        with multiprocessing.Pool(processes) as pool:
+            parts = pool.map(_reduce_span, tasks, chunksize=1)
+
+    parts = [part for part in parts if part]
+    if not parts:
+        return OrderedDict()
+    results = OrderedDict(
+        (key, np.concatenate([part[key] for part in parts]))
+        for key in parts[0])
+
+    if output is not None:
+        storage = save_columns(output, output_basename,
+                               buffer_size=len(results['frame']))
+        storage.send(None)
+        for i in range(len(results['frame'])):
+            storage.send(OrderedDict((key, values[i])
+                                     for key, values in results.items()))
+            storage.send(i == len(results['frame']) - 1)
+
+    return results
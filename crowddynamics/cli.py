@@ -50,11 +50,19 @@ def list_of_simulations():
 @click.option('--directory', '-d', default='.')
 @click.option('--basename', '-n')
 def concat_npy(directory, basename):
-    import numpy as np
-    from crowddynamics.io import load_npy_concatenated
+    from crowddynamics.io import concatenate_npy
     path = os.path.abspath(directory)
-    arr = load_npy_concatenated(path, basename)
-    np.save(os.path.join(path, basename + '.npy'), arr)
+    concatenate_npy(path, basename, os.path.join(path, basename + '.npy'))
+
+
+@main.command()
+@click.option('--directory', '-d', default='.')
+@click.option('--basename', '-n', default='data')
+def export_csv(directory, basename):
+    """Export binary columnar data into csv file."""
+    from crowddynamics.io import columns_to_csv
+    path = os.path.abspath(directory)
+    columns_to_csv(path, basename, os.path.join(path, basename + '.csv'))
 
 
 @main.group(chain=True)
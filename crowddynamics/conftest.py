@@ -4,6 +4,7 @@ import numpy as np
 import pytest
 
 from crowddynamics.core.vector2D import unit_vector
+from crowddynamics.examples.simulations import Hallway
 from crowddynamics.simulation.agents import Agents, Circular, ThreeCircle, \
     AgentGroup
 
@@ -36,3 +37,9 @@ def agents_three_circle(size=10):
     agents.add_non_overlapping_group(
         group, position_gen=lambda: np.random.uniform(-10.0, 10.0, 2))
     return agents
+
+
+@pytest.fixture(scope='function')
+def hallway():
+    """Hallway example simulation"""
+    return Hallway()
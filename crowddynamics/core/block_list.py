@@ -51,10 +51,30 @@ Algorithm
 4. Crate array ``offset`` from cumulative sum of counts to track the starting
    index of indices in ``index_list`` array when querying agents in each block.
 
+Spatial hash
+
+Block list above requires all the points beforehand. Spatial hash supports
+inserting points one by one and querying the neighbourhood of a point in
+compiled code.
+
+1. Block index :math:`\mathbf{l}_i` of the point is hashed to one of the
+   buckets of the ``head`` array.
+2. ``head`` stores the last index inserted to the bucket and ``successor``
+   stores the index inserted to the same bucket before it (or :math:`-1`),
+   which forms a linked list of the indices in each bucket.
+3. ``cells`` stores the block index of each point which is used for
+   filtering out the points of other blocks hashed to the same bucket.
+
 """
 from collections import defaultdict, MutableSequence
 from itertools import product
 
+import numba
+import numpy as np
+from numba import void, i8, f8
+
+EMPTY = -1
+
 
 class MutableBlockList(object):
     """Mutable blocklist (or spatial grid hash) implementation.
@@ -147,3 +167,176 @@ class MutableBlockList(object):
 
     def __str__(self):
         return self._str
+
+
+@numba.jit(i8(i8, i8, i8), nopython=True, nogil=True, cache=True)
+def _bucket(i, j, buckets):
+    """Hash of the block index"""
+    return ((i * 73856093) ^ (j * 19349663)) % buckets
+
+
+@numba.jit(void(i8[:], i8[:], i8[:, :], i8),
+           nopython=True, nogil=True, cache=True)
+def _rehash(head, successor, cells, size):
+    head[:] = EMPTY
+    for index in range(size):
+        b = _bucket(cells[index, 0], cells[index, 1], len(head))
+        successor[index] = head[b]
+        head[b] = index
+
+
+@numba.jit(void(i8[:], i8[:], i8[:, :], f8, f8[:], i8),
+           nopython=True, nogil=True, cache=True)
+def spatial_hash_insert(head, successor, cells, cell_size, point, index):
+    """Insert point to spatial hash
+
+    Args:
+        head (numpy.ndarray): Last index inserted to each bucket
+        successor (numpy.ndarray): Next index in the same bucket
+        cells (numpy.ndarray): Block index of each point
+        cell_size (float):
+        point (numpy.ndarray):
+        index (int): Index of the point. Must be smaller than the capacity
+            of ``successor`` and ``cells``.
+    """
+    i = np.int64(np.floor(point[0] / cell_size))
+    j = np.int64(np.floor(point[1] / cell_size))
+    cells[index, 0] = i
+    cells[index, 1] = j
+    b = _bucket(i, j, len(head))
+    successor[index] = head[b]
+    head[b] = index
+
+
+@numba.jit(i8(i8[:], i8[:], i8[:, :], f8, f8[:], i8, i8[:]),
+           nopython=True, nogil=True, cache=True)
+def spatial_hash_nearest(head, successor, cells, cell_size, point, radius,
+                         out):
+    """Indices of the points in the neighbouring blocks of the point
+
+    Args:
+        head (numpy.ndarray):
+        successor (numpy.ndarray):
+        cells (numpy.ndarray):
+        cell_size (float):
+        point (numpy.ndarray):
+        radius (int): Radius of the neighbourhood in blocks
+        out (numpy.ndarray): Array where indices are stored. Must be large
+            enough to fit the indices, for example of the size of
+            ``successor``.
+
+    Returns:
+        int: Number of indices stored in ``out``.
+    """
+    i = np.int64(np.floor(point[0] / cell_size))
+    j = np.int64(np.floor(point[1] / cell_size))
+    count = 0
+    for ci in range(i - radius, i + radius + 1):
+        for cj in range(j - radius, j + radius + 1):
+            index = head[_bucket(ci, cj, len(head))]
+            while index != EMPTY:
+                if cells[index, 0] == ci and cells[index, 1] == cj:
+                    out[count] = index
+                    count += 1
+                index = successor[index]
+    return count
+
+
+class SpatialHash(object):
+    """Dynamic spatial hash (or spatial grid hash) of two dimensional points.
+
+    Points are indexed in the order they are inserted. Arrays ``head``,
+    ``successor`` and ``cells`` can be passed to :func:`spatial_hash_insert`
+    and :func:`spatial_hash_nearest` in compiled code as long as ``size`` is
+    updated accordingly.
+
+    >>> spatial_hash = SpatialHash(cell_size=0.6)
+    >>> spatial_hash.insert((0.0, 0.0))
+    >>> spatial_hash.nearest((0.5, 0.5))
+
+    """
+
+    def __init__(self, cell_size, capacity=0, buckets=1024):
+        """Initialize
+
+        Args:
+            cell_size (float):
+            capacity (int): Initial number of points that can be inserted
+            buckets (int): Initial number of buckets. Number of buckets is
+                grown to match the capacity.
+        """
+        assert cell_size > 0
+        assert buckets > 0
+
+        self.cell_size = cell_size
+        self.size = 0
+        self.head = np.full(buckets, EMPTY, dtype=np.int64)
+        self.successor = np.zeros(0, dtype=np.int64)
+        self.cells = np.zeros((0, 2), dtype=np.int64)
+        self.reserve(capacity)
+
+    def reserve(self, capacity):
+        """Grow arrays to fit at least capacity points
+
+        Args:
+            capacity (int):
+        """
+        if capacity <= len(self.successor):
+            return
+        extra = capacity - len(self.successor)
+        self.successor = np.concatenate(
+            (self.successor, np.zeros(extra, dtype=np.int64)))
+        self.cells = np.concatenate(
+            (self.cells, np.zeros((extra, 2), dtype=np.int64)))
+        if capacity > len(self.head):
+            # Keep the lists in the buckets short
+            buckets = 1 << int(capacity - 1).bit_length()
+            self.head = np.full(buckets, EMPTY, dtype=np.int64)
+            _rehash(self.head, self.successor, self.cells, self.size)
+
+    def shrink(self, capacity):
+        """Shrink arrays to fit capacity points. Inserted points are kept.
+
+        Args:
+            capacity (int):
+        """
+        capacity = max(capacity, self.size)
+        self.successor = self.successor[:capacity].copy()
+        self.cells = self.cells[:capacity].copy()
+
+    def insert(self, point):
+        """Insert point
+
+        Args:
+            point: Iterable of two numbers
+
+        Returns:
+            int: Index of the point
+        """
+        if self.size == len(self.successor):
+            self.reserve(max(2 * self.size, 16))
+        index = self.size
+        spatial_hash_insert(self.head, self.successor, self.cells,
+                            self.cell_size, np.asarray(point, np.float64),
+                            index)
+        self.size += 1
+        return index
+
+    def nearest(self, point, radius=1):
+        """Indices of the points in the neighbouring blocks
+
+        Args:
+            point: Iterable of two numbers
+            radius (int):
+
+        Returns:
+            numpy.ndarray:
+        """
+        out = np.zeros(self.size, dtype=np.int64)
+        count = spatial_hash_nearest(
+            self.head, self.successor, self.cells, self.cell_size,
+            np.asarray(point, np.float64), radius, out)
+        return out[:count]
+
+    def __len__(self):
+        return self.size
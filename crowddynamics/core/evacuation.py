@@ -7,7 +7,7 @@ from crowddynamics.core.geom2D import line_intersect
 from crowddynamics.core.sensory_region import is_obstacle_between_points
 from crowddynamics.core.structures import obstacle_type_linear
 from crowddynamics.core.vector2D import length
-from numba import i8, f8, optional
+from numba import void, i1, i8, f8, b1, optional
 
 from crowddynamics.simulation.agents import NO_TARGET
 
@@ -134,6 +134,69 @@ def agent_closer_to_exit(c_door, position):
     return num
 
 
+@numba.jit(b1(i8[:], f8[:], i8), nopython=True, nogil=True, cache=True)
+def repair_order(order, values, max_shifts):
+    """Insertion sort of indices ``order`` so that ``values[order]`` is
+    ascending. Runs in :math:`O(N + I)` time where :math:`I` is the number of
+    inversions, which is small when values change little between calls.
+
+    Args:
+        order (numpy.ndarray): Permutation of indices of the values.
+        values (numpy.ndarray):
+        max_shifts (int): Maximum number of shifts before giving up.
+
+    Returns:
+        bool: True if order was sorted and False if the number of shifts
+        exceeded ``max_shifts``. Order is a valid permutation in both cases.
+    """
+    shifts = 0
+    for k in range(1, len(order)):
+        i = order[k]
+        v = values[i]
+        m = k - 1
+        while m >= 0 and values[order[m]] > v:
+            order[m + 1] = order[m]
+            m -= 1
+            shifts += 1
+        order[m + 1] = i
+        if shifts > max_shifts:
+            return False
+    return True
+
+
+@numba.jit(void(f8[:, :], f8[:, :], b1[:], i8[:, :], i8[:, :]),
+           nopython=True, nogil=True, cache=True)
+def agents_closer_to_exits(c_doors, position, active, order, out):
+    r"""Incremental version of :func:`agent_closer_to_exit` for multiple exits.
+    Order of the agents by distance from each exit from the previous call is
+    repaired using insertion sort instead of sorting from scratch. If the
+    order has changed too much the agents are sorted using merge sort.
+    Inactive agents are ordered last.
+
+    Args:
+        c_doors (numpy.ndarray): Centers of the exits, shape (E, 2).
+        position (numpy.ndarray): Positions of the agents, shape (N, 2).
+        active (numpy.ndarray): Boolean mask of active agents.
+        order (numpy.ndarray): Indices of the agents sorted by the distance
+            from each exit, shape (E, N). Updated in place.
+        out (numpy.ndarray): Number of agents closer to each exit, shape
+            (N, E).
+    """
+    n = len(position)
+    distances = np.empty(n)
+    for e in range(len(c_doors)):
+        for i in range(n):
+            if active[i]:
+                distances[i] = np.hypot(c_doors[e, 0] - position[i, 0],
+                                        c_doors[e, 1] - position[i, 1])
+            else:
+                distances[i] = np.inf
+        if not repair_order(order[e], distances, 8 * n + 64):
+            order[e, :] = np.argsort(distances, kind='mergesort')
+        for k in range(n):
+            out[order[e, k], e] = k
+
+
 @numba.jit((f8[:, :], f8[:, :], typeof(obstacle_type_linear)[:], f8),
            nopython=True, nogil=True, cache=True)
 def exit_detection(center_door, position, obstacles, detection_range):
@@ -172,3 +235,53 @@ def exit_detection(center_door, position, obstacles, detection_range):
                 has_detected[i] = True
 
     return detected_exit, has_detected
+
+
+@numba.jit(i1[:, :](f8[:, :], f8[:, :], b1[:], typeof(obstacle_type_linear)[:],
+                    i8[:], i8),
+           nopython=True, nogil=True, cache=True)
+def line_crossings(previous, current, active, lines, line_index, n_lines):
+    """Detect agents that crossed lines between the previous and the current
+    positions. Crossing to the left side of the line from ``p0`` to ``p1``
+    has sign 1 and to the right side sign -1. Segments outside of the bounding
+    box of the movement are skipped before the exact intersection test.
+
+    Args:
+        previous (numpy.ndarray): Previous positions of the agents.
+        current (numpy.ndarray): Current positions of the agents.
+        active (numpy.ndarray): Boolean mask of agents that are measured.
+        lines (numpy.ndarray): Line segments.
+        line_index (numpy.ndarray): Index of the line each segment belongs
+            to. Lines can consist of multiple segments.
+        n_lines (int): Number of lines.
+
+    Returns:
+        numpy.ndarray: Array of shape (len(current), n_lines) of signs of
+        the crossings and zero if agent did not cross the line.
+    """
+    out = np.zeros((len(current), n_lines), dtype=np.int8)
+    for k in range(len(lines)):
+        a, b = lines[k]['p0'], lines[k]['p1']
+        xmin, xmax = min(a[0], b[0]), max(a[0], b[0])
+        ymin, ymax = min(a[1], b[1]), max(a[1], b[1])
+        ux, uy = b[0] - a[0], b[1] - a[1]
+        for i in range(len(current)):
+            if not active[i]:
+                continue
+            p0, p1 = previous[i], current[i]
+            if max(p0[0], p1[0]) < xmin or min(p0[0], p1[0]) > xmax or \
+                    max(p0[1], p1[1]) < ymin or min(p0[1], p1[1]) > ymax:
+                continue
+            s0 = ux * (p0[1] - a[1]) - uy * (p0[0] - a[0])
+            s1 = ux * (p1[1] - a[1]) - uy * (p1[0] - a[0])
+            # Agents on the line are counted on the right side so that
+            # crossing is counted only once.
+            if s0 <= 0 < s1:
+                sign = 1
+            elif s1 <= 0 < s0:
+                sign = -1
+            else:
+                continue
+            if line_intersect(p0, p1, a, b):
+                out[i, line_index[k]] = sign
+    return out
@@ -8,6 +8,7 @@ from functools import reduce
 from itertools import chain
 from typing import Callable
 
+import numba
 import numpy as np
 import shapely.geometry as geometry
 import skimage.draw
@@ -96,10 +97,76 @@ def geom_to_linesegment(geom: BaseGeometry):
         raise TypeError('Argument is not subclass of {}'.format(BaseGeometry))
 
 
+def _linear_coords(geom: BaseGeometry, exteriors=True):
+    """Coordinates of the linear parts of the geometry in the same order as
+    :func:`geom_to_linesegment`."""
+    if isinstance(geom, Point):
+        return
+    elif isinstance(geom, LineString):
+        yield np.asarray(geom.coords)
+    elif isinstance(geom, Polygon):
+        if exteriors:
+            yield np.asarray(geom.exterior.coords)
+    elif isinstance(geom, BaseMultipartGeometry):
+        for geo in geom:
+            yield from _linear_coords(geo, exteriors)
+    else:
+        raise TypeError('Argument is not subclass of {}'.format(BaseGeometry))
+
+
+def _coords_to_segments(coords):
+    """Array of vertices of shape (n, 2) to array of line segments of shape
+    (n-1, 2, 2)."""
+    coords = np.asarray(coords, dtype=np.float64)[:, :2]
+    return np.stack((coords[:-1], coords[1:]), axis=1)
+
+
+def _pack_segments(segments):
+    """Concatenates arrays of line segments into structured array of dtype
+    ``obstacle_type_linear``."""
+    segments = [s for s in segments if len(s)]
+    if not segments:
+        return np.zeros(0, dtype=obstacle_type_linear)
+    array = np.ascontiguousarray(np.concatenate(segments), dtype=np.float64)
+    return array.reshape((-1, 4)).view(obstacle_type_linear).reshape(-1)
+
+
 def geom_to_linear_obstacles(geom):
     """Converts shape(s) to array of linear obstacles."""
-    segments = [] if geom is None else list(geom_to_linesegment(geom))
-    return np.array(segments, dtype=obstacle_type_linear)
+    if geom is None:
+        return np.zeros(0, dtype=obstacle_type_linear)
+    return _pack_segments(map(_coords_to_segments, _linear_coords(geom)))
+
+
+def _polygons(geom: BaseGeometry):
+    if isinstance(geom, Polygon):
+        yield geom
+    elif isinstance(geom, BaseMultipartGeometry):
+        for geo in geom:
+            yield from _polygons(geo)
+
+
+def geom_to_polygon_edges(geom: BaseGeometry):
+    """Converts polygons in geometry into an array of the edges of their
+    exteriors and interiors.
+
+    Args:
+        geom (BaseGeometry):
+
+    Returns:
+        (numpy.ndarray, numpy.ndarray):
+            Array of edges of dtype ``obstacle_type_linear`` and array of
+            offsets such that edges of polygon ``k`` are
+            ``edges[offsets[k]:offsets[k+1]]``.
+    """
+    edges = []
+    offsets = [0]
+    for polygon in ([] if geom is None else _polygons(geom)):
+        rings = [polygon.exterior] + list(polygon.interiors)
+        segments = [_coords_to_segments(ring.coords) for ring in rings]
+        edges.extend(segments)
+        offsets.append(offsets[-1] + sum(map(len, segments)))
+    return _pack_segments(edges), np.array(offsets, dtype=np.int64)
 
 
 def draw_geom(geom: BaseGeometry,
@@ -130,6 +197,224 @@ def draw_geom(geom: BaseGeometry,
         raise TypeError
 
 
+# Rasterization
+
+
+def _grid_coordinates(segments, origin, step):
+    """Segments of dtype ``obstacle_type_linear`` into continuous grid index
+    coordinates of shape (n, 2, 2)."""
+    array = np.ascontiguousarray(segments).view(np.float64).reshape((-1, 2, 2))
+    return (array - np.asarray(origin, dtype=np.float64)) / step
+
+
+@numba.jit(nopython=True, nogil=True, cache=True)
+def _set_cell(grid, i, j, value):
+    if 0 <= j < grid.shape[0] and 0 <= i < grid.shape[1]:
+        grid[j, i] = value
+
+
+@numba.jit(nopython=True, nogil=True, cache=True)
+def _blend_cell(grid, i, j, value):
+    if 0 <= j < grid.shape[0] and 0 <= i < grid.shape[1]:
+        grid[j, i] = max(grid[j, i], value)
+
+
+@numba.jit(nopython=True, nogil=True, cache=True)
+def _draw_line(grid, r0, c0, r1, c1, value):
+    """Bresenham's line algorithm between integer indices. Draws same cells as
+    ``skimage.draw.line(r0, c0, r1, c1)`` into ``grid[c, r]``."""
+    steep = False
+    r, c = r0, c0
+    dr, dc = abs(r1 - r0), abs(c1 - c0)
+    sc = 1 if c1 - c > 0 else -1
+    sr = 1 if r1 - r > 0 else -1
+    if dr > dc:
+        steep = True
+        c, r = r, c
+        dc, dr = dr, dc
+        sc, sr = sr, sc
+    d = 2 * dr - dc
+    for _ in range(dc):
+        if steep:
+            _set_cell(grid, c, r, value)
+        else:
+            _set_cell(grid, r, c, value)
+        while d >= 0:
+            r += sr
+            d -= 2 * dc
+        c += sc
+        d += 2 * dr
+    _set_cell(grid, r1, c1, value)
+
+
+@numba.jit(nopython=True, nogil=True, cache=True)
+def _draw_line_aa(grid, x0, y0, x1, y1, value):
+    """Xiaolin Wu's anti-aliased line algorithm between continuous index
+    coordinates. Value of a cell is the maximum of its current value and
+    ``value`` times the coverage of the line."""
+    steep = abs(y1 - y0) > abs(x1 - x0)
+    if steep:
+        x0, y0 = y0, x0
+        x1, y1 = y1, x1
+    if x0 > x1:
+        x0, x1 = x1, x0
+        y0, y1 = y1, y0
+    dx = x1 - x0
+    gradient = (y1 - y0) / dx if dx > 0 else 0.0
+    for x in range(int(np.round(x0)), int(np.round(x1)) + 1):
+        y = y0 + gradient * (x - x0)
+        y_floor = np.floor(y)
+        frac = y - y_floor
+        y_int = int(y_floor)
+        if steep:
+            _blend_cell(grid, y_int, x, value * (1.0 - frac))
+            _blend_cell(grid, y_int + 1, x, value * frac)
+        else:
+            _blend_cell(grid, x, y_int, value * (1.0 - frac))
+            _blend_cell(grid, x, y_int + 1, value * frac)
+
+
+@numba.jit(nopython=True, nogil=True, cache=True)
+def _draw_segments(grid, segments, value):
+    for k in range(len(segments)):
+        # Truncation like the meshgrid indicer
+        _draw_line(grid,
+                   np.int64(segments[k, 0, 0]), np.int64(segments[k, 0, 1]),
+                   np.int64(segments[k, 1, 0]), np.int64(segments[k, 1, 1]),
+                   value)
+
+
+@numba.jit(nopython=True, nogil=True, cache=True)
+def _draw_segments_aa(grid, segments, value):
+    for k in range(len(segments)):
+        _draw_line_aa(grid, segments[k, 0, 0], segments[k, 0, 1],
+                      segments[k, 1, 0], segments[k, 1, 1], value)
+
+
+@numba.jit(nopython=True, nogil=True, cache=True)
+def _fill_polygon(grid, edges, value):
+    """Scanline fill of the grid points inside the polygon using even-odd
+    rule."""
+    n_rows, n_cols = grid.shape
+    ymin, ymax = np.inf, -np.inf
+    for k in range(len(edges)):
+        ymin = min(ymin, edges[k, 0, 1], edges[k, 1, 1])
+        ymax = max(ymax, edges[k, 0, 1], edges[k, 1, 1])
+    j0 = max(int(np.ceil(ymin)), 0)
+    j1 = min(int(np.ceil(ymax)), n_rows)
+    if j1 <= j0:
+        return
+
+    # Count the edge crossings of each row. Rows j in the half open interval
+    # [ceil(ya), ceil(yb)) cross the edge, which counts vertices only once.
+    counts = np.zeros(j1 - j0 + 1, dtype=np.int64)
+    for k in range(len(edges)):
+        ya, yb = edges[k, 0, 1], edges[k, 1, 1]
+        if ya > yb:
+            ya, yb = yb, ya
+        start = max(int(np.ceil(ya)), j0)
+        end = min(int(np.ceil(yb)), j1)
+        for j in range(start, end):
+            counts[j - j0 + 1] += 1
+    offsets = np.cumsum(counts)
+
+    # Compute the crossings
+    xs = np.empty(offsets[-1], dtype=np.float64)
+    filled = np.copy(offsets[:-1])
+    for k in range(len(edges)):
+        xa, ya = edges[k, 0, 0], edges[k, 0, 1]
+        xb, yb = edges[k, 1, 0], edges[k, 1, 1]
+        if ya == yb:
+            continue
+        start = max(int(np.ceil(min(ya, yb))), j0)
+        end = min(int(np.ceil(max(ya, yb))), j1)
+        slope = (xb - xa) / (yb - ya)
+        for j in range(start, end):
+            xs[filled[j - j0]] = xa + (j - ya) * slope
+            filled[j - j0] += 1
+
+    # Fill between the pairs of crossings
+    for j in range(j0, j1):
+        row = np.sort(xs[offsets[j - j0]:offsets[j - j0 + 1]])
+        for p in range(0, len(row) - 1, 2):
+            start = max(int(np.ceil(row[p])), 0)
+            end = min(int(np.floor(row[p + 1])), n_cols - 1)
+            for i in range(start, end + 1):
+                grid[j, i] = value
+
+
+@numba.jit(nopython=True, nogil=True, cache=True)
+def _fill_polygons(grid, edges, offsets, value):
+    for k in range(len(offsets) - 1):
+        _fill_polygon(grid, edges[offsets[k]:offsets[k + 1]], value)
+
+
+def draw_segments(segments, grid, origin, step, value, antialiased=False):
+    """Draws line segments into grid.
+
+    Args:
+        segments (numpy.ndarray):
+            Array of dtype ``obstacle_type_linear``, for example from
+            :func:`geom_to_linear_obstacles`.
+        grid (numpy.ndarray):
+            Grid indexed ``grid[j, i]`` where ``i`` is x-index and ``j`` is
+            y-index.
+        origin (tuple): Coordinates ``(minx, miny)`` of the grid point (0, 0).
+        step (float): Step size of the grid.
+        value: Value to draw.
+        antialiased (bool):
+            Draws coverage weighted values ``max(grid, coverage * value)``
+            instead of setting the value. Grid should be float array.
+    """
+    if len(segments):
+        kernel = _draw_segments_aa if antialiased else _draw_segments
+        kernel(grid, _grid_coordinates(segments, origin, step), value)
+
+
+def fill_polygons(edges, offsets, grid, origin, step, value):
+    """Fills the grid points inside polygons. Holes are left untouched.
+
+    Args:
+        edges (numpy.ndarray):
+        offsets (numpy.ndarray):
+            Edges and offsets from :func:`geom_to_polygon_edges`.
+        grid (numpy.ndarray):
+        origin (tuple):
+        step (float):
+        value:
+    """
+    if len(edges):
+        _fill_polygons(grid, _grid_coordinates(edges, origin, step), offsets,
+                       value)
+
+
+def rasterize(geom: BaseGeometry, grid, origin, step, value,
+              antialiased=False):
+    """Draw geometry into grid. Faster alternative to :func:`draw_geom` which
+    converts the geometry into packed arrays of segments and draws them in
+    compiled code.
+
+    - ``Point`` is ignored
+    - ``LineString`` draws the cells along the line segments
+    - ``Polygon`` fills the grid points inside the polygon and draws the cells
+      along the exterior and interiors
+
+    Args:
+        geom (BaseGeometry):
+        grid (numpy.ndarray):
+        origin (tuple): Coordinates ``(minx, miny)`` of the grid point (0, 0).
+        step (float): Step size of the grid.
+        value: Value to draw.
+        antialiased (bool): Anti-aliased coverage of the lines.
+    """
+    edges, offsets = geom_to_polygon_edges(geom)
+    fill_polygons(edges, offsets, grid, origin, step, value)
+    draw_segments(edges, grid, origin, step, value, antialiased)
+    lines = _pack_segments(map(_coords_to_segments,
+                               _linear_coords(geom, exteriors=False)))
+    draw_segments(lines, grid, origin, step, value, antialiased)
+
+
 def union(*geoms):
     """Union of geometries"""
     return reduce(lambda x, y: x | y, geoms)
@@ -28,7 +28,7 @@ Interactions between agents and obstacles
 import numba
 import numpy as np
 from cell_lists import add_to_cells, neighboring_cells, iter_nearest_neighbors
-from numba import void, i8, typeof
+from numba import void, i8, f8, typeof
 
 from crowddynamics.core.distance import distance_circles, \
     distance_circle_line, distance_three_circle_line, distance_three_circles
@@ -37,7 +37,7 @@ from crowddynamics.core.motion.power_law import \
     force_social_circular, force_social_three_circle
 from crowddynamics.core.structures import obstacle_type_linear
 from crowddynamics.core.vector2D import rotate270, cross
-from crowddynamics.exceptions import InvalidType
+from crowddynamics.exceptions import InvalidType, InvalidValue
 from crowddynamics.simulation.agents import agent_type_circular, \
     agent_type_three_circle, is_model
 
@@ -141,29 +141,81 @@ def interaction_agent_three_circle_obstacle(i, w, agents, obstacles):
         agents[i]['torque'] += cross(r_moment, force)
 
 
+@numba.jit(f8(f8[:], f8[:], f8), nopython=True, nogil=True, cache=True)
+def density_kernel(x_i, x_j, radius):
+    r"""Gaussian kernel for estimating local density [Helbing2007]_
+
+    .. math::
+       f(d) = \frac{1}{\pi R^2} \exp\left(-\frac{d^2}{R^2}\right)
+
+    truncated to zero when :math:`d \geq 3 R`.
+
+    Args:
+        x_i (numpy.ndarray): Position of agent i.
+        x_j (numpy.ndarray): Position of agent j.
+        radius (float): Radius :math:`R` of the kernel.
+
+    Returns:
+        float:
+    """
+    d2 = (x_i[0] - x_j[0]) ** 2 + (x_i[1] - x_j[1]) ** 2
+    r2 = radius ** 2
+    if d2 >= 9.0 * r2:
+        return 0.0
+    return np.exp(-d2 / r2) / (np.pi * r2)
+
+
 # Full interactions
 
 
 @numba.jit(void(typeof(agent_type_circular)[:],
-                i8[:], i8[:], i8[:], i8[:], i8[:]),
+                i8[:], i8[:], i8[:], i8[:], i8[:], f8[:], f8),
            nopython=True, nogil=True, cache=True)
 def agent_agent_circular(agents, cell_indices, neigh_cells, points_indices,
-                         cells_count, cells_offset):
+                         cells_count, cells_offset, density, density_radius):
+    """Agent agent interactions. If density array is not empty, it is filled
+    with the local density of the agents estimated by :func:`density_kernel`
+    over the pairs of active agents. Density of inactive agents is zero."""
+    estimate_density = len(density) > 0
+    if estimate_density:
+        for i in range(len(agents)):
+            density[i] = 1.0 / (np.pi * density_radius ** 2) \
+                if agents[i]['active'] else 0.0
+
     for i, j in iter_nearest_neighbors(
             cell_indices, neigh_cells, points_indices, cells_count,
             cells_offset):
         interaction_agent_agent_circular(i, j, agents)
+        if estimate_density and agents[i]['active'] and agents[j]['active']:
+            w = density_kernel(agents[i]['position'], agents[j]['position'],
+                               density_radius)
+            density[i] += w
+            density[j] += w
 
 
 @numba.jit(void(typeof(agent_type_three_circle)[:],
-                i8[:], i8[:], i8[:], i8[:], i8[:]),
+                i8[:], i8[:], i8[:], i8[:], i8[:], f8[:], f8),
            nopython=True, nogil=True, cache=True)
 def agent_agent_three_circle(agents, cell_indices, neigh_cells, points_indices,
-                             cells_count, cells_offset):
+                             cells_count, cells_offset, density, density_radius):
+    """Agent agent interactions. If density array is not empty, it is filled
+    with the local density of the agents estimated by :func:`density_kernel`
+    over the pairs of active agents. Density of inactive agents is zero."""
+    estimate_density = len(density) > 0
+    if estimate_density:
+        for i in range(len(agents)):
+            density[i] = 1.0 / (np.pi * density_radius ** 2) \
+                if agents[i]['active'] else 0.0
+
     for i, j in iter_nearest_neighbors(
             cell_indices, neigh_cells, points_indices, cells_count,
             cells_offset):
         interaction_agent_agent_three_circle(i, j, agents)
+        if estimate_density and agents[i]['active'] and agents[j]['active']:
+            w = density_kernel(agents[i]['position'], agents[j]['position'],
+                               density_radius)
+            density[i] += w
+            density[j] += w
 
 
 @numba.jit(void(typeof(agent_type_circular)[:],
@@ -188,7 +240,27 @@ def agent_three_circle_obstacle(agents, obstacles):
 
 # Higher level API
 
-def agent_agent_block_list(agents, cell_size):
+def agent_agent_block_list(agents, cell_size, density=None,
+                           density_radius=0.7):
+    """Agent agent interactions using block list.
+
+    Args:
+        agents (numpy.ndarray):
+        cell_size (float):
+        density (numpy.ndarray, optional):
+            Array of size ``len(agents)`` that is filled with the local
+            density of the agents. Pairs are found only from the neighbouring
+            cells therefore ``3 * density_radius`` must not exceed
+            ``cell_size``.
+        density_radius (float): Radius of the density kernel.
+    """
+    if density is None:
+        density = np.zeros(0)
+    elif 3 * density_radius > cell_size:
+        raise InvalidValue('Cutoff 3 * density_radius = {} of the local '
+                           'density exceeds cell_size = {}.'.format(
+                               3 * density_radius, cell_size))
+
     points_indices, cells_count, cells_offset, grid_shape = add_to_cells(
         agents['position'], cell_size)
     cell_indices = np.arange(len(cells_count))
@@ -196,11 +268,13 @@ def agent_agent_block_list(agents, cell_size):
 
     if is_model(agents, 'circular'):
         agent_agent_circular(agents, cell_indices, neigh_cells, points_indices,
-                             cells_count, cells_offset)
+                             cells_count, cells_offset, density,
+                             density_radius)
     elif is_model(agents, 'three_circle'):
         agent_agent_three_circle(agents, cell_indices, neigh_cells,
                                  points_indices,
-                                 cells_count, cells_offset)
+                                 cells_count, cells_offset, density,
+                                 density_radius)
     else:
         raise InvalidType
 
@@ -6,9 +6,14 @@ particle systems. For modeling fluctuation we use :math:`\mathcal{U}(a, b)` for
 continuous uniform distribution and :math:`\mathcal{N}(\mu, \sigma^{2})` for
 truncated normal distribution.
 """
+import numba
 import numpy as np
+from numba import void, u8, typeof
 
-from crowddynamics.core.rand import truncnorm
+from crowddynamics.core.rand import truncnorm, uniform, standard_truncnorm
+from crowddynamics.exceptions import InvalidType
+from crowddynamics.simulation.agents import agent_type_circular, \
+    agent_type_three_circle, is_model
 
 
 def force_fluctuation(mass, scale):
@@ -60,3 +65,59 @@ def torque_fluctuation(inertia_rot, scale):
     """
     size = len(inertia_rot)
     return inertia_rot * truncnorm(-3.0, 3.0, loc=0.0, scale=scale, size=size)
+
+
+@numba.jit(void(typeof(agent_type_circular)[:], u8[:]),
+           nopython=True, nogil=True, cache=True)
+def fluctuation_circular(agents, state):
+    """Add fluctuation force to the agents in single pass. Same distribution
+    as :func:`force_fluctuation`.
+
+    Args:
+        agents (numpy.ndarray):
+        state (numpy.ndarray):
+            Generator state from :func:`crowddynamics.core.rand.generator_state`
+    """
+    for agent in agents:
+        phi = 2.0 * np.pi * uniform(state)
+        magnitude = agent['mass'] * agent['std_rand_force'] * \
+            standard_truncnorm(state, 0.0, 3.0)
+        agent['force'][0] += magnitude * np.cos(phi)
+        agent['force'][1] += magnitude * np.sin(phi)
+
+
+@numba.jit(void(typeof(agent_type_three_circle)[:], u8[:]),
+           nopython=True, nogil=True, cache=True)
+def fluctuation_three_circle(agents, state):
+    """Add fluctuation force and torque to the agents in single pass. Same
+    distributions as :func:`force_fluctuation` and
+    :func:`torque_fluctuation`.
+
+    Args:
+        agents (numpy.ndarray):
+        state (numpy.ndarray):
+            Generator state from :func:`crowddynamics.core.rand.generator_state`
+    """
+    for agent in agents:
+        phi = 2.0 * np.pi * uniform(state)
+        magnitude = agent['mass'] * agent['std_rand_force'] * \
+            standard_truncnorm(state, 0.0, 3.0)
+        agent['force'][0] += magnitude * np.cos(phi)
+        agent['force'][1] += magnitude * np.sin(phi)
+        agent['torque'] += agent['inertia_rot'] * agent['std_rand_torque'] * \
+            standard_truncnorm(state, -3.0, 3.0)
+
+
+def fluctuation_agents(agents, state):
+    """Add fluctuation to the agents
+
+    Args:
+        agents (numpy.ndarray):
+        state (numpy.ndarray):
+    """
+    if is_model(agents, 'circular'):
+        fluctuation_circular(agents, state)
+    elif is_model(agents, 'three_circle'):
+        fluctuation_three_circle(agents, state)
+    else:
+        raise InvalidType
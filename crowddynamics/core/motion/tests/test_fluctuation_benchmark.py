@@ -0,0 +1,32 @@
+import numpy as np
+import pytest
+import scipy.stats
+
+from crowddynamics.core.motion.fluctuation import fluctuation_agents
+from crowddynamics.core.rand import generator_state
+from crowddynamics.simulation.agents import ThreeCircle, agent_group_array
+
+
+@pytest.mark.parametrize('size', (100, 1000, 10000))
+def test_fluctuation_scipy(benchmark, size):
+    agents = agent_group_array(ThreeCircle, size, {'body_type': 'adult'})
+
+    def f():
+        phi = np.random.uniform(0.0, 2.0 * np.pi, size=size)
+        magnitude = scipy.stats.truncnorm.rvs(
+            0.0, 3.0, scale=agents['std_rand_force'], size=size)
+        agents['force'] += (agents['mass'] * magnitude *
+                            np.array((np.cos(phi), np.sin(phi)))).T
+        agents['torque'] += agents['inertia_rot'] * scipy.stats.truncnorm.rvs(
+            -3.0, 3.0, scale=agents['std_rand_torque'], size=size)
+
+    benchmark(f)
+    assert True
+
+
+@pytest.mark.parametrize('size', (100, 1000, 10000))
+def test_fluctuation_agents(benchmark, size):
+    agents = agent_group_array(ThreeCircle, size, {'body_type': 'adult'})
+    state = generator_state(0)
+    benchmark(fluctuation_agents, agents, state)
+    assert True
@@ -1,10 +1,12 @@
 import numpy as np
+import pytest
 from hypothesis import given
 
 from crowddynamics.core.motion.adjusting import force_adjust, torque_adjust
 from crowddynamics.core.motion.contact import force_contact
 from crowddynamics.core.motion.fluctuation import force_fluctuation, \
-    torque_fluctuation
+    torque_fluctuation, fluctuation_agents
+from crowddynamics.core.rand import generator_state
 from crowddynamics.testing import reals
 
 SIZE = 10
@@ -63,3 +65,17 @@ def test_torque_adjust(inertia_rot, tau_rot, phi_0, phi, omega_0, omega):
     ans = torque_adjust(inertia_rot, tau_rot, phi_0, phi, omega_0,
                         omega)
     assert isinstance(ans, float)
+
+
+@pytest.mark.parametrize('agents', ('agents_circular', 'agents_three_circle'))
+def test_fluctuation_agents(request, agents):
+    array = request.getfixturevalue(agents).array
+    array['force'] = 0
+    state = generator_state(0)
+    fluctuation_agents(array, state)
+    magnitude = np.hypot(array['force'][:, 0], array['force'][:, 1])
+    assert np.all(magnitude <= 3 * array['mass'] * array['std_rand_force'])
+    assert np.any(magnitude > 0)
+    if 'torque' in array.dtype.names:
+        assert np.all(np.abs(array['torque']) <=
+                      3 * array['inertia_rot'] * array['std_rand_torque'])
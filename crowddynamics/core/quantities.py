@@ -2,12 +2,37 @@ import numba
 import numpy as np
 from numba import f8, i8
 from scipy.spatial import Voronoi
+from shapely.geometry.base import BaseMultipartGeometry
 from shapely.geometry.polygon import Polygon
 
 from crowddynamics.core.geom2D import polygon_area
 
 
-def density_classical(points, cell_size):
+def _histogram_grid(points, cell_size, bounds):
+    """Origin and shape of the grid of cells."""
+    if bounds is None:
+        lower = np.floor(points.min(axis=0) / cell_size)
+        upper = np.floor(points.max(axis=0) / cell_size)
+        return lower * cell_size, tuple(np.int64(upper - lower) + 1)
+    xmin, ymin, xmax, ymax = bounds
+    shape = np.ceil(np.array((xmax - xmin, ymax - ymin)) / cell_size)
+    return np.array((xmin, ymin)), tuple(np.maximum(np.int64(shape), 1))
+
+
+def _histogram(points, cell_size, origin, shape):
+    """Number of points in each cell using binning on linear cell indices.
+    Points on the upper edge of the grid belong to the last cell like in
+    ``np.histogram2d``. Other points outside of the grid are ignored."""
+    scaled = (points - origin) / cell_size
+    indices = np.floor(scaled).astype(np.int64)
+    indices[scaled == shape] -= 1
+    i, j = indices[:, 0], indices[:, 1]
+    inside = (0 <= i) & (i < shape[0]) & (0 <= j) & (j < shape[1])
+    return np.bincount(i[inside] * shape[1] + j[inside],
+                       minlength=shape[0] * shape[1]).reshape(shape)
+
+
+def density_classical(points, cell_size, bounds=None):
     r"""Classical definition of density defined the density :math:`D` as number
     of agents per unit of area. [Steffen2010]_
 
@@ -23,15 +48,76 @@ def density_classical(points, cell_size):
     measuring density of crowd or granular media as it does for measuring
     density of fluids which have :math:`> 10^{18}` particles per
     :math:`\mathrm{mm}^3`.
+
+    Args:
+        points (numpy.ndarray): Two dimensional points.
+        cell_size (float): Cell size of the grid.
+        bounds (tuple, optional):
+            Fixed extents ``(xmin, ymin, xmax, ymax)`` of the grid, for
+            example the bounds of the domain, so that grids of different
+            frames are comparable. Points on the upper bounds are counted
+            and points outside are ignored. Defaults to
+            cells covering the bounding box of the points with cell ``(0,
+            0)`` at ``floor(min(points) / cell_size) * cell_size``.
+
+    Returns:
+        numpy.ndarray: Grid of density values indexed by ``[i, j]`` where
+        ``i`` is along x-axis and ``j`` along y-axis.
     """
-    indices = np.floor(points / cell_size)
-    x, y = indices[:, 0], indices[:, 1]
-    x_min, y_min = x.min(), y.min()
-    shape = x.max() - x_min, y.max() - y_min
+    origin, shape = _histogram_grid(points, cell_size, bounds)
+    return _histogram(points, cell_size, origin, shape) / cell_size ** 2
+
+
+def density_classical_stream(frames, cell_size, bounds):
+    r"""Time-averaged classical density :func:`density_classical` of many
+    frames accumulated into one histogram.
+
+    Args:
+        frames (Iterable[numpy.ndarray]): Points of each frame.
+        cell_size (float): Cell size of the grid.
+        bounds (tuple): Fixed extents ``(xmin, ymin, xmax, ymax)`` of the grid.
+
+    Returns:
+        numpy.ndarray: Grid of average density values.
+    """
+    origin, shape = _histogram_grid(None, cell_size, bounds)
     count = np.zeros(shape, dtype=np.int64)
-    for i, j in zip(x, y):
-        count[i - x_min, j - y_min] += 1
-    return count / cell_size ** 2
+    n = 0
+    for points in frames:
+        count += _histogram(points, cell_size, origin, shape)
+        n += 1
+    return count / (max(n, 1) * cell_size ** 2)
+
+
+@numba.jit([f8[:, :, :](f8[:, :], f8[:, :], f8[:, :, :], f8[:], f8)],
+           nopython=True, nogil=True, cache=True)
+def scatter_add(points, values, grid, origin, cell_size):
+    """Add values of the points into the cells of the grid that contain the
+    points. Points on the upper edge of the grid belong to the last cells
+    like in ``np.histogram2d``. Other points outside of the grid are ignored.
+
+    Args:
+        points (numpy.ndarray): Points of shape (n, 2).
+        values (numpy.ndarray): Values of shape (n, k).
+        grid (numpy.ndarray): Grid of shape (nx, ny, k) indexed by
+            ``grid[i, j]`` where ``i`` is along x-axis and ``j`` along
+            y-axis.
+        origin (numpy.ndarray): Coordinates of the corner of cell (0, 0).
+        cell_size (float):
+
+    Returns:
+        numpy.ndarray: The grid.
+    """
+    nx, ny, k = grid.shape
+    for n in range(len(points)):
+        x = (points[n, 0] - origin[0]) / cell_size
+        y = (points[n, 1] - origin[1]) / cell_size
+        if not (0 <= x <= nx and 0 <= y <= ny):
+            continue
+        i, j = min(int(x), nx - 1), min(int(y), ny - 1)
+        for c in range(k):
+            grid[i, j, c] += values[n, c]
+    return grid
 
 
 @numba.jit()
@@ -211,7 +297,7 @@ def density_voronoi_1(points, cell_size):
 
     # Density matrix
     (imin, imax), (jmin, jmax) = np.int64(bbox_points / cell_size)
-    density = np.zeros(shape=(imax - imin + 1, jmax - imin + 1))
+    density = np.zeros(shape=(imax - imin + 1, jmax - jmin + 1))
 
     # Loop over Voronoi regions
     for region in new_regions:
@@ -220,7 +306,6 @@ def density_voronoi_1(points, cell_size):
         minx, miny, maxx, maxy = voronoi_cell.bounds
 
         # Loop over the cells contained by the bounding box of the Voronoi cell
-        # FIXME: index out of bounds
         for i in range(int(minx / cell_size), int(maxx / cell_size) + 1):
             for j in range(int(miny / cell_size), int(maxy / cell_size) + 1):
                 cell = rectangle(i * cell_size, (i + 1) * cell_size,
@@ -231,6 +316,245 @@ def density_voronoi_1(points, cell_size):
     return density / (cell_size ** 2)
 
 
+@numba.jit(nopython=True, nogil=True, cache=True)
+def _clip_half_plane(src, n, dst, axis, value, sign):
+    """Sutherland–Hodgman clipping of polygon ``src[:n]`` against half-plane
+    ``sign * (x[axis] - value) >= 0``.
+
+    Args:
+        src (numpy.ndarray): Vertices of the polygon.
+        n (int): Number of vertices.
+        dst (numpy.ndarray): Output buffer of size ``2 * n``.
+        axis (int): Axis 0 or 1.
+        value (float): Location of the clipping line.
+        sign (float): 1.0 keeps greater and -1.0 lesser side.
+
+    Returns:
+        int: Number of vertices of the clipped polygon.
+    """
+    m = 0
+    if n == 0:
+        return m
+    px, py = src[n - 1, 0], src[n - 1, 1]
+    pd = sign * (src[n - 1, axis] - value)
+    for k in range(n):
+        qx, qy = src[k, 0], src[k, 1]
+        qd = sign * (src[k, axis] - value)
+        if (pd >= 0) != (qd >= 0):
+            t = pd / (pd - qd)
+            dst[m, 0] = px + t * (qx - px)
+            dst[m, 1] = py + t * (qy - py)
+            m += 1
+        if qd >= 0:
+            dst[m, 0] = qx
+            dst[m, 1] = qy
+            m += 1
+        px, py, pd = qx, qy, qd
+    return m
+
+
+@numba.jit(nopython=True, nogil=True, cache=True)
+def _signed_area(vertices, n):
+    """Shoelace formula for the first n vertices."""
+    area = 0.0
+    for k in range(n):
+        j = (k + 1) % n
+        area += vertices[k, 0] * vertices[j, 1] - vertices[j, 0] * vertices[k, 1]
+    return 0.5 * area
+
+
+@numba.jit(nopython=True, nogil=True, cache=True)
+def _clip_rectangle(src, n, buf, dst, xmin, ymin, xmax, ymax):
+    """Clip polygon against rectangle. Result is stored into ``dst``."""
+    m = _clip_half_plane(src, n, dst, 0, xmin, 1.0)
+    m = _clip_half_plane(dst, m, buf, 0, xmax, -1.0)
+    m = _clip_half_plane(buf, m, dst, 1, ymin, 1.0)
+    return _clip_half_plane(dst, m, buf, 1, ymax, -1.0)
+
+
+@numba.jit([f8[:](f8[:, :], i8[:], f8[:])],
+           nopython=True, nogil=True, cache=True)
+def _clipped_areas(vertices, offsets, bounds):
+    """Areas of the rings clipped against the rectangle ``bounds = (xmin,
+    ymin, xmax, ymax)``."""
+    areas = np.zeros(len(offsets) - 1)
+    for r in range(len(offsets) - 1):
+        ring = vertices[offsets[r]:offsets[r + 1]]
+        n = len(ring)
+        buf = np.empty((16 * n, 2))
+        dst = np.empty((16 * n, 2))
+        m = _clip_rectangle(ring, n, buf, dst, bounds[0], bounds[1],
+                            bounds[2], bounds[3])
+        areas[r] = abs(_signed_area(buf, m))
+    return areas
+
+
+@numba.jit([f8[:, :](f8[:, :], i8[:], f8[:], f8[:, :], f8[:], f8, f8[:])],
+           nopython=True, nogil=True, cache=True)
+def _accumulate_rings(vertices, offsets, weights, grid, origin, cell_size,
+                      bounds):
+    """Accumulate areas of polygon rings inside the cells of the grid
+    multiplied by the weights of the rings. Rings are clipped first into
+    columns and then into cells of the grid. Parts of rings outside of the
+    grid or the rectangle ``bounds = (xmin, ymin, xmax, ymax)`` are ignored.
+
+    Args:
+        vertices (numpy.ndarray): Vertices of the rings.
+        offsets (numpy.ndarray):
+            Vertices of ring ``k`` are ``vertices[offsets[k]:offsets[k+1]]``.
+        weights (numpy.ndarray): Weight of each ring.
+        grid (numpy.ndarray): Grid indexed by ``grid[i, j]`` where ``i`` is
+            along x-axis and ``j`` along y-axis.
+        origin (numpy.ndarray): Coordinates of the corner of cell ``(0, 0)``.
+        cell_size (float):
+        bounds (numpy.ndarray):
+
+    Returns:
+        numpy.ndarray: The grid.
+    """
+    nx, ny = grid.shape
+    for r in range(len(offsets) - 1):
+        ring = vertices[offsets[r]:offsets[r + 1]]
+        n = len(ring)
+        if n < 3:
+            continue
+        # Clipping against convex cell at most doubles the vertices of a
+        # non-convex ring in each of the four half-planes.
+        buf1 = np.empty((16 * n, 2))
+        buf2 = np.empty((16 * n, 2))
+        buf3 = np.empty((16 * n, 2))
+        buf4 = np.empty((16 * n, 2))
+
+        imin = max(int(np.floor((ring[:, 0].min() - origin[0]) / cell_size)), 0)
+        imax = min(int(np.floor((ring[:, 0].max() - origin[0]) / cell_size)), nx - 1)
+        jmin = max(int(np.floor((ring[:, 1].min() - origin[1]) / cell_size)), 0)
+        jmax = min(int(np.floor((ring[:, 1].max() - origin[1]) / cell_size)), ny - 1)
+
+        for i in range(imin, imax + 1):
+            x0 = max(origin[0] + i * cell_size, bounds[0])
+            x1 = min(origin[0] + (i + 1) * cell_size, bounds[2])
+            m = _clip_half_plane(ring, n, buf1, 0, x0, 1.0)
+            m = _clip_half_plane(buf1, m, buf2, 0, x1, -1.0)
+            if m < 3:
+                continue
+            for j in range(jmin, jmax + 1):
+                y0 = max(origin[1] + j * cell_size, bounds[1])
+                y1 = min(origin[1] + (j + 1) * cell_size, bounds[3])
+                k = _clip_half_plane(buf2, m, buf3, 1, y0, 1.0)
+                k = _clip_half_plane(buf3, k, buf4, 1, y1, -1.0)
+                if k < 3:
+                    continue
+                grid[i, j] += weights[r] * abs(_signed_area(buf4, k))
+    return grid
+
+
+def _rings(geom):
+    """Rings of the polygons in geometry and their signs. Exteriors have sign
+    1 and interiors sign -1."""
+    if isinstance(geom, Polygon):
+        if not geom.is_empty:
+            yield np.asarray(geom.exterior.coords)[:-1, :2], 1.0
+            for interior in geom.interiors:
+                yield np.asarray(interior.coords)[:-1, :2], -1.0
+    elif isinstance(geom, BaseMultipartGeometry):
+        for geo in geom:
+            yield from _rings(geo)
+
+
+def _pack_rings(rings):
+    vertices = [np.asarray(ring, dtype=np.float64) for ring, _ in rings]
+    offsets = np.cumsum([0] + [len(v) for v in vertices]).astype(np.int64)
+    vertices = np.concatenate(vertices) if vertices else np.zeros((0, 2))
+    return np.ascontiguousarray(vertices), offsets
+
+
+def density_voronoi(points, cell_size, observation_area=None, obstacles=None):
+    r"""Density definition based on Voronoi-diagram :func:`density_voronoi_1`
+    computed using compiled polygon clipping.
+
+    Voronoi cells :math:`A_i` are clipped to the observation area without the
+    obstacles. The areas :math:`|A \cap A_i|` are then accumulated into the
+    cells of the grid by clipping the Voronoi cells against the cells of the
+    grid using Sutherland–Hodgman algorithm. Density of each cell of the grid
+    is divided by the area of the cell that belongs to the observation area.
+
+    Args:
+        points (numpy.ndarray):
+            Two dimensional points :math:`\mathbf{p}_{i \in \mathbb{N}}`
+        cell_size (float):
+            Cell size of the meshgrid. Each cell represents an area :math:`A`
+            inside which density is measured.
+        observation_area (Polygon, optional):
+            Area inside which density is measured. Defaults to the bounding
+            box of the points.
+        obstacles (BaseGeometry, optional):
+            Obstacles that are removed from the observation area.
+
+    Returns:
+        numpy.ndarray: Grid of density values. Cell ``(i, j)`` covers the
+        area with corner at ``(floor(xmin / cell_size) + i) * cell_size``,
+        ``(floor(ymin / cell_size) + j) * cell_size`` where ``xmin`` and
+        ``ymin`` are the minimum coordinates of the observation area. Cells
+        outside the observation area have zero density.
+    """
+    assert points.ndim == 2, 'Points should be two dimensional.'
+    assert len(points) >= 3, 'Three of more points should be supplied.'
+    assert cell_size > 0, 'Cell size should be positive number (cell_size > 0).'
+
+    if observation_area is None:
+        (xmin, xmax), (ymin, ymax) = bounding_box(points)
+        observation_area = rectangle(xmin, xmax, ymin, ymax)
+    area = observation_area
+    if obstacles is not None:
+        area = area.difference(obstacles)
+
+    bounds = np.array(area.bounds)
+    xmin, ymin, xmax, ymax = bounds
+    imin, jmin = np.floor(np.array((xmin, ymin)) / cell_size)
+    imax, jmax = np.floor(np.array((xmax, ymax)) / cell_size)
+    origin = np.array((imin, jmin)) * cell_size
+    shape = int(imax - imin) + 1, int(jmax - jmin) + 1
+
+    # Voronoi tesselation. Infinite regions are extended beyond the
+    # observation area.
+    vor = Voronoi(points)
+    radius = 2 * max(np.ptp(points, axis=0).max(), xmax - xmin, ymax - ymin)
+    new_regions, new_vertices = voronoi_finite_polygons_2d(vor, radius)
+
+    if area.equals(area.envelope):
+        # Rectangular area: Voronoi cells are clipped by the compiled code.
+        vertices, offsets = _pack_rings(
+            (new_vertices[region], 1.0) for region in new_regions)
+        areas = _clipped_areas(vertices, offsets, bounds)
+        weights = np.zeros_like(areas)
+        weights[areas > 0] = 1.0 / areas[areas > 0]
+    else:
+        rings = []
+        weights = []
+        for region in new_regions:
+            voronoi_cell = Polygon(shell=new_vertices[region]) & area
+            if voronoi_cell.area > 0:
+                for ring, sign in _rings(voronoi_cell):
+                    rings.append((ring, sign))
+                    weights.append(sign / voronoi_cell.area)
+        vertices, offsets = _pack_rings(rings)
+        weights = np.array(weights)
+    density = _accumulate_rings(vertices, offsets, weights, np.zeros(shape),
+                                origin, cell_size, bounds)
+
+    # Area of each cell of the grid inside the observation area
+    rings = list(_rings(area))
+    vertices, offsets = _pack_rings(rings)
+    cell_area = _accumulate_rings(vertices, offsets,
+                                  np.array([s for _, s in rings]),
+                                  np.zeros(shape), origin, cell_size, bounds)
+
+    inside = cell_area > 1e-12 * cell_size ** 2
+    density[inside] /= cell_area[inside]
+    density[~inside] = 0.0
+    return density
+
+
 def density_voronoi_2(points, cell_size):
     r"""Density definition base on Voronoi-diagram. [Steffen2010]_
 
@@ -1,22 +1,174 @@
 import numba
 import numpy as np
-import scipy.stats
+from numba import f8, i8, u8, void
 
-from numba import f8, i8
+# Generator
+# ---------
+# Compiled functions draw random numbers from explicit generator states
+# instead of the global state of numpy. Each stream of random numbers has its
+# own state array which can be saved and restored.
+
+_MASK = (1 << 64) - 1
+_SHIFT_11 = np.uint64(11)
+_SHIFT_16 = np.uint64(16)
+_ROT_24 = (np.uint64(24), np.uint64(40))
+_ROT_37 = (np.uint64(37), np.uint64(27))
+
+
+def _splitmix64(x):
+    """Next value and output of SplitMix64 generator."""
+    x = (x + 0x9e3779b97f4a7c15) & _MASK
+    z = x
+    z = ((z ^ (z >> 30)) * 0xbf58476d1ce4e5b9) & _MASK
+    z = ((z ^ (z >> 27)) * 0x94d049bb133111eb) & _MASK
+    return x, z ^ (z >> 31)
+
+
+def generator_state(seed=None):
+    """State of xoroshiro128+ generator seeded using SplitMix64.
+
+    Args:
+        seed (int, optional): If None seed is drawn from the global state of
+            numpy so that ``np.random.seed`` makes the stream reproducible.
+
+    Returns:
+        numpy.ndarray: Array of two ``uint64``.
+    """
+    if seed is None:
+        seed = int(np.random.randint(0, 2 ** 63, dtype=np.int64))
+    x, s0 = _splitmix64(seed & _MASK)
+    x, s1 = _splitmix64(x)
+    return np.array((s0, s1), dtype=np.uint64)
+
+
+@numba.jit(u8(u8[:]), nopython=True, nogil=True, cache=True)
+def next_uint64(state):
+    """Next random integer of xoroshiro128+ generator. [Blackman2018]_
+
+    Args:
+        state (numpy.ndarray): Generator state that is advanced.
+
+    Returns:
+        int:
+
+    References:
+        .. [Blackman2018] Blackman, D., & Vigna, S. (2018). Scrambled linear
+           pseudorandom number generators.
+    """
+    s0 = state[0]
+    s1 = state[1]
+    result = s0 + s1
+    s1 ^= s0
+    state[0] = ((s0 << _ROT_24[0]) | (s0 >> _ROT_24[1])) ^ s1 ^ \
+        (s1 << _SHIFT_16)
+    state[1] = (s1 << _ROT_37[0]) | (s1 >> _ROT_37[1])
+    return result
+
+
+@numba.jit(f8(u8[:]), nopython=True, nogil=True, cache=True)
+def uniform(state):
+    """Uniform random number from interval :math:`[0, 1)`."""
+    return np.float64(next_uint64(state) >> _SHIFT_11) * (1.0 / 2.0 ** 53)
+
+
+@numba.jit(f8(u8[:]), nopython=True, nogil=True, cache=True)
+def standard_normal(state):
+    """Standard normal random number using Box-Muller transform."""
+    u1 = 1.0 - uniform(state)
+    u2 = uniform(state)
+    return np.sqrt(-2.0 * np.log(u1)) * np.cos(2.0 * np.pi * u2)
+
+
+@numba.jit(f8(u8[:], f8, f8), nopython=True, nogil=True, cache=True)
+def standard_truncnorm(state, a, b):
+    r"""Standard normal random number truncated to interval :math:`[a, b]`
+    using the rejection sampling of [Robert1995]_.
+
+    - :math:`a < 0 < b`: Normal proposal if the interval is wide, otherwise
+      uniform proposal.
+    - :math:`0 \leq a`: Exponential proposal for the tail if the interval is
+      wide, otherwise uniform proposal.
+    - :math:`b \leq 0`: Symmetric to the previous case.
+
+    Args:
+        state (numpy.ndarray):
+        a (float): Lower bound
+        b (float): Upper bound
+
+    Returns:
+        float:
+
+    References:
+        .. [Robert1995] Robert, C. P. (1995). Simulation of truncated normal
+           variables. Statistics and Computing, 5(2), 121–125.
+    """
+    sign = 1.0
+    if b <= 0.0:
+        a, b = -b, -a
+        sign = -1.0
+
+    if a < 0.0:
+        if b - a >= np.sqrt(2.0 * np.pi):
+            while True:
+                z = standard_normal(state)
+                if a <= z <= b:
+                    return z
+        while True:
+            z = a + (b - a) * uniform(state)
+            if uniform(state) <= np.exp(-z ** 2 / 2.0):
+                return z
+
+    alpha = (a + np.sqrt(a ** 2 + 4.0)) / 2.0
+    if b >= a + 2.0 * np.sqrt(np.e) / (a + np.sqrt(a ** 2 + 4.0)) * \
+            np.exp((a ** 2 - a * np.sqrt(a ** 2 + 4.0)) / 4.0):
+        while True:
+            z = a - np.log(1.0 - uniform(state)) / alpha
+            if z <= b and \
+                    uniform(state) <= np.exp(-(z - alpha) ** 2 / 2.0):
+                return sign * z
+    while True:
+        z = a + (b - a) * uniform(state)
+        if uniform(state) <= np.exp((a ** 2 - z ** 2) / 2.0):
+            return sign * z
+
+
+@numba.jit(void(u8[:], f8, f8, f8[:], f8[:], f8[:]),
+           nopython=True, nogil=True, cache=True)
+def truncnorm_batch(state, a, b, loc, scale, out):
+    """Fill array with truncated normal random numbers
+    ``loc + scale * z`` where ``z`` is standard normal truncated to
+    interval ``[a, b]``.
+
+    Args:
+        state (numpy.ndarray):
+        a (float):
+        b (float):
+        loc (numpy.ndarray): Array of the size of out or of size one.
+        scale (numpy.ndarray): Array of the size of out or of size one.
+        out (numpy.ndarray):
+    """
+    n_loc = len(loc)
+    n_scale = len(scale)
+    for i in range(len(out)):
+        out[i] = loc[i % n_loc] + \
+            scale[i % n_scale] * standard_truncnorm(state, a, b)
 
 
 def truncnorm(start, end, loc=0.0, scale=1.0, abs_scale=None, size=1,
               random_state=None):
-    """Truncated normal distribution from ``scipy.stats``.
+    """Truncated normal distribution. Uses the same parametrization as
+    ``scipy.stats.truncnorm`` but samples using :func:`truncnorm_batch`.
 
     Args:
         start (float):
         end (float):
-        loc (float):
+        loc (float|numpy.ndarray):
         scale (float|numpy.ndarray):
         abs_scale: Absolute scale ``scale = abs_scale / max(abs(start), abs(end))
         size (int):
-        random_state (int, optional):
+        random_state (int|numpy.ndarray, optional):
+            Seed or generator state from :func:`generator_state`. Generator
+            state is advanced. If None seed is drawn from numpy.
 
     Returns:
         numpy.ndarray:
@@ -26,10 +178,14 @@ def truncnorm(start, end, loc=0.0, scale=1.0, abs_scale=None, size=1,
         - https://en.wikipedia.org/wiki/Truncated_normal_distribution
     """
     _scale = abs_scale / max(abs(start), abs(end)) if abs_scale else scale
-    tn = scipy.stats.truncnorm.rvs(
-        start, end, loc=loc, scale=_scale, size=size, random_state=random_state
-    )
-    return tn
+    if not isinstance(random_state, np.ndarray):
+        random_state = generator_state(random_state)
+    out = np.zeros(size, dtype=np.float64)
+    truncnorm_batch(random_state, float(start), float(end),
+                    np.atleast_1d(np.asarray(loc, dtype=np.float64)),
+                    np.atleast_1d(np.asarray(_scale, dtype=np.float64)),
+                    out)
+    return out
 
 
 def random_vector(size, orient=(0.0, 2.0 * np.pi), mag=1.0):
@@ -1,10 +1,16 @@
 """Sampling points on polygons."""
 import numba
 import numpy as np
-from numba import f8
+from numba import f8, i8, u8, boolean, typeof
 from scipy.spatial.qhull import Delaunay
 
+from crowddynamics.core.block_list import spatial_hash_insert, \
+    spatial_hash_nearest, EMPTY
+from crowddynamics.core.distance import distance_circle_line
 from crowddynamics.core.geom2D import polygon_area
+from crowddynamics.core.geometry import geom_to_polygon_edges
+from crowddynamics.core.rand import generator_state, next_uint64, uniform
+from crowddynamics.core.structures import obstacle_type_linear
 
 
 @numba.jit(f8[:](f8[:, :]), nopython=True, nogil=True, cache=True)
@@ -154,3 +160,242 @@ def polygon_sample(vertices):
         i = np.searchsorted(weights, x)  # Uniformly drawn random triangle
         a, b, c = mesh[i]
         yield random_sample_triangle(a, b, c)
+
+
+@numba.jit(boolean(f8[:], f8, typeof(obstacle_type_linear)[:]),
+           nopython=True, nogil=True, cache=True)
+def disk_inside_polygons(x, r, edges):
+    """Test if disk is inside the polygons formed by the edges. Point is
+    inside if it crosses odd number of edges (even-odd rule) which also
+    handles holes and multiple polygons.
+
+    Args:
+        x (numpy.ndarray): Center of the disk
+        r (float): Radius of the disk
+        edges (numpy.ndarray): Edges of the polygons. Output of
+            :func:`crowddynamics.core.geometry.geom_to_polygon_edges`.
+
+    Returns:
+        bool:
+    """
+    inside = False
+    for edge in edges:
+        p0, p1 = edge['p0'], edge['p1']
+        if (p0[1] > x[1]) != (p1[1] > x[1]):
+            t = (x[1] - p0[1]) / (p1[1] - p0[1])
+            if x[0] < p0[0] + t * (p1[0] - p0[0]):
+                inside = not inside
+    if not inside:
+        return False
+    for edge in edges:
+        h, _ = distance_circle_line(x, r, edge['p0'], edge['p1'])
+        if h < 0.0:
+            return False
+    return True
+
+
+@numba.jit(boolean(f8[:], f8, f8[:, :], f8[:], i8[:], i8[:], i8[:, :], f8,
+                   i8[:], typeof(obstacle_type_linear)[:]),
+           nopython=True, nogil=True, cache=True)
+def _disk_fits(x, r, points, radii, head, successor, cells, cell_size,
+               neighbours, edges):
+    count = spatial_hash_nearest(head, successor, cells, cell_size, x, 1,
+                                 neighbours)
+    for n in range(count):
+        j = neighbours[n]
+        d = np.hypot(x[0] - points[j, 0], x[1] - points[j, 1])
+        if d < r + radii[j]:
+            return False
+    return disk_inside_polygons(x, r, edges)
+
+
+@numba.jit(boolean(f8[:], i8, f8, f8[:, :], f8[:], i8[:], i8[:], i8[:, :],
+                   f8, i8[:], typeof(obstacle_type_linear)[:]),
+           nopython=True, nogil=True, cache=True)
+def _tangent_candidate(x, p, r, points, radii, head, successor, cells,
+                       cell_size, neighbours, edges):
+    """Find position x for a disk with radius r that touches both the disk p
+    and one of its neighbours."""
+    # Neighbours closer than 2 * (r_p + r_q + 2 r) can be touched
+    count = spatial_hash_nearest(head, successor, cells, cell_size,
+                                 points[p], 2, neighbours)
+    others = neighbours[:count].copy()
+    a = (radii[p] + r) * (1.0 + 1e-9)
+    for q in others:
+        if q == p:
+            continue
+        b = (radii[q] + r) * (1.0 + 1e-9)
+        dx = points[q, 0] - points[p, 0]
+        dy = points[q, 1] - points[p, 1]
+        d = np.hypot(dx, dy)
+        if d == 0.0 or d > a + b or d < abs(a - b):
+            continue
+        # Intersection of circles with radii a and b around the disks
+        l = (a ** 2 - b ** 2 + d ** 2) / (2.0 * d)
+        h = np.sqrt(max(a ** 2 - l ** 2, 0.0))
+        for sign in (1.0, -1.0):
+            x[0] = points[p, 0] + (l * dx - sign * h * dy) / d
+            x[1] = points[p, 1] + (l * dy + sign * h * dx) / d
+            if _disk_fits(x, r, points, radii, head, successor, cells,
+                          cell_size, neighbours, edges):
+                return True
+    return False
+
+
+@numba.jit(i8(u8[:], f8[:, :], f8[:], typeof(obstacle_type_linear)[:], f8[:],
+              i8, f8, i8, i8),
+           nopython=True, nogil=True, cache=True)
+def poisson_disk_packing(state, points, radii, edges, bounds, candidates, gap,
+                         seeds, fixed):
+    r"""Bridson's algorithm for Poisson-disk sampling with variable radii.
+    [Bridson2007]_
+
+    1) Sample initial point uniformly inside the polygons by rejection and
+       add it to the active list.
+    2) Choose random point :math:`\mathbf{x}_p` from the active list. Try
+       candidates :math:`\mathbf{x}` for the next disk with radius :math:`r`
+       that touch both the disk :math:`p` and one of its neighbours, then
+       candidates uniformly in the angle at distance
+       :math:`(r_p + r)(1 + g U)`, :math:`U \sim \mathcal{U}(0, 1)`. First
+       candidate that fits inside the polygons without overlapping other
+       disks is added to the active list. If no candidate fits the point is
+       removed from the active list. Touching candidates make the packing
+       considerably denser than the original algorithm.
+    3) If active list is empty, sample new initial point (which fills
+       disconnected parts of the polygons), otherwise continue from step 2.
+
+    First ``fixed`` disks are already placed, for example agents that
+    already exist. They are not moved and new disks are packed around them.
+
+    Args:
+        state (numpy.ndarray): Generator state from
+            :func:`crowddynamics.core.rand.generator_state` that is advanced.
+        points (numpy.ndarray): Array of shape (n, 2) where positions are
+            stored. First ``fixed`` rows are positions of the fixed disks.
+        radii (numpy.ndarray): Radii of the disks in the order they are
+            placed.
+        edges (numpy.ndarray): Edges of the polygons.
+        bounds (numpy.ndarray): Bounds of the polygons
+            ``(minx, miny, maxx, maxy)``.
+        candidates (int): Number of candidates tried around each point.
+        gap (float): Relative width :math:`g` of the annulus where
+            candidates are sampled. Small values give dense packing.
+        seeds (int): Number of tries to sample a new initial point.
+        fixed (int): Number of fixed disks.
+
+    Returns:
+        int: Number of disks placed, excluding the fixed disks.
+
+    References:
+        .. [Bridson2007] Bridson, R. (2007). Fast Poisson disk sampling in
+           arbitrary dimensions. SIGGRAPH sketches.
+    """
+    n = len(radii)
+    cell_size = 2.0 * np.max(radii) if n > 0 else 1.0
+    buckets = 1
+    while buckets < n:
+        buckets *= 2
+    head = np.full(buckets, EMPTY, dtype=np.int64)
+    successor = np.zeros(n, dtype=np.int64)
+    cells = np.zeros((n, 2), dtype=np.int64)
+    neighbours = np.zeros(n, dtype=np.int64)
+    active = np.zeros(n, dtype=np.int64)
+    x = np.zeros(2)
+
+    for size in range(fixed):
+        spatial_hash_insert(head, successor, cells, cell_size, points[size],
+                            size)
+
+    size = fixed
+    n_active = 0
+    while size < n:
+        r = radii[size]
+        fits = False
+        if n_active == 0:
+            for _ in range(seeds):
+                x[0] = bounds[0] + uniform(state) * (bounds[2] - bounds[0])
+                x[1] = bounds[1] + uniform(state) * (bounds[3] - bounds[1])
+                if _disk_fits(x, r, points, radii, head, successor, cells,
+                              cell_size, neighbours, edges):
+                    fits = True
+                    break
+            if not fits:
+                break
+        else:
+            a = np.int64(next_uint64(state) % np.uint64(n_active))
+            p = active[a]
+            fits = _tangent_candidate(x, p, r, points, radii, head, successor,
+                                      cells, cell_size, neighbours, edges)
+            for _ in range(0 if fits else candidates):
+                angle = 2.0 * np.pi * uniform(state)
+                distance = (radii[p] + r) * (1.0 + gap * uniform(state))
+                x[0] = points[p, 0] + distance * np.cos(angle)
+                x[1] = points[p, 1] + distance * np.sin(angle)
+                if _disk_fits(x, r, points, radii, head, successor, cells,
+                              cell_size, neighbours, edges):
+                    fits = True
+                    break
+            if not fits:
+                n_active -= 1
+                active[a] = active[n_active]
+                continue
+
+        points[size, :] = x
+        spatial_hash_insert(head, successor, cells, cell_size, x, size)
+        active[n_active] = size
+        n_active += 1
+        size += 1
+    return size - fixed
+
+
+def poisson_disk_sample(geom, radii, candidates=30, gap=0.1, seeds=1000,
+                        fixed_points=None, fixed_radii=None,
+                        random_state=None):
+    """Non-overlapping positions for disks inside polygons using Poisson-disk
+    sampling. Unlike :func:`polygon_sample` non-convex polygons, polygons
+    with holes and multiple polygons are sampled correctly and the disks are
+    fully inside the polygons.
+
+    Args:
+        geom (Polygon|MultiPolygon):
+        radii (numpy.ndarray): Radii of the disks.
+        candidates (int): Number of candidates tried around each point.
+        gap (float): Relative width of the annulus where candidates are
+            sampled. Value of ``1.0`` corresponds to the original algorithm
+            and small values give dense packing.
+        seeds (int): Number of tries to sample a new initial point.
+        fixed_points (numpy.ndarray, optional): Positions of shape
+            ``(k, 2)`` of disks that are already placed. Disks are packed
+            around them without overlapping.
+        fixed_radii (numpy.ndarray, optional): Radii of the fixed disks.
+        random_state (int|numpy.ndarray, optional):
+            Seed or generator state from
+            :func:`crowddynamics.core.rand.generator_state`. Generator state
+            is advanced. If None seed is drawn from numpy.
+
+    Returns:
+        numpy.ndarray:
+            Positions of shape ``(m, 2)`` for the first ``m`` disks. Value
+            of ``m`` is less than the number of disks if the polygons are
+            filled.
+    """
+    radii = np.asarray(radii, dtype=np.float64)
+    if fixed_points is None:
+        fixed_points = np.zeros((0, 2))
+        fixed_radii = np.zeros(0)
+    fixed_points = np.asarray(fixed_points, dtype=np.float64).reshape(-1, 2)
+    fixed_radii = np.asarray(fixed_radii, dtype=np.float64)
+    assert len(fixed_points) == len(fixed_radii)
+
+    fixed = len(fixed_radii)
+    edges, _ = geom_to_polygon_edges(geom)
+    points = np.concatenate((fixed_points, np.zeros((len(radii), 2))))
+    if geom.is_empty:
+        return points[fixed:fixed]
+    if not isinstance(random_state, np.ndarray):
+        random_state = generator_state(random_state)
+    bounds = np.array(geom.bounds, dtype=np.float64)
+    size = poisson_disk_packing(random_state, points,
+                                np.concatenate((fixed_radii, radii)), edges,
+                                bounds, candidates, gap, seeds, fixed)
+    return points[fixed:fixed + size]
@@ -12,19 +12,19 @@ from typing import Tuple
 
 import numba
 import numpy as np
-from numba import f8, i8
+from numba import f4, f8, i8
 from shapely.geometry import Polygon
 
 from crowddynamics.core.steering.collective_motion import leader_follower_with_herding_interaction
 from crowddynamics.core.steering.obstacle_handling import \
     direction_map_obstacles, obstacle_handling
 from crowddynamics.core.steering.quickest_path import MeshGrid, DistanceMap, \
-    DirectionMap, meshgrid, shortest_path
+    CompactDirectionMap, meshgrid, shortest_path_compact
 
 
 def static_potential(domain, targets, obstacles,
                      step: float, radius: float, strength: float) -> \
-        Tuple[MeshGrid, DistanceMap, DirectionMap]:
+        Tuple[MeshGrid, DistanceMap, CompactDirectionMap]:
     r"""
     Navigation algorithm that uses combines `shortest path` and
     `obstacle handling` into single navigation mesh that guides agents towards
@@ -40,18 +40,18 @@ def static_potential(domain, targets, obstacles,
         radius (float):
 
     Returns:
-        Tuple[MeshGrid, DirectionMap]:
+        Tuple[MeshGrid, DistanceMap, CompactDirectionMap]:
     """
     # Compute meshgrid for solving distance maps.
     mgrid = meshgrid(step, *domain.bounds)
 
-    dir_map_targets, dmap_targets = shortest_path(mgrid, domain, targets,
-                                                  obstacles, radius)
+    dir_map_targets, dmap_targets = shortest_path_compact(
+        mgrid, domain, targets, obstacles, radius)
     dir_map_obs, dmap_obs = direction_map_obstacles(mgrid, obstacles)
 
     # Combines two direction maps in a way that agents do not run into a wall
-    dir_map = obstacle_handling(dmap_obs, dir_map_obs, dir_map_targets, radius,
-                                strength)
+    dir_map = obstacle_handling(dmap_obs, dir_map_obs, dir_map_targets,
+                                radius, strength)
 
     return mgrid, dmap_targets, dir_map
 
@@ -64,15 +64,34 @@ def is_inside(a, lower, upper):
     return True
 
 
-@numba.jit((i8[:, :], numba.types.Tuple((f8[:, :], f8[:, :])), f8[:, :]),
+@numba.jit((i8[:, :], f4[:, :, :], f8[:, :]),
            nopython=True, nogil=True, cache=True)
 def getdefault(indices, dir_map, defaults):
+    """Directions from compact direction map of shape ``(ny, nx, 2)`` at
+    indices. Default value is used if index is outside the map or the direction
+    is not defined at the index (value is ``nan``)."""
     assert indices.shape == defaults.shape
     out = np.copy(defaults)
-    x, y = dir_map
+    shape = (dir_map.shape[0], dir_map.shape[1])
     for k in range(len(indices)):
         i, j = indices[k]
-        if is_inside((i, j), (0, 0), x.shape):
-            out[k][0] = x[i, j]
-            out[k][1] = y[i, j]
+        if is_inside((i, j), (0, 0), shape):
+            u, v = dir_map[i, j, 0], dir_map[i, j, 1]
+            if not (np.isnan(u) or np.isnan(v)):
+                out[k][0] = u
+                out[k][1] = v
+    return out
+
+
+@numba.jit((i8[:, :], i8[:, :], i8[:]),
+           nopython=True, nogil=True, cache=True)
+def getdefault_label(indices, label_map, defaults):
+    """Labels from label map at indices. Default value is used if index is
+    outside the map."""
+    assert len(indices) == len(defaults)
+    out = np.copy(defaults)
+    for k in range(len(indices)):
+        i, j = indices[k]
+        if is_inside((i, j), (0, 0), label_map.shape):
+            out[k] = label_map[i, j]
     return out
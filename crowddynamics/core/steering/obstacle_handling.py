@@ -1,16 +1,15 @@
 import numba
 import numpy as np
 from loggingtools import log_with
-from numba import f8, i8
+from numba import f4, f8, i8
 
 from crowddynamics.core.steering.quickest_path import distance_map, \
-    direction_map
+    direction_map_compact
 from crowddynamics.core.vector2D import normalize
 
 
 @log_with(arguments=False, timed=True)
-@numba.jit((f8[:, :], numba.types.Tuple((f8[:, :], f8[:, :])),
-            numba.types.Tuple((f8[:, :], f8[:, :])), f8, f8),
+@numba.jit(f4[:, :, :](f8[:, :], f4[:, :, :], f4[:, :, :], f8, f8),
            nopython=True, nogil=True, cache=True)
 def obstacle_handling(dmap_obs, dir_map_obs, dir_map_targets, radius, strength):
     r"""
@@ -40,10 +39,13 @@ def obstacle_handling(dmap_obs, dir_map_obs, dir_map_targets, radius, strength):
     .. math::
        c^{\frac{x}{r}}
 
+    Direction maps are compact direction maps of shape ``(ny, nx, 2)``.
+    Cells where the direction is not defined are set to ``nan``.
+
     Args:
         dmap_obs:
-        dir_map_obs:
-        dir_map_targets:
+        dir_map_obs (CompactDirectionMap):
+        dir_map_targets (CompactDirectionMap):
         radius (float):
             Radius
         strength (float):
@@ -51,11 +53,9 @@ def obstacle_handling(dmap_obs, dir_map_obs, dir_map_targets, radius, strength):
             distance of radius.
 
     Returns:
-        Tuple[numpy.ndarray, numpy.ndarray]:
+        CompactDirectionMap:
     """
-    u1, v1 = dir_map_obs
-    u2, v2 = dir_map_targets
-    u_out, v_out = np.copy(u2), np.copy(v2)
+    out = np.copy(dir_map_targets)
 
     n, m = dmap_obs.shape
     for i in range(n):
@@ -66,12 +66,21 @@ def obstacle_handling(dmap_obs, dir_map_obs, dir_map_targets, radius, strength):
                 # Decreasing function
                 p = strength ** (x / radius)
                 # Weighted average
-                u_out[i, j] = - p * u1[i, j] + (1 - p) * u2[i, j]
-                v_out[i, j] = - p * v1[i, j] + (1 - p) * v2[i, j]
+                out[i, j, 0] = - p * dir_map_obs[i, j, 0] + \
+                               (1 - p) * dir_map_targets[i, j, 0]
+                out[i, j, 1] = - p * dir_map_obs[i, j, 1] + \
+                               (1 - p) * dir_map_targets[i, j, 1]
+
+            # Normalize the output
+            l = np.hypot(out[i, j, 0], out[i, j, 1])
+            if l > 0:
+                out[i, j, 0] /= l
+                out[i, j, 1] /= l
+            else:
+                out[i, j, 0] = np.nan
+                out[i, j, 1] = np.nan
 
-    # Normalize the output
-    l = np.hypot(u_out, v_out)
-    return u_out / l, v_out / l
+    return out
 
 
 @numba.jit((f8[:, :], numba.types.Tuple((f8[:, :], f8[:, :])),
@@ -104,7 +113,11 @@ def obstacle_handling_continuous(dmap_obs, dir_map_obs, direction_target,
 
 @log_with(arguments=False, timed=True)
 def direction_map_obstacles(mgrid, obstacles):
-    """Vector field towards obstacles"""
+    """Vector field towards obstacles as compact direction map
+
+    Returns:
+        Tuple[CompactDirectionMap, DistanceMap]:
+    """
     dmap_obs = distance_map(mgrid, obstacles, None)
-    dir_map_obs = direction_map(dmap_obs)
+    dir_map_obs = direction_map_compact(dmap_obs)
     return dir_map_obs, dmap_obs
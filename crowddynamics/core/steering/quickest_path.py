@@ -1,12 +1,16 @@
-from typing import Tuple, Optional, NamedTuple, Callable
+from typing import Tuple, Optional, NamedTuple, Callable, List
 
+import numba
 import numpy as np
 import skfmm
+from numba import b1, f4, f8, i8, void
 from scipy.interpolate import NearestNDInterpolator
+from scipy.ndimage import distance_transform_edt
 from shapely.geometry.base import BaseGeometry
 from skimage.segmentation import find_boundaries
 
-from crowddynamics.core.geometry import draw_geom
+from crowddynamics.core.geometry import rasterize, union
+from crowddynamics.simulation.agents import NO_TARGET
 
 MeshGrid = NamedTuple('MeshGrid', [('values', np.ndarray),
                                    ('shape', tuple),
@@ -15,6 +19,13 @@ MeshGrid = NamedTuple('MeshGrid', [('values', np.ndarray),
                                    ('indicer', Callable)])
 DistanceMap = np.ndarray  # can be masked array
 DirectionMap = Tuple[np.ma.MaskedArray, np.ma.MaskedArray]
+CompactDirectionMap = np.ndarray  # float32 array of shape (ny, nx, 2)
+TargetLabelMap = np.ndarray  # int64 array of target indices
+
+# Packing of direction angles into int16. Value of ANGLE_BLOCKED marks cells
+# where direction is not defined.
+ANGLE_BLOCKED = np.iinfo(np.int16).min
+ANGLE_SCALE = np.iinfo(np.int16).max / np.pi
 
 
 # Grid
@@ -106,9 +117,10 @@ def distance_map(mgrid: MeshGrid,
     contour = np.full(mgrid.shape, empty_region, dtype=np.float64)
     mask = np.full(mgrid.shape, non_obstacle_region, dtype=np.bool_)
 
-    draw_geom(targets, contour, mgrid.indicer, target_region)
+    rasterize(targets, contour, mgrid.bounds[:2], mgrid.step, target_region)
     if obstacles is not None:
-        draw_geom(obstacles, mask, mgrid.indicer, obstacle_region)
+        rasterize(obstacles, mask, mgrid.bounds[:2], mgrid.step,
+                  obstacle_region)
 
     # Solve distance map using Fast-Marching Method (FMM)
     phi = np.ma.MaskedArray(contour, mask)
@@ -163,11 +175,159 @@ def direction_map(dmap: DistanceMap):
     return v / l, u / l
 
 
+@numba.jit(void(f8[:, :], b1[:, :], f4[:, :, :]),
+           nopython=True, nogil=True, cache=True)
+def _direction_map_compact(dmap, mask, out):
+    """Same differences as ``numpy.gradient``: central differences inside
+    and one-sided differences at the borders."""
+    n, m = dmap.shape
+    for i in range(n):
+        i0, i1 = max(i - 1, 0), min(i + 1, n - 1)
+        for j in range(m):
+            j0, j1 = max(j - 1, 0), min(j + 1, m - 1)
+            if mask[i0, j] or mask[i1, j] or mask[i, j0] or mask[i, j1]:
+                out[i, j, 0] = np.nan
+                out[i, j, 1] = np.nan
+                continue
+            u = (dmap[i1, j] - dmap[i0, j]) / (i1 - i0)
+            v = (dmap[i, j1] - dmap[i, j0]) / (j1 - j0)
+            l = np.hypot(u, v)
+            if l == 0:
+                out[i, j, 0] = np.nan
+                out[i, j, 1] = np.nan
+            else:
+                # Flip order from (row, col) to (x, y)
+                out[i, j, 0] = v / l
+                out[i, j, 1] = u / l
+
+
+def direction_map_compact(dmap: DistanceMap):
+    """Same as :func:`direction_map` but computed directly into compact
+    direction map without the intermediate (masked) component arrays.
+
+    Args:
+        dmap (numpy.ndarray):
+            Distance map.
+
+    Returns:
+        CompactDirectionMap:
+    """
+    out = np.empty(dmap.shape + (2,), dtype=np.float32)
+    _direction_map_compact(np.ma.getdata(dmap).astype(np.float64),
+                           np.ma.getmaskarray(dmap), out)
+    return out
+
+
+def compact_direction_map(dir_map: DirectionMap, dtype=np.float32):
+    """Packs the components of direction map into single array of shape
+    ``(ny, nx, 2)``. Masked values are replaced with ``nan`` which marks the
+    cells where the direction is not defined (for example inside obstacles).
+
+    Args:
+        dir_map (DirectionMap):
+            Direction map as tuple of (masked) arrays.
+        dtype (numpy.dtype):
+            Float type of the output. Defaults to ``float32`` which halves the
+            memory compared to ``float64`` components.
+
+    Returns:
+        CompactDirectionMap:
+    """
+    u, v = dir_map
+    out = np.empty(u.shape + (2,), dtype=dtype)
+    out[..., 0] = np.ma.filled(u, np.nan)
+    out[..., 1] = np.ma.filled(v, np.nan)
+    return out
+
+
+def pack_angles(dir_map: CompactDirectionMap):
+    r"""Packs compact direction map into angles
+    :math:`\varphi \in [-\pi, \pi]` quantized to ``int16``. Cells where the
+    direction is not defined are set to ``ANGLE_BLOCKED``.
+
+    Args:
+        dir_map (CompactDirectionMap):
+
+    Returns:
+        numpy.ndarray: Array of shape ``(ny, nx)`` and dtype ``int16``.
+    """
+    angle = np.arctan2(dir_map[..., 1], dir_map[..., 0])
+    blocked = np.isnan(angle)
+    angle[blocked] = 0.0
+    limit = np.iinfo(np.int16).max
+    packed = np.clip(np.round(angle * ANGLE_SCALE), -limit, limit)
+    packed = packed.astype(np.int16)
+    packed[blocked] = ANGLE_BLOCKED
+    return packed
+
+
+def unpack_angles(packed, dtype=np.float32):
+    """Unpacks angles packed by :func:`pack_angles` into compact direction map.
+
+    Args:
+        packed (numpy.ndarray):
+        dtype (numpy.dtype):
+
+    Returns:
+        CompactDirectionMap:
+    """
+    angle = packed / ANGLE_SCALE
+    out = np.empty(packed.shape + (2,), dtype=dtype)
+    out[..., 0] = np.cos(angle)
+    out[..., 1] = np.sin(angle)
+    out[packed == ANGLE_BLOCKED] = np.nan
+    return out
+
+
 # Potentials
 
 def fill_missing(mask, x, y, u, v):
+    """Fill missing values with the values of the nearest non-masked cells.
+
+    Nearest cells are found using Euclidean feature transform of the mask of
+    the direction map, which finds the index of the nearest non-masked cell for
+    every cell in linear time.
+
+    Args:
+        mask (numpy.ndarray): Boolean array of the cells to fill.
+        x (numpy.ndarray): Meshgrid x-coordinates. Unused.
+        y (numpy.ndarray): Meshgrid y-coordinates. Unused.
+        u (numpy.ma.MaskedArray): x-component of the direction map.
+        v (numpy.ma.MaskedArray): y-component of the direction map.
+    """
+    # Copy because mask can share memory with the masks of u and v which are
+    # altered by the assignment.
+    mask = np.array(mask, dtype=np.bool_)
+    missing = np.ma.getmaskarray(u)
+    if not np.any(mask) or np.all(missing):
+        return
+    i, j = distance_transform_edt(missing, return_distances=False,
+                                  return_indices=True)
+    nearest = (i[mask], j[mask])
+    u[mask] = np.ma.getdata(u)[nearest]
+    v[mask] = np.ma.getdata(v)[nearest]
+
+
+def fill_missing_compact(mask, dir_map):
+    """Same as :func:`fill_missing` for compact direction map where missing
+    values are ``nan``.
+
+    Args:
+        mask (numpy.ndarray): Boolean array of the cells to fill.
+        dir_map (CompactDirectionMap):
+    """
+    missing = np.isnan(dir_map[..., 0])
+    if not np.any(mask) or np.all(missing):
+        return
+    i, j = distance_transform_edt(missing, return_distances=False,
+                                  return_indices=True)
+    dir_map[mask] = dir_map[i[mask], j[mask]]
+
+
+def fill_missing_interpolate(mask, x, y, u, v):
     """Fill missing value with by interpolating the values from nearest
-    neighbours"""
+    neighbours. Slower reference implementation of :func:`fill_missing` that
+    constructs KD-trees from the boundaries of the masked values."""
     # Construct the interpolators from the boundary values surrounding the
     # missing values.
     boundaries = find_boundaries(u.mask, mode='outer')
@@ -190,8 +350,122 @@ def shortest_path(mgrid, domain, targets, obstacles, buffer_radius):
 
     # Fill values between buffered region and obstacles
     mask = np.full(mgrid.shape, False, dtype=np.bool_)
-    draw_geom(obstacles, mask, mgrid.indicer, True)
+    rasterize(obstacles, mask, mgrid.bounds[:2], mgrid.step, True)
     fill_missing(np.logical_xor(mask, dir_map_targets[0].mask),
                  *mgrid.values, *dir_map_targets)
 
     return dir_map_targets, dmap_targets
+
+
+def shortest_path_compact(mgrid, domain, targets, obstacles, buffer_radius):
+    """Same as :func:`shortest_path` but the direction map is computed and
+    filled directly as compact direction map.
+
+    Returns:
+        Tuple[CompactDirectionMap, DistanceMap]:
+    """
+    obstacles_buffered = obstacles.buffer(buffer_radius).intersection(domain)
+
+    dmap_targets = distance_map(mgrid, targets, obstacles_buffered)
+    dir_map_targets = direction_map_compact(dmap_targets)
+
+    # Fill values between buffered region and obstacles
+    mask = np.full(mgrid.shape, False, dtype=np.bool_)
+    rasterize(obstacles, mask, mgrid.bounds[:2], mgrid.step, True)
+    fill_missing_compact(
+        np.logical_xor(mask, np.isnan(dir_map_targets[..., 0])),
+        dir_map_targets)
+
+    return dir_map_targets, dmap_targets
+
+
+# Labels
+
+@numba.jit(i8[:, :](f8[:, :], b1[:, :], i8[:, :]),
+           nopython=True, nogil=True, cache=True)
+def propagate_labels(dmap, mask, labels):
+    """Propagates the labels of the target cells to the other cells in the
+    order of increasing distance. Each cell gets the label of its neighbour
+    that is closest to the targets, which is the neighbour in the direction of
+    the shortest path.
+
+    Args:
+        dmap (numpy.ndarray): Distance map from the union of the targets.
+        mask (numpy.ndarray): Boolean array of cells that are not passable.
+        labels (numpy.ndarray): Labels of target cells, ``NO_TARGET`` for
+            other cells.
+
+    Returns:
+        TargetLabelMap:
+    """
+    out = np.copy(labels)
+    n, m = dmap.shape
+    order = np.argsort(np.abs(dmap).ravel())
+    for k in order:
+        i, j = k // m, k % m
+        if mask[i, j] or out[i, j] != NO_TARGET:
+            continue
+
+        closest = np.inf
+        for di in range(-1, 2):
+            for dj in range(-1, 2):
+                i2, j2 = i + di, j + dj
+                if not (0 <= i2 < n and 0 <= j2 < m):
+                    continue
+                if mask[i2, j2] or out[i2, j2] == NO_TARGET:
+                    continue
+                d = abs(dmap[i2, j2])
+                if d < closest:
+                    closest = d
+                    out[i, j] = out[i2, j2]
+    return out
+
+
+def target_label_map(mgrid: MeshGrid, targets: List[BaseGeometry],
+                     dmap: DistanceMap):
+    """Label map that has the index of the closest target for every cell of
+    the meshgrid. Labels are obtained from the distance map from the union
+    of the targets in a single pass. Cells that are not reached, for example
+    cells inside the obstacles, get the label of the nearest labeled cell.
+
+    Args:
+        mgrid (MeshGrid):
+        targets (List[BaseGeometry]): List of targets.
+        dmap (DistanceMap): Distance map from the union of the targets.
+
+    Returns:
+        TargetLabelMap:
+    """
+    labels = np.full(mgrid.shape, NO_TARGET, dtype=np.int64)
+    for index, target in enumerate(targets):
+        rasterize(target, labels, mgrid.bounds[:2], mgrid.step, index)
+
+    labels = propagate_labels(np.ma.getdata(dmap).astype(np.float64),
+                              np.ma.getmaskarray(dmap), labels)
+
+    # Fill the rest from the nearest labeled cell
+    missing = labels == NO_TARGET
+    if np.any(missing) and not np.all(missing):
+        i, j = distance_transform_edt(missing, return_distances=False,
+                                      return_indices=True)
+        labels = labels[i, j]
+    return labels
+
+
+def shortest_path_labels(mgrid, domain, targets, obstacles, buffer_radius):
+    """Vector field guiding towards the closest of the targets and label map
+    of the index of the closest target.
+
+    Args:
+        mgrid (MeshGrid):
+        domain (Polygon):
+        targets (List[BaseGeometry]):
+        obstacles (BaseGeometry):
+        buffer_radius (float):
+
+    Returns:
+        Tuple[DirectionMap, DistanceMap, TargetLabelMap]:
+    """
+    dir_map, dmap = shortest_path(mgrid, domain, union(*targets), obstacles,
+                                  buffer_radius)
+    return dir_map, dmap, target_label_map(mgrid, targets, dmap)
@@ -0,0 +1,25 @@
+import numpy as np
+
+from crowddynamics.core.steering.navigation import getdefault, \
+    getdefault_label
+
+
+def test_getdefault():
+    dir_map = np.zeros((4, 5, 2), dtype=np.float32)
+    dir_map[..., 0] = 1.0
+    dir_map[2, 3] = np.nan
+    indices = np.array([(0, 0), (2, 3), (4, 0), (-1, 2)], dtype=np.int64)
+    defaults = np.full((4, 2), 0.5)
+    out = getdefault(indices, dir_map, defaults)
+    assert np.allclose(out[0], (1.0, 0.0))
+    assert np.allclose(out[1:], 0.5)
+
+
+def test_getdefault_label():
+    label_map = np.zeros((4, 5), dtype=np.int64)
+    label_map[:, 3:] = 1
+    indices = np.array([(0, 0), (2, 3), (4, 0), (-1, 2)], dtype=np.int64)
+    defaults = np.full(4, -1, dtype=np.int64)
+    out = getdefault_label(indices, label_map, defaults)
+    assert np.array_equal(out, (0, 1, -1, -1))
+    assert np.all(defaults == -1)
@@ -1,10 +1,15 @@
 import numpy as np
 import pytest
+from hypothesis import assume
 from hypothesis.core import given
 from hypothesis.extra.numpy import arrays
+from shapely.geometry import LineString, Point, Polygon
 
+from crowddynamics.core.geometry import union
 from crowddynamics.core.steering.quickest_path import direction_map, \
-    distance_map, meshgrid
+    distance_map, meshgrid, compact_direction_map, pack_angles, \
+    unpack_angles, fill_missing, target_label_map, shortest_path_labels, \
+    direction_map_compact, shortest_path, shortest_path_compact
 from crowddynamics.testing import reals
 
 
@@ -26,3 +31,116 @@ def test_direction_map(dmap):
     u, v = direction_map(dmap)
     assert u.shape == dmap.shape
     assert v.shape == dmap.shape
+
+
+@given(dmap=arrays(dtype=np.float64, shape=(5, 5),
+                   elements=reals(-10, 10, exclude_zero=True)))
+def test_compact_direction_map(dmap):
+    u, v = direction_map(dmap)
+    compact = compact_direction_map((u, v))
+    assert compact.shape == dmap.shape + (2,)
+    assert compact.dtype == np.float32
+    assert np.allclose(compact[..., 0], u, equal_nan=True)
+    assert np.allclose(compact[..., 1], v, equal_nan=True)
+
+
+@given(dmap=arrays(dtype=np.float64, shape=(5, 5),
+                   elements=reals(-10, 10, exclude_zero=True)),
+       mask=arrays(dtype=np.bool_, shape=(5, 5)))
+def test_direction_map_compact(dmap, mask):
+    # Masked values propagate to the differences like nan values
+    expected = compact_direction_map(direction_map(np.where(mask, np.nan,
+                                                            dmap)))
+    compact = direction_map_compact(np.ma.MaskedArray(dmap, mask))
+    assert compact.dtype == np.float32
+    assert np.allclose(compact, expected, equal_nan=True)
+
+
+def test_shortest_path_compact():
+    mgrid = meshgrid(0.1, 0.0, 0.0, 10.0, 4.0)
+    domain = Polygon([(0, 0), (10, 0), (10, 4), (0, 4)])
+    targets = LineString([(10, 0), (10, 4)])
+    obstacles = LineString([(0, 1.5), (5, 1.5)])
+    _, dmap = shortest_path(mgrid, domain, targets, obstacles, 0.3)
+    dir_map, dmap2 = shortest_path_compact(mgrid, domain, targets, obstacles,
+                                           0.3)
+    assert np.allclose(dmap, dmap2)
+    assert dir_map.shape == mgrid.shape + (2,)
+    assert dir_map.dtype == np.float32
+    defined = ~np.isnan(dir_map[..., 0])
+    assert np.allclose(np.hypot(dir_map[defined, 0], dir_map[defined, 1]),
+                       1.0, atol=1e-6)
+    # Direction points towards the target
+    j, i = mgrid.indicer((8.0, 2.0))
+    assert np.allclose(dir_map[i, j], (1.0, 0.0), atol=1e-3)
+
+
+def test_compact_direction_map_masked():
+    mask = np.zeros((3, 3), dtype=np.bool_)
+    mask[1, 1] = True
+    u = np.ma.MaskedArray(np.ones((3, 3)), mask)
+    v = np.ma.MaskedArray(np.zeros((3, 3)), mask)
+    compact = compact_direction_map((u, v))
+    assert np.all(np.isnan(compact[1, 1]))
+    assert np.sum(np.isnan(compact)) == 2
+
+
+@given(angle=reals(-np.pi, np.pi, shape=(5, 5)))
+def test_pack_angles(angle):
+    compact = compact_direction_map((np.cos(angle), np.sin(angle)))
+    compact[0, 0] = np.nan
+    packed = pack_angles(compact)
+    assert packed.dtype == np.int16
+    unpacked = unpack_angles(packed)
+    assert np.allclose(unpacked, compact, atol=1e-3, equal_nan=True)
+
+
+@given(values=reals(-1, 1, shape=(6, 7)),
+       mask=arrays(dtype=np.bool_, shape=(6, 7)))
+def test_fill_missing(values, mask):
+    assume(not np.all(mask))
+    mgrid = meshgrid(1.0, 0.0, 0.0, 6.0, 5.0)
+    u = np.ma.MaskedArray(np.copy(values), mask)
+    v = np.ma.MaskedArray(-np.copy(values), mask)
+    fill_missing(mask, *mgrid.values, u, v)
+    assert not np.any(np.ma.getmaskarray(u))
+
+    # Filled values are copied from the nearest non-masked cell.
+    valid = np.argwhere(~mask)
+    for i, j in np.argwhere(mask):
+        d = np.hypot(*(valid - (i, j)).T)
+        nearest = valid[d == d.min()]
+        assert u[i, j] in values[nearest[:, 0], nearest[:, 1]]
+        assert v[i, j] == -u[i, j]
+
+
+def test_target_label_map():
+    mgrid = meshgrid(0.1, 0.0, 0.0, 10.0, 4.0)
+    targets = [LineString([(0, 0), (0, 4)]),
+               LineString([(10, 0), (10, 4)])]
+    dmap = distance_map(mgrid, union(*targets), None)
+    labels = target_label_map(mgrid, targets, dmap)
+    assert labels.shape == mgrid.shape
+    x, _ = mgrid.values
+    assert np.all(labels[x < 4.9] == 0)
+    assert np.all(labels[x > 5.1] == 1)
+
+
+def test_shortest_path_labels():
+    mgrid = meshgrid(0.1, 0.0, 0.0, 10.0, 4.0)
+    domain = Polygon([(0, 0), (10, 0), (10, 4), (0, 4)])
+    targets = [LineString([(0, 0), (0, 1)]),
+               LineString([(10, 0), (10, 4)])]
+    # Wall above the first target that the shortest paths go around
+    obstacles = LineString([(0, 1.5), (5, 1.5)])
+    dir_map, dmap, labels = shortest_path_labels(mgrid, domain, targets,
+                                                 obstacles, 0.3)
+    assert labels.shape == mgrid.shape
+
+    # Point above the wall is closer to the first target by straight line
+    # distance but closer to the second target by the geodesic distance
+    point = Point(4.5, 3.5)
+    assert targets[0].distance(point) < targets[1].distance(point)
+    position = np.array([(1.0, 0.5), (4.5, 3.5), (8.0, 2.0)])
+    j, i = mgrid.indicer(position).T
+    assert np.array_equal(labels[i, j], (0, 1, 1))
@@ -0,0 +1,36 @@
+import numpy as np
+import pytest
+
+from crowddynamics.core.geometry import rasterize
+from crowddynamics.core.steering.quickest_path import distance_map, \
+    direction_map, fill_missing, fill_missing_interpolate
+from crowddynamics.examples.fields import RoomWithOneExit, FourExitsField
+
+
+def missing_values(field, step, radius=0.5):
+    """Inputs for filling the direction map between the buffered region and
+    the obstacles like in shortest_path."""
+    mgrid = field.meshgrid(step)
+    obstacles_buffered = field.obstacles.buffer(radius).intersection(
+        field.domain)
+    dmap = distance_map(mgrid, field.targets[0], obstacles_buffered)
+    u, v = direction_map(dmap)
+    mask = np.full(mgrid.shape, False, dtype=np.bool_)
+    rasterize(field.obstacles, mask, mgrid.bounds[:2], mgrid.step, True)
+    return np.logical_xor(mask, u.mask), mgrid.values, u, v
+
+
+@pytest.mark.parametrize('function', (fill_missing, fill_missing_interpolate))
+@pytest.mark.parametrize('field, step', [
+    (RoomWithOneExit(), 0.1),
+    (RoomWithOneExit(), 0.02),
+    (FourExitsField(), 0.1),
+])
+def test_fill_missing(benchmark, function, field, step):
+    mask, (x, y), u, v = missing_values(field, step)
+
+    def setup():
+        return (mask, x, y, u.copy(), v.copy()), {}
+
+    benchmark.pedantic(function, setup=setup, rounds=5)
+    assert True
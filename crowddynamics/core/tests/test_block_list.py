@@ -1,10 +1,11 @@
 from array import array
 from random import uniform
 
+import numpy as np
 import pytest
 from sortedcontainers.sortedlist import SortedList
 
-from crowddynamics.core.block_list import MutableBlockList
+from crowddynamics.core.block_list import MutableBlockList, SpatialHash
 
 
 def points(dimensions, interval=(-1.0, 1.0)):
@@ -23,3 +24,20 @@ def test_mutable_block_list(dimensions, default_list, cell_size=1.0):
         mutable_blocklist[point] = i
     assert set(mutable_blocklist.nearest(dimensions * (0.0,), radius=1)) == \
            set(_list)
+
+
+@pytest.mark.parametrize('cell_size', (0.27, 1.0))
+@pytest.mark.parametrize('radius', (1, 2))
+def test_spatial_hash(cell_size, radius, size=1000):
+    # Few buckets and capacity force collisions and growing the arrays
+    spatial_hash = SpatialHash(cell_size, buckets=4)
+    mutable_blocklist = MutableBlockList(cell_size)
+    points = np.random.uniform(-5.0, 5.0, (size, 2))
+    for i, point in enumerate(points):
+        assert spatial_hash.insert(point) == i
+        mutable_blocklist[point] = i
+    assert len(spatial_hash) == size
+    for point in np.random.uniform(-6.0, 6.0, (100, 2)):
+        indices = spatial_hash.nearest(point, radius)
+        assert len(indices) == len(set(indices))
+        assert set(indices) == set(mutable_blocklist.nearest(point, radius))
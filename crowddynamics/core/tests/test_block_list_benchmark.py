@@ -4,7 +4,7 @@ from collections import defaultdict
 import numpy as np
 import pytest
 
-from crowddynamics.core.block_list import MutableBlockList
+from crowddynamics.core.block_list import MutableBlockList, SpatialHash
 
 
 @pytest.mark.parametrize('cell_size', (0.27,))
@@ -49,3 +49,44 @@ def test_mutable_blocklist_getitem(benchmark, size, cell_size):
     key = np.random.uniform(-1.0, 1.0, 2)
     benchmark(mutable_blocklist.__getitem__, key)
     assert True
+
+
+@pytest.mark.parametrize('cell_size', (0.27,))
+@pytest.mark.parametrize('size', (100, 500, 1000))
+def test_mutable_blocklist_nearest(benchmark, size, cell_size):
+    mutable_blocklist = MutableBlockList(cell_size)
+
+    for value in range(size):
+        key = np.random.uniform(-1.0, 1.0, 2)
+        mutable_blocklist[key] = value
+
+    key = np.random.uniform(-1.0, 1.0, 2)
+    benchmark(mutable_blocklist.nearest, key)
+    assert True
+
+
+@pytest.mark.parametrize('cell_size', (0.27,))
+@pytest.mark.parametrize('size', (100, 250, 500, 1000))
+def test_spatial_hash_insert(benchmark, size, cell_size):
+    points = np.random.uniform(-1.0, 1.0, (size, 2))
+
+    def f():
+        spatial_hash = SpatialHash(cell_size, capacity=size)
+        for point in points:
+            spatial_hash.insert(point)
+
+    benchmark(f)
+    assert True
+
+
+@pytest.mark.parametrize('cell_size', (0.27,))
+@pytest.mark.parametrize('size', (100, 500, 1000))
+def test_spatial_hash_nearest(benchmark, size, cell_size):
+    spatial_hash = SpatialHash(cell_size)
+
+    for _ in range(size):
+        spatial_hash.insert(np.random.uniform(-1.0, 1.0, 2))
+
+    key = np.random.uniform(-1.0, 1.0, 2)
+    benchmark(spatial_hash.nearest, key)
+    assert True
@@ -2,8 +2,11 @@ import hypothesis.strategies as st
 import numpy as np
 from hypothesis import given, assume
 
+from shapely.geometry import LineString
+
 from crowddynamics.core.evacuation import agent_closer_to_exit, \
-    narrow_exit_capacity
+    narrow_exit_capacity, line_crossings, agents_closer_to_exits, repair_order
+from crowddynamics.core.geometry import geom_to_linear_obstacles
 from crowddynamics.testing import reals
 
 
@@ -15,6 +18,36 @@ def test_agent_closer_to_exit(c_door, position):
     assert indices.dtype.type is np.int64
 
 
+@given(values=reals(-10, 10, shape=20))
+def test_repair_order(values):
+    order = np.arange(len(values))
+    assert repair_order(order, values, 10 ** 6)
+    assert np.all(np.diff(values[order]) >= 0)
+    assert np.array_equal(np.sort(order), np.arange(len(values)))
+
+    order = np.arange(len(values))[::-1].copy()
+    repair_order(order, values, 0)
+    assert np.array_equal(np.sort(order), np.arange(len(values)))
+
+
+def test_agents_closer_to_exits():
+    np.random.seed(0)
+    position = np.random.uniform(0, 10, size=(100, 2))
+    c_doors = np.array(((0.0, 5.0), (10.0, 5.0), (5.0, 0.0)))
+    active = np.ones(len(position), dtype=np.bool_)
+    order = np.tile(np.arange(len(position)), (len(c_doors), 1))
+    out = np.zeros((len(position), len(c_doors)), dtype=np.int64)
+    for step in range(5):
+        position += np.random.normal(0, 0.1, size=position.shape)
+        if step == 3:
+            active[:10] = False
+        agents_closer_to_exits(c_doors, position, active, order, out)
+        for e, c_door in enumerate(c_doors):
+            expected = agent_closer_to_exit(c_door, position[active])
+            assert np.array_equal(out[active, e], expected)
+            assert np.all(out[~active, e] >= np.sum(active))
+
+
 @given(d_door=reals(0.0, 3.0, exclude_zero='near'),
        d_agent=reals(0.0, 3.0, exclude_zero='near'),
        d_layer=reals(0.0, 1.0, exclude_zero='near') | st.none(),
@@ -24,3 +57,29 @@ def test_narrow_exit_capacity(d_door, d_agent, d_layer, coeff):
     capacity = narrow_exit_capacity(d_door, d_agent, d_layer, coeff)
     assert isinstance(capacity, float)
     assert capacity >= 0.0
+
+
+def test_line_crossings():
+    lines = geom_to_linear_obstacles(LineString(((1, 0), (1, 1), (1, 2))))
+    line_index = np.zeros(len(lines), dtype=np.int64)
+    previous = np.array(((0.5, 0.5), (0.5, 1.0), (1.5, 1.5), (0.5, 3.0),
+                         (1.0, 1.5), (0.5, 0.5)))
+    current = np.array(((1.5, 0.5), (1.0, 1.0), (0.5, 1.5), (1.5, 3.0),
+                        (1.5, 1.5), (1.5, 0.5)))
+    active = np.array((True, True, True, True, True, False))
+    crossings = line_crossings(previous, current, active, lines, line_index, 1)
+    # Agent moving onto the line is counted and leaving the line is not
+    assert np.array_equal(crossings[:, 0], (-1, -1, 1, 0, 0, 0))
+
+
+@given(previous=reals(0.0, 1.0, shape=(10, 2)),
+       current=reals(0.0, 1.0, shape=(10, 2)),
+       line=reals(0.0, 1.0, shape=(2, 2)))
+def test_line_crossings_intersect(previous, current, line):
+    assume(not np.allclose(line[0], line[1]))
+    lines = geom_to_linear_obstacles(LineString(line))
+    crossings = line_crossings(previous, current, np.ones(10, np.bool_),
+                               lines, np.zeros(1, np.int64), 1)
+    for p0, p1, sign in zip(previous, current, crossings[:, 0]):
+        if sign != 0:
+            assert LineString((p0, p1)).distance(LineString(line)) < 1e-9
@@ -0,0 +1,41 @@
+import numpy as np
+import pytest
+
+from crowddynamics.core.evacuation import agent_closer_to_exit, \
+    agents_closer_to_exits
+
+
+def positions(size):
+    rng = np.random.RandomState(0)
+    position = rng.uniform(0, 50, (size, 2))
+    c_doors = np.array(((0.0, 25.0), (50.0, 25.0), (25.0, 0.0)))
+    return rng, position, c_doors
+
+
+@pytest.mark.parametrize('size', (1000, 10000))
+def test_agent_closer_to_exit(benchmark, size):
+    rng, position, c_doors = positions(size)
+
+    def update():
+        position[:] += rng.normal(0, 0.01, position.shape)
+        for c_door in c_doors:
+            agent_closer_to_exit(c_door, position)
+
+    benchmark(update)
+    assert True
+
+
+@pytest.mark.parametrize('size', (1000, 10000))
+def test_agents_closer_to_exits(benchmark, size):
+    rng, position, c_doors = positions(size)
+    active = np.ones(size, dtype=np.bool_)
+    order = np.tile(np.arange(size), (len(c_doors), 1))
+    out = np.zeros((size, len(c_doors)), dtype=np.int64)
+    agents_closer_to_exits(c_doors, position, active, order, out)
+
+    def update():
+        position[:] += rng.normal(0, 0.01, position.shape)
+        agents_closer_to_exits(c_doors, position, active, order, out)
+
+    benchmark(update)
+    assert True
@@ -1,7 +1,15 @@
+import numpy as np
+import pytest
 from hypothesis.core import given
+from shapely.geometry import LineString, Polygon
 
 from crowddynamics import testing
-from crowddynamics.core.geometry import geom_to_linesegment, geom_to_array
+from crowddynamics.core.geometry import geom_to_linesegment, geom_to_array, \
+    geom_to_linear_obstacles, draw_geom, rasterize, union
+from crowddynamics.core.steering.quickest_path import meshgrid
+from crowddynamics.core.structures import obstacle_type_linear
+from crowddynamics.examples.fields import HallwayField, FourExitsField, \
+    RoomWithOneExit
 
 
 @given(geom=testing.points() |
@@ -18,3 +26,46 @@ def test_geom_to_array(geom):
 def test_geom_to_linesegment(geom):
     array = geom_to_linesegment(geom)
     assert True
+
+
+@given(geom=testing.points() |
+            testing.linestrings(num_verts=3) |
+            testing.polygons(num_verts=4))
+def test_geom_to_linear_obstacles(geom):
+    array = geom_to_linear_obstacles(geom)
+    expected = np.array(list(geom_to_linesegment(geom)),
+                        dtype=obstacle_type_linear)
+    assert array.dtype == obstacle_type_linear
+    assert np.array_equal(array, expected)
+
+
+@pytest.mark.parametrize('field', (HallwayField(), FourExitsField(),
+                                   RoomWithOneExit()))
+def test_rasterize(field):
+    mgrid = meshgrid(0.1, *field.domain.bounds)
+    for geom in (field.obstacles, union(*field.targets), field.domain):
+        expected = np.zeros(mgrid.shape, dtype=np.bool_)
+        draw_geom(geom, expected, mgrid.indicer, True)
+        grid = np.zeros(mgrid.shape, dtype=np.bool_)
+        rasterize(geom, grid, mgrid.bounds[:2], mgrid.step, True)
+        assert np.array_equal(grid, expected)
+
+
+def test_rasterize_holes():
+    polygon = Polygon([(0, 0), (10, 0), (10, 10), (0, 10)],
+                      [[(3, 3), (6, 3), (6, 6), (3, 6)]])
+    mgrid = meshgrid(0.5, 0, 0, 10, 10)
+    grid = np.zeros(mgrid.shape)
+    rasterize(polygon, grid, mgrid.bounds[:2], mgrid.step, 1.0)
+    assert grid[2, 2] == 1.0
+    assert grid[10, 10] == 0.0
+    assert grid[6, 6] == 1.0
+
+
+def test_rasterize_antialiased():
+    grid = np.zeros((20, 20))
+    rasterize(LineString([(1.0, 1.0), (15.0, 7.3)]), grid, (0.0, 0.0), 1.0,
+              1.0, antialiased=True)
+    assert np.all((0.0 <= grid) & (grid <= 1.0))
+    # Coverage of the cells sums to one for each column along the line
+    assert np.allclose(grid[:, 1:16].sum(axis=0), 1.0)
@@ -0,0 +1,34 @@
+import numpy as np
+import pytest
+from shapely.geometry import MultiLineString
+
+from crowddynamics.core.geometry import draw_geom, draw_segments, \
+    geom_to_linear_obstacles
+from crowddynamics.core.steering.quickest_path import meshgrid
+
+
+def random_walls(size, seed=0):
+    rng = np.random.RandomState(seed)
+    starts = rng.uniform(2.0, 98.0, (size, 2))
+    ends = starts + rng.uniform(-1.0, 1.0, (size, 2))
+    return MultiLineString(list(zip(map(tuple, starts), map(tuple, ends))))
+
+
+@pytest.mark.parametrize('size', (1000, 20000))
+def test_draw_geom(benchmark, size):
+    walls = random_walls(size)
+    mgrid = meshgrid(0.05, 0, 0, 100, 100)
+    grid = np.zeros(mgrid.shape, dtype=np.bool_)
+    benchmark(draw_geom, walls, grid, mgrid.indicer, True)
+    assert True
+
+
+@pytest.mark.parametrize('antialiased', (False, True))
+@pytest.mark.parametrize('size', (1000, 20000))
+def test_draw_segments(benchmark, size, antialiased):
+    segments = geom_to_linear_obstacles(random_walls(size))
+    mgrid = meshgrid(0.05, 0, 0, 100, 100)
+    grid = np.zeros(mgrid.shape, dtype=np.float64)
+    benchmark(draw_segments, segments, grid, mgrid.bounds[:2], mgrid.step,
+              1.0, antialiased)
+    assert True
@@ -1,4 +1,6 @@
 import hypothesis.strategies as st
+import numpy as np
+import pytest
 from hypothesis.core import given
 from hypothesis.extra.numpy import arrays
 
@@ -7,7 +9,7 @@ from crowddynamics.core.interactions import (
     interaction_agent_agent_circular,
     interaction_agent_agent_three_circle,
     agent_agent_block_list,
-    agent_circular_obstacle, agent_three_circle_obstacle)
+    agent_circular_obstacle, agent_three_circle_obstacle, density_kernel)
 from crowddynamics.core.structures import obstacle_type_linear
 from crowddynamics.simulation.agents import Circular, ThreeCircle
 
@@ -55,6 +57,25 @@ def test_agent_block_list_three_circle(agents):
     assert True
 
 
+@pytest.mark.parametrize('agent_type', (Circular, ThreeCircle))
+def test_agent_block_list_density(agent_type):
+    np.random.seed(0)
+    agents = np.zeros(50, agent_type.dtype())
+    for i in range(len(agents)):
+        agents[i] = np.array(agent_type(
+            radius=0.25, mass=80.0, body_type='adult',
+            position=np.random.uniform(0, 10, 2)))
+    density = np.zeros(len(agents))
+    radius = 0.7
+    agent_agent_block_list(agents, CELL_SIZE, density, radius)
+
+    position = agents['position']
+    expected = np.array([
+        sum(density_kernel(position[i], position[j], radius)
+            for j in range(len(agents))) for i in range(len(agents))])
+    assert np.allclose(density, expected)
+
+
 # Agent-obstacle
 
 @given(agents=testing.agents(size_strategy=st.just(1),
@@ -3,8 +3,11 @@ import pytest
 from hypothesis.control import assume
 from hypothesis.core import given
 from scipy.spatial.qhull import QhullError, Voronoi
+from shapely.geometry import Point, Polygon
 
-from crowddynamics.core.quantities import density_voronoi_1
+from crowddynamics.core.quantities import density_voronoi_1, \
+    density_classical, density_classical_stream, \
+    density_voronoi, voronoi_finite_polygons_2d, rectangle, scatter_add
 from crowddynamics.testing import reals
 
 
@@ -36,3 +39,109 @@ def test_density_voronoi_1(points):
     cell_size = 0.1
     density = density_voronoi_1(points, cell_size=cell_size)
     assert True
+
+
+def density_voronoi_reference(points, cell_size, area):
+    """Density using Shapely for clipping Voronoi cells into the cells of the
+    grid."""
+    xmin, ymin, xmax, ymax = area.bounds
+    imin, jmin = np.int64(np.floor(np.array((xmin, ymin)) / cell_size))
+    imax, jmax = np.int64(np.floor(np.array((xmax, ymax)) / cell_size))
+    regions, vertices = voronoi_finite_polygons_2d(Voronoi(points), 1000)
+    density = np.zeros((imax - imin + 1, jmax - jmin + 1))
+    for region in regions:
+        voronoi_cell = Polygon(vertices[region]) & area
+        if voronoi_cell.area == 0:
+            continue
+        for i in range(imin, imax + 1):
+            for j in range(jmin, jmax + 1):
+                cell = rectangle(i * cell_size, (i + 1) * cell_size,
+                                 j * cell_size, (j + 1) * cell_size) & area
+                if cell.area > 0:
+                    density[i - imin, j - jmin] += \
+                        (voronoi_cell & cell).area / voronoi_cell.area / \
+                        cell.area
+    return density
+
+
+@pytest.mark.parametrize('seed', range(3))
+def test_density_voronoi(seed):
+    np.random.seed(seed)
+    points = np.random.uniform(1, 10, size=(30, 2))
+    cell_size = 0.5
+    density = density_voronoi(points, cell_size)
+    expected = density_voronoi_1(points, cell_size)
+    assert density.shape == expected.shape
+    # Boundary cells are partially outside of the observation area
+    assert np.allclose(density[1:-1, 1:-1], expected[1:-1, 1:-1])
+
+    (xmin, ymin), (xmax, ymax) = points.min(axis=0), points.max(axis=0)
+    bbox = rectangle(xmin, xmax, ymin, ymax)
+    assert np.allclose(density,
+                       density_voronoi_reference(points, cell_size, bbox))
+
+
+@pytest.mark.parametrize('seed', range(3))
+def test_density_voronoi_observation_area(seed):
+    np.random.seed(seed)
+    points = np.random.uniform(0, 10, size=(40, 2))
+    cell_size = 1.3
+    observation_area = Polygon(((1, 1), (9, 2), (8, 9), (5, 5), (2, 8)))
+    obstacles = Point(4, 4).buffer(1.0) | rectangle(6, 7, 2, 3)
+    density = density_voronoi(points, cell_size, observation_area, obstacles)
+    expected = density_voronoi_reference(
+        points, cell_size, observation_area - obstacles)
+    assert density.shape == expected.shape
+    assert np.allclose(density, expected)
+
+
+def test_scatter_add():
+    points = np.array(((0.5, 0.5), (1.5, 0.2), (1.7, 0.9), (-0.1, 0.5),
+                       (3.1, 0.5), (3.0, 1.0)))
+    values = np.array(((1.0, 2.0), (1.0, 3.0), (1.0, 4.0), (1.0, 5.0),
+                       (1.0, 6.0), (1.0, 7.0)))
+    grid = scatter_add(points, values, np.zeros((3, 1, 2)),
+                       np.array((0.0, 0.0)), 1.0)
+    # Point on the upper edge is in the last cell
+    assert np.array_equal(grid[:, 0, 0], (1, 2, 1))
+    assert np.array_equal(grid[:, 0, 1], (2, 7, 7))
+
+
+def test_density_classical():
+    np.random.seed(0)
+    points = np.random.uniform(-3, 7, size=(100, 2))
+    cell_size = 0.7
+    density = density_classical(points, cell_size)
+    lower = np.floor(points.min(axis=0) / cell_size)
+    upper = np.floor(points.max(axis=0) / cell_size)
+    assert density.shape == tuple(np.int64(upper - lower) + 1)
+    assert np.isclose(np.sum(density) * cell_size ** 2, len(points))
+
+    bounds = (-5, -5, 10, 10)
+    density = density_classical(points, 0.5, bounds)
+    expected, _, _ = np.histogram2d(points[:, 0], points[:, 1], bins=30,
+                                    range=((-5, 10), (-5, 10)))
+    assert np.array_equal(density * 0.5 ** 2, expected)
+
+    # Points outside the bounds are ignored
+    density = density_classical(points, 0.5, (0, 0, 5, 5))
+    inside = np.all((points >= 0) & (points < 5), axis=1)
+    assert np.sum(density) * 0.5 ** 2 == np.sum(inside)
+
+    # Points on the upper bounds are in the last cells
+    edge = np.array([(10, 10), (10, -5), (-5, 10), (10, 2.2), (10.1, 0)])
+    density = density_classical(edge, 0.5, bounds)
+    expected, _, _ = np.histogram2d(edge[:, 0], edge[:, 1], bins=30,
+                                    range=((-5, 10), (-5, 10)))
+    assert np.sum(expected) == 4
+    assert np.array_equal(density * 0.5 ** 2, expected)
+
+
+def test_density_classical_stream():
+    np.random.seed(0)
+    frames = [np.random.uniform(0, 10, size=(50, 2)) for _ in range(5)]
+    bounds = (0, 0, 10, 10)
+    density = density_classical_stream(iter(frames), 1.0, bounds)
+    expected = np.mean([density_classical(points, 1.0, bounds)
+                        for points in frames], axis=0)
+    assert np.allclose(density, expected)
@@ -0,0 +1,41 @@
+import numpy as np
+import pytest
+
+from crowddynamics.core.quantities import density_voronoi, \
+    density_voronoi_1, density_classical, density_classical_stream
+
+
+@pytest.mark.parametrize('size', (200,))
+def test_density_voronoi_1(benchmark, size):
+    points = np.random.RandomState(0).uniform(0, 20, (size, 2))
+    benchmark(density_voronoi_1, points, 0.5)
+    assert True
+
+
+@pytest.mark.parametrize('size', (200, 5000))
+def test_density_voronoi(benchmark, size):
+    points = np.random.RandomState(0).uniform(0, 20 * np.sqrt(size / 200),
+                                              (size, 2))
+    benchmark(density_voronoi, points, 0.5)
+    assert True
+
+
+@pytest.mark.parametrize('size', (1000, 100000))
+def test_density_classical(benchmark, size):
+    points = np.random.RandomState(0).uniform(0, 50, (size, 2))
+    benchmark(density_classical, points, 0.5, (0, 0, 50, 50))
+    assert True
+
+
+@pytest.mark.parametrize('size', (1000, 100000))
+def test_histogram2d(benchmark, size):
+    points = np.random.RandomState(0).uniform(0, 50, (size, 2))
+    benchmark(np.histogram2d, points[:, 0], points[:, 1], 100,
+              ((0, 50), (0, 50)))
+    assert True
+
+
+def test_density_classical_stream(benchmark):
+    frames = np.random.RandomState(0).uniform(0, 50, (100, 1000, 2))
+    benchmark(density_classical_stream, frames, 0.5, (0, 0, 50, 50))
+    assert True
@@ -1,9 +1,12 @@
 import hypothesis.strategies as st
 import numpy as np
+import pytest
+import scipy.stats
 from hypothesis import given, assume
 from hypothesis.extra.numpy import arrays
 
-from crowddynamics.core.rand import poisson_clock, poisson_timings
+from crowddynamics.core.rand import poisson_clock, poisson_timings, \
+    generator_state, uniform, truncnorm, truncnorm_batch
 from crowddynamics.testing import reals
 
 
@@ -30,3 +33,41 @@ def test_poisson_timings(players, interval, dt):
     for index in poisson_timings(players, interval, dt):
         assert isinstance(index, int)
         assert index in players
+
+
+def test_generator_state():
+    state = generator_state(42)
+    assert state.dtype.type is np.uint64
+    assert np.all(state == generator_state(42))
+    assert not np.all(state == generator_state(43))
+    values = np.array([uniform(state) for _ in range(10000)])
+    assert np.all((0.0 <= values) & (values < 1.0))
+    assert abs(np.mean(values) - 0.5) < 0.02
+    # State is advanced
+    assert not np.all(state == generator_state(42))
+
+    np.random.seed(0)
+    state = generator_state()
+    np.random.seed(0)
+    assert np.all(state == generator_state())
+
+
+@pytest.mark.parametrize('start, end', [
+    (-3.0, 3.0), (0.0, 3.0), (1.0, 1.5), (2.0, 8.0), (-5.0, -2.0),
+    (-0.5, 0.5)])
+def test_truncnorm(start, end, size=10000):
+    values = truncnorm(start, end, size=size, random_state=1)
+    assert values.shape == (size,)
+    assert np.all((start <= values) & (values <= end))
+    distribution = scipy.stats.truncnorm(start, end)
+    assert abs(np.mean(values) - distribution.mean()) < \
+        5 * distribution.std() / np.sqrt(size)
+    assert scipy.stats.kstest(values, distribution.cdf).pvalue > 1e-4
+
+
+@given(loc=reals(-10, 10, shape=10), scale=reals(0, 10, shape=10))
+def test_truncnorm_batch(loc, scale):
+    out = np.zeros(10)
+    truncnorm_batch(generator_state(0), -3.0, 3.0, loc, scale, out)
+    assert np.all(loc - 3 * scale - 1e-9 <= out)
+    assert np.all(out <= loc + 3 * scale + 1e-9)
@@ -9,7 +9,7 @@ from shapely.geometry import Polygon, Point
 from crowddynamics.core.geom2D import polygon_area
 from crowddynamics.core.sampling import random_sample_triangle, \
     triangle_area_cumsum, polygon_sample, \
-    linestring_sample
+    linestring_sample, poisson_disk_sample
 from crowddynamics.testing import reals
 
 # Convex shapes
@@ -60,3 +60,69 @@ def test_polygon_sampling(poly):
 
     for i, point in zip(range(100), polygon_sample(exterior)):
         assert poly.contains(Point(point))
+
+
+# Non-convex shape with a hole and multiple parts
+concave = Polygon([(0.0, 0.0), (0.0, 6.0), (6.0, 6.0), (6.0, 4.0),
+                   (2.0, 4.0), (2.0, 2.0), (6.0, 2.0), (6.0, 0.0)])
+holed = Polygon([(0.0, 0.0), (0.0, 6.0), (6.0, 6.0), (6.0, 0.0)]) - \
+    Point(3.0, 3.0).buffer(1.5)
+multi = Polygon([(0.0, 0.0), (0.0, 3.0), (3.0, 3.0), (3.0, 0.0)]) | \
+    Polygon([(5.0, 0.0), (5.0, 3.0), (8.0, 3.0), (8.0, 0.0)])
+
+
+@pytest.mark.parametrize('poly', (square, concave, holed, multi))
+@pytest.mark.parametrize('gap', (0.0, 0.1, 1.0))
+def test_poisson_disk_sample(poly, gap):
+    radii = np.random.uniform(0.1, 0.3, 200)
+    points = poisson_disk_sample(poly, radii, gap=gap)
+    radii = radii[:len(points)]
+    assert points.shape == (len(radii), 2)
+    assert len(points) > 0
+
+    for point, radius in zip(points, radii):
+        # Disk is inside the polygon. Small buffer for numerical error.
+        assert poly.buffer(1e-9).contains(Point(point).buffer(radius))
+
+    diff = points[:, None, :] - points[None, :, :]
+    distance = np.hypot(diff[..., 0], diff[..., 1])
+    overlap = radii[:, None] + radii[None, :] - distance
+    np.fill_diagonal(overlap, 0.0)
+    assert np.all(overlap <= 1e-9)
+
+
+def test_poisson_disk_sample_dense():
+    # Packing reaches area fraction near random close packing
+    poly = Polygon([(0.0, 0.0), (0.0, 10.0), (10.0, 10.0), (10.0, 0.0)])
+    radii = np.full(1000, 0.25)
+    points = poisson_disk_sample(poly, radii)
+    assert len(points) < len(radii)
+    assert np.sum(np.pi * radii[:len(points)] ** 2) / poly.area > 0.65
+
+
+def test_poisson_disk_sample_fixed():
+    # Disks are packed around the fixed disks without overlapping them
+    poly = Polygon([(0.0, 0.0), (0.0, 4.0), (4.0, 4.0), (4.0, 0.0)])
+    fixed_points = poisson_disk_sample(poly, np.full(20, 0.25))
+    fixed_radii = np.full(len(fixed_points), 0.25)
+    radii = np.full(200, 0.2)
+    points = poisson_disk_sample(poly, radii, fixed_points=fixed_points,
+                                 fixed_radii=fixed_radii)
+    assert len(points) > 0
+
+    diff = points[:, None, :] - fixed_points[None, :, :]
+    distance = np.hypot(diff[..., 0], diff[..., 1])
+    overlap = radii[:len(points), None] + fixed_radii[None, :] - distance
+    assert np.all(overlap <= 1e-9)
+
+
+def test_poisson_disk_sample_seed():
+    # Same seed of numpy gives the same positions
+    radii = np.full(100, 0.25)
+    np.random.seed(0)
+    points = poisson_disk_sample(multi, radii)
+    np.random.seed(0)
+    np.testing.assert_array_equal(poisson_disk_sample(multi, radii), points)
+    np.testing.assert_array_equal(
+        poisson_disk_sample(multi, radii, random_state=1),
+        poisson_disk_sample(multi, radii, random_state=1))
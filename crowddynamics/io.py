@@ -4,9 +4,18 @@ Data flow ::
 
     data (ndarray) -> buffer (list) -> file (.npy)
 
+Trajectories are stored in chunks without intermediate buffer ::
+
+    data (ndarray) -> chunk (memory-mapped .npy) + manifest (.json)
+
 """
+import atexit
+import lzma
 import os
-from collections import Iterable, Mapping
+import queue
+import threading
+import zlib
+from collections import Iterable, Mapping, OrderedDict
 from io import StringIO
 import csv
 import json
@@ -98,6 +107,757 @@ def load_npy_concatenated(directory, basename):
     return np.vstack(list(load_npy(directory, basename)))
 
 
+def save_json_atomic(filepath, obj, fsync=False):
+    """Write object into temporary file and replace the file so that the file
+    on disk is always complete.
+
+    Args:
+        filepath (str|Path):
+        obj: JSON serializable object.
+        fsync (bool): Force the file to be written to the disk.
+    """
+    tmp = filepath + '.tmp'
+    with open(tmp, 'w') as fp:
+        json.dump(obj, fp)
+        if fsync:
+            fp.flush()
+            os.fsync(fp.fileno())
+    os.replace(tmp, filepath)
+
+
+# Trajectories : Chunked memory-mapped array data
+
+ENCODINGS = ('float32', 'float16', 'int16')
+
+
+def descr_to_dtype(descr):
+    """Structured dtype from descr loaded from JSON which turns the tuples in
+    the descr into lists."""
+    return np.dtype([tuple(field[:2]) + tuple(tuple(shape)
+                                              for shape in field[2:])
+                     for field in descr])
+
+
+class FrameEncoder(object):
+    """Projection of frames of agent data to subset of fields and encoding of
+    floating point fields into smaller types
+
+    - ``float32`` and ``float16``: Cast to the type
+    - ``int16``: Fixed-point value relative to bounds ``(low, high)`` which
+      gives resolution of ``(high - low) / 65535``. Values outside the bounds
+      are clipped.
+
+    Examples:
+        >>> encoder = FrameEncoder(agents.dtype, ['position', 'active'],
+        >>>                        {'position': 'int16'},
+        >>>                        {'position': ((0, 0), (50, 50))})
+        >>> encoded = encoder.encode(agents)
+        >>> decoded = encoder.decode(encoded)
+    """
+
+    def __init__(self, dtype, fields=None, encodings=None, bounds=None):
+        """FrameEncoder
+
+        Args:
+            dtype (numpy.dtype): Structured dtype of the frames.
+            fields (List[str], optional):
+                Fields to keep. Defaults to all fields.
+            encodings (Dict[str, str], optional):
+                Mapping of field name to one of ``ENCODINGS``.
+            bounds (Dict[str, tuple], optional):
+                Mapping of field name to ``(low, high)`` for ``int16``
+                encoding.
+        """
+        dtype = np.dtype(dtype)
+        self.fields = list(dtype.names if fields is None else fields)
+        self.encodings = dict(encodings or {})
+        self.bounds = {name: (np.asarray(low, dtype=np.float64),
+                              np.asarray(high, dtype=np.float64))
+                       for name, (low, high) in (bounds or {}).items()}
+
+        for name, encoding in self.encodings.items():
+            if name not in self.fields:
+                raise ValueError('Encoded field "{}" is not one of the '
+                                 'fields.'.format(name))
+            if encoding not in ENCODINGS:
+                raise ValueError('Encoding "{}" should be one of {}.'.format(
+                    encoding, ENCODINGS))
+            if dtype[name].base.kind != 'f':
+                raise ValueError('Field "{}" is not floating point.'.format(
+                    name))
+            if encoding == 'int16' and name not in self.bounds:
+                raise ValueError('Field "{}" has int16 encoding but no '
+                                 'bounds.'.format(name))
+
+        self.decoded_dtype = np.dtype(
+            [(name, dtype[name].base, dtype[name].shape)
+             for name in self.fields])
+        self.dtype = np.dtype(
+            [(name, self.encodings.get(name, dtype[name].base),
+              dtype[name].shape) for name in self.fields])
+
+    def encode(self, frame):
+        """Encode frame
+
+        Args:
+            frame (numpy.ndarray):
+
+        Returns:
+            numpy.ndarray: Array of ``self.dtype``.
+        """
+        encoded = np.empty(frame.shape, dtype=self.dtype)
+        for name in self.fields:
+            if self.encodings.get(name) == 'int16':
+                low, high = self.bounds[name]
+                value = (frame[name] - low) / (high - low) * 65535.0 - 32768.0
+                encoded[name] = np.clip(np.round(value), -32768, 32767)
+            else:
+                encoded[name] = frame[name]
+        return encoded
+
+    def decode(self, encoded):
+        """Decode frame
+
+        Args:
+            encoded (numpy.ndarray): Array of ``self.dtype``.
+
+        Returns:
+            numpy.ndarray: Array of ``self.decoded_dtype``.
+        """
+        frame = np.empty(encoded.shape, dtype=self.decoded_dtype)
+        for name in self.fields:
+            if self.encodings.get(name) == 'int16':
+                low, high = self.bounds[name]
+                value = (encoded[name] + 32768.0) / 65535.0
+                frame[name] = value * (high - low) + low
+            else:
+                frame[name] = encoded[name]
+        return frame
+
+    def to_dict(self):
+        """JSON serializable description of the encoding."""
+        return {
+            'dtype': np.lib.format.dtype_to_descr(self.decoded_dtype),
+            'fields': self.fields,
+            'encodings': self.encodings,
+            'bounds': {name: (low.tolist(), high.tolist())
+                       for name, (low, high) in self.bounds.items()},
+        }
+
+    @classmethod
+    def from_dict(cls, obj):
+        """Encoder from the output of ``to_dict``."""
+        return cls(descr_to_dtype(obj['dtype']), obj['fields'],
+                   obj['encodings'], obj['bounds'])
+
+
+# Compression of trajectories. Each block of frames starts with a keyframe and
+# following frames are stored as differences to the previous frame.
+
+COMPRESSIONS = {
+    'zlib': (zlib.compress, zlib.decompress),
+    'lzma': (lzma.compress, lzma.decompress),
+}
+
+
+def _columns(frames):
+    if frames.dtype.names is None:
+        return [frames]
+    return [frames[name] for name in frames.dtype.names]
+
+
+def encode_block(frames, compression='zlib'):
+    """Encode block of frames into bytes. Bit patterns of the values of each
+    field are delta encoded as unsigned integers along the frames. Bytes of
+    the deltas are shuffled so that bytes of same significance are
+    contiguous before compression. Encoding is lossless; quantisation is done
+    beforehand, for example using :class:`FrameEncoder`.
+
+    Args:
+        frames (numpy.ndarray): Array of shape (frames, ...).
+        compression (str): Compression from ``COMPRESSIONS``.
+
+    Returns:
+        bytes:
+    """
+    compress, _ = COMPRESSIONS[compression]
+    parts = []
+    for column in _columns(frames):
+        column = np.ascontiguousarray(column)
+        itemsize = column.dtype.itemsize
+        ints = column.view('u{}'.format(itemsize))
+        delta = np.copy(ints)
+        delta[1:] -= ints[:-1]
+        parts.append(delta.view(np.uint8).reshape((-1, itemsize)).T.tobytes())
+    return compress(b''.join(parts))
+
+
+def decode_block(data, dtype, shape, compression='zlib'):
+    """Decode block of frames encoded with :func:`encode_block`.
+
+    Args:
+        data (bytes):
+        dtype (numpy.dtype): Dtype of the frames.
+        shape (tuple): Shape (frames, ...) of the block.
+        compression (str): Compression from ``COMPRESSIONS``.
+
+    Returns:
+        numpy.ndarray:
+    """
+    _, decompress = COMPRESSIONS[compression]
+    raw = np.frombuffer(bytearray(decompress(data)), dtype=np.uint8)
+    frames = np.empty(shape, dtype=dtype)
+    offset = 0
+    for column in _columns(frames):
+        itemsize = column.dtype.itemsize
+        size = column.size * itemsize
+        ints = np.ascontiguousarray(
+            raw[offset:offset + size].reshape((itemsize, -1)).T).view(
+            'u{}'.format(itemsize)).reshape(column.shape)
+        np.cumsum(ints, axis=0, dtype=ints.dtype, out=ints)
+        column[...] = ints.view(column.dtype)
+        offset += size
+    return frames
+
+
+class TrajectoryStore(object):
+    """Store for sequence of frames of agent data. Frames are written in place
+    into preallocated memory-mapped ``.npy`` chunks of shape
+    ``(chunk_size, agents)`` so that memory usage does not grow with the
+    number of frames. Manifest file in JSON format indexes the frames. For
+    each chunk it contains
+
+    - ``filename``: Name of the chunk file
+    - ``start``: Index of the first frame in the chunk
+    - ``count``: Number of frames written into the chunk
+    - ``time``: Simulation time of each frame of the current chunk. Times of
+      closed chunks are saved into ``.npy`` file named ``time_filename`` so
+      that a flush does not serialize the times of all frames again.
+
+    Frame ``i`` is found in the chunk with ``start <= i < start + count`` at
+    offset ``i - start``. Only first ``count`` frames of a chunk are valid.
+
+    With compression, frames are buffered in blocks of ``keyframe_interval``
+    frames which are encoded with :func:`encode_block` and appended into a
+    ``.bin`` chunk file. Chunk in the manifest then also contains
+    ``compression``, ``dtype``, ``shape`` of a frame and ``blocks`` as a list of
+    ``(offset, bytes, frames)``. Flush writes the current block, therefore the
+    next frame is a keyframe.
+
+    Examples:
+        >>> with TrajectoryStore('.', 'agents', chunk_size=100) as store:
+        >>>     store.append(data, time)  # Write frame (ndarray)
+        >>>     store.flush()  # Flush chunk and write manifest to disk
+    """
+    manifest_suffix = '_manifest.json'
+    chunk_format = '{basename}_chunk_{index}.npy'
+    compressed_chunk_format = '{basename}_chunk_{index}.bin'
+    time_format = '{basename}_chunk_{index}_time.npy'
+
+    def __init__(self, directory, basename, chunk_size=100, attrs=None,
+                 compression=None, keyframe_interval=10):
+        """TrajectoryStore
+
+        Args:
+            directory (str|Path):
+            basename (str):
+            chunk_size (int): Number of frames in one chunk.
+            attrs (dict, optional):
+                JSON serializable attributes saved into the manifest, for
+                example the encoding of the frames.
+            compression (str, optional):
+                Compression from ``COMPRESSIONS``. None for uncompressed
+                memory-mapped chunks.
+            keyframe_interval (int):
+                Maximum number of frames in a compressed block.
+        """
+        if chunk_size < 1:
+            raise ValueError('Chunk size should be positive.')
+        if keyframe_interval < 1:
+            raise ValueError('Keyframe interval should be positive.')
+        if compression is not None and compression not in COMPRESSIONS:
+            raise ValueError('Compression "{}" should be one of {}.'.format(
+                compression, tuple(COMPRESSIONS)))
+        self.directory = directory
+        self.basename = basename
+        self.chunk_size = chunk_size
+        self.attrs = attrs or {}
+        self.compression = compression
+        self.keyframe_interval = keyframe_interval
+        self.chunks = []
+        self._chunk = None
+        self._pending = 0
+
+    @property
+    def manifest_path(self):
+        return os.path.join(self.directory,
+                            self.basename + self.manifest_suffix)
+
+    def __len__(self):
+        return sum(chunk['count'] for chunk in self.chunks)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def _new_chunk(self, frame):
+        self._close_chunk()
+        info = {'start': len(self), 'count': 0, 'time': []}
+        if self.compression is None:
+            info['filename'] = self.chunk_format.format(
+                basename=self.basename, index=len(self.chunks))
+            self._chunk = np.lib.format.open_memmap(
+                os.path.join(self.directory, info['filename']), mode='w+',
+                dtype=frame.dtype, shape=(self.chunk_size,) + frame.shape)
+        else:
+            info['filename'] = self.compressed_chunk_format.format(
+                basename=self.basename, index=len(self.chunks))
+            info.update(compression=self.compression,
+                        dtype=np.lib.format.dtype_to_descr(frame.dtype),
+                        shape=frame.shape,
+                        blocks=[])
+            # Truncate existing file
+            open(os.path.join(self.directory, info['filename']), 'wb').close()
+            self._chunk = np.empty((self.keyframe_interval,) + frame.shape,
+                                   dtype=frame.dtype)
+            self._pending = 0
+        self.chunks.append(info)
+
+    def _write_block(self):
+        if self.compression is None or self._pending == 0:
+            return
+        info = self.chunks[-1]
+        data = encode_block(self._chunk[:self._pending], self.compression)
+        filepath = os.path.join(self.directory, info['filename'])
+        offset = os.path.getsize(filepath)
+        with open(filepath, 'ab') as fp:
+            fp.write(data)
+        info['blocks'].append((offset, len(data), self._pending))
+        self._pending = 0
+
+    def _close_chunk(self):
+        if self._chunk is not None:
+            if self.compression is None:
+                self._chunk.flush()
+            else:
+                self._write_block()
+            self._chunk = None
+
+            info = self.chunks[-1]
+            info['time_filename'] = self.time_format.format(
+                basename=self.basename, index=len(self.chunks) - 1)
+            time = np.array([np.nan if t is None else t
+                             for t in info.pop('time')], dtype=np.float64)
+            np.save(os.path.join(self.directory, info['time_filename']), time)
+
+    def append(self, frame, time=None):
+        """Write frame into the current chunk. New chunk is started when the
+        current one is full or the dtype or the shape of the frame changes.
+
+        Args:
+            frame (numpy.ndarray):
+            time (float, optional): Simulation time of the frame.
+        """
+        frame = np.asarray(frame)
+        chunk = self._chunk
+        if chunk is None or self.chunks[-1]['count'] == self.chunk_size or \
+                chunk.dtype != frame.dtype or chunk.shape[1:] != frame.shape:
+            self._new_chunk(frame)
+        info = self.chunks[-1]
+        if self.compression is None:
+            self._chunk[info['count']] = frame
+        else:
+            self._chunk[self._pending] = frame
+            self._pending += 1
+            if self._pending == self.keyframe_interval:
+                self._write_block()
+        info['count'] += 1
+        info['time'].append(None if time is None else float(time))
+
+    def flush(self, fsync=False):
+        """Flush the current chunk and write the manifest to disk.
+
+        Args:
+            fsync (bool): Force the manifest to be written to the disk.
+        """
+        if self._chunk is not None:
+            if self.compression is None:
+                self._chunk.flush()
+            else:
+                self._write_block()
+        manifest = {'basename': self.basename,
+                    'chunk_size': self.chunk_size,
+                    'frames': len(self),
+                    'attrs': self.attrs,
+                    'chunks': self.chunks}
+        save_json_atomic(self.manifest_path, manifest, fsync)
+
+    def close(self):
+        """Close the store and write the manifest to disk."""
+        self._close_chunk()
+        self.flush()
+
+
+class FrameIndexer(object):
+    """Indexing of frames of a trajectory. Integer index returns a view of the
+    frame. Slice returns a view if the frames are inside one uncompressed
+    chunk, otherwise the frames are copied into a new array. Empty slice of a
+    trajectory without frames is an empty float array because the dtype of
+    the frames is not known."""
+
+    def __init__(self, reader, field=None, agent=None):
+        self.reader = reader
+        self.field = field
+        self.agent = agent
+
+    def __len__(self):
+        return len(self.reader)
+
+    def _read(self, chunk, start, stop):
+        array = self.reader.read(chunk, start, stop)
+        if self.agent is not None:
+            array = array[:, self.agent]
+        if self.field is not None:
+            array = array[self.field]
+        return array
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self))
+            if step != 1:
+                raise IndexError('Slices with step are not supported.')
+            if stop <= start:
+                if len(self) == 0:
+                    return np.empty(0)
+                return self._read(0, 0, 0)
+            parts = [self._read(chunk, s, e) for chunk, s, e in
+                     self.reader.spans(start, stop)]
+            return parts[0] if len(parts) == 1 else np.concatenate(parts)
+        index = int(index)
+        if index < 0:
+            index += len(self)
+        chunk, offset = self.reader.locate(index)
+        return self._read(chunk, offset, offset + 1)[0]
+
+
+class _AgentIndexer(object):
+    def __init__(self, reader):
+        self.reader = reader
+
+    def __getitem__(self, agent):
+        return FrameIndexer(self.reader, agent=agent)
+
+
+class TrajectoryReader(object):
+    """Random access to the frames written by :class:`TrajectoryStore`.
+    Uncompressed chunks are memory-mapped so that frames are read from the
+    disk only when they are accessed. Compressed chunks are decoded one block
+    at a time and recently used blocks are cached. Attribute ``chunks`` has
+    the memory-maps of the uncompressed chunks and ``None`` for the compressed
+    chunks, which are read with :meth:`chunk`.
+
+    Examples:
+        >>> reader = TrajectoryReader('.', 'agents')
+        >>> reader.frames[t]  # Frame t
+        >>> reader.agents[i][t0:t1]  # Frames t0..t1-1 of agent i
+        >>> reader.column('position')[t]  # Positions in frame t
+        >>> reader.frame_at(time)  # Index of the frame at simulation time
+        >>> reader.decode(reader.frames[t])  # Decode encoded frame
+    """
+
+    def __init__(self, directory, basename='agents', cache_size=4):
+        """TrajectoryReader
+
+        Args:
+            directory (str|Path):
+            basename (str):
+            cache_size (int): Number of decoded blocks to cache.
+        """
+        self.directory = directory
+        self.basename = basename
+        self.cache_size = cache_size
+        self.manifest = load_manifest(directory, basename)
+
+        encoding = self.manifest.get('attrs', {}).get('encoding')
+        self.encoder = FrameEncoder.from_dict(encoding) if encoding else None
+
+        self.chunks = [
+            None if 'compression' in chunk else
+            np.load(os.path.join(directory, chunk['filename']),
+                    mmap_mode='r')[:chunk['count']]
+            for chunk in self.manifest['chunks']]
+        self._blocks = OrderedDict()
+        self.starts = np.array(
+            [chunk['start'] for chunk in self.manifest['chunks']] +
+            [self.manifest['frames']], dtype=np.int64)
+        self.time = np.concatenate(
+            [np.zeros(0)] +
+            [np.load(os.path.join(directory, chunk['time_filename']))
+             if 'time_filename' in chunk else
+             np.array([np.nan if time is None else time
+                       for time in chunk['time']], dtype=np.float64)
+             for chunk in self.manifest['chunks']])
+        self.frames = FrameIndexer(self)
+        self.agents = _AgentIndexer(self)
+
+    def __len__(self):
+        return int(self.starts[-1])
+
+    def _block(self, chunk, block):
+        key = (chunk, block)
+        if key in self._blocks:
+            self._blocks.move_to_end(key)
+            return self._blocks[key]
+
+        info = self.manifest['chunks'][chunk]
+        offset, size, count = info['blocks'][block]
+        with open(os.path.join(self.directory, info['filename']), 'rb') as fp:
+            fp.seek(offset)
+            data = fp.read(size)
+        frames = decode_block(data, descr_to_dtype(info['dtype']),
+                              (count,) + tuple(info['shape']),
+                              info['compression'])
+
+        self._blocks[key] = frames
+        while len(self._blocks) > self.cache_size:
+            self._blocks.popitem(last=False)
+        return frames
+
+    def read(self, chunk, start, stop):
+        """Frames from start to stop of a chunk.
+
+        Args:
+            chunk (int):
+            start (int):
+            stop (int):
+
+        Returns:
+            numpy.ndarray:
+        """
+        if self.chunks[chunk] is not None:
+            return self.chunks[chunk][start:stop]
+        info = self.manifest['chunks'][chunk]
+        if stop <= start:
+            return np.empty((0,) + tuple(info['shape']),
+                            dtype=descr_to_dtype(info['dtype']))
+        parts = []
+        first = 0
+        for block, (_, _, count) in enumerate(info['blocks']):
+            if first < stop and start < first + count:
+                frames = self._block(chunk, block)
+                parts.append(frames[max(start - first, 0):
+                                    min(stop - first, count)])
+            first += count
+        return parts[0] if len(parts) == 1 else np.concatenate(parts)
+
+    def chunk(self, chunk):
+        """All frames of a chunk."""
+        return self.read(chunk, 0, self.manifest['chunks'][chunk]['count'])
+
+    def locate(self, index):
+        """Chunk and offset of frame."""
+        if not 0 <= index < len(self):
+            raise IndexError('Frame index {} out of range.'.format(index))
+        chunk = int(np.searchsorted(self.starts, index, side='right')) - 1
+        return chunk, index - int(self.starts[chunk])
+
+    def spans(self, start, stop):
+        """Chunks and offsets covering frames from start to stop.
+
+        Yields:
+            (int, int, int): Tuple of (chunk, start offset, stop offset)
+        """
+        for chunk in range(len(self.starts) - 1):
+            first, last = self.starts[chunk], self.starts[chunk + 1]
+            if last <= start or first >= stop:
+                continue
+            yield (chunk, int(max(start, first) - first),
+                   int(min(stop, last) - first))
+
+    def column(self, field):
+        """Indexer of the frames of a field."""
+        return FrameIndexer(self, field=field)
+
+    def frame_at(self, time):
+        """Index of the last frame with simulation time less than or equal to
+        time.
+
+        Raises:
+            IndexError: If there are no frames at or before the time.
+        """
+        index = int(np.searchsorted(self.time, time, side='right')) - 1
+        if index < 0:
+            raise IndexError('No frames at or before time {}.'.format(time))
+        return index
+
+    def decode(self, frames):
+        """Decode frames if they are encoded."""
+        return frames if self.encoder is None else self.encoder.decode(frames)
+
+
+def load_manifest(directory, basename):
+    """Load manifest of a trajectory store.
+
+    Args:
+        directory (str|Path):
+        basename (str):
+
+    Returns:
+        dict:
+    """
+    filepath = os.path.join(directory,
+                            basename + TrajectoryStore.manifest_suffix)
+    with open(filepath, 'r') as fp:
+        return json.load(fp)
+
+
+class BackgroundWriter(object):
+    """Executes write operations in a background thread so that disk writes
+    do not block the simulation loop. Operations are passed through a bounded
+    queue and executed in the order they were submitted. When the queue is
+    full, policy
+
+    - ``block``: Waits until there is space in the queue (back-pressure).
+    - ``drop``: Drops the operation and increments ``dropped`` counter.
+
+    Arguments of the operations must not be modified after submitting them,
+    therefore frames should be copied before submitting.
+
+    Exception raised by an operation stops the execution of the remaining
+    operations and it is raised on the next call to ``submit``, ``join`` or
+    ``close``.
+
+    Examples:
+        >>> writer = BackgroundWriter(maxsize=16, policy='drop')
+        >>> writer.submit(store.append, frame.copy(), time)
+        >>> writer.submit(store.flush, block=True)  # Never dropped
+        >>> writer.close()
+    """
+    policies = ('block', 'drop')
+
+    def __init__(self, maxsize=16, policy='block'):
+        """BackgroundWriter
+
+        Args:
+            maxsize (int): Maximum number of operations in the queue.
+            policy (str): Policy when the queue is full.
+        """
+        if policy not in self.policies:
+            raise ValueError('Policy "{}" should be one of {}.'.format(
+                policy, self.policies))
+        self.policy = policy
+        self.dropped = 0
+        self.queue = queue.Queue(maxsize)
+        self._error = None
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def _run(self):
+        while True:
+            item = self.queue.get()
+            try:
+                if item is None:
+                    return
+                function, args = item
+                if self._error is None:
+                    function(*args)
+            except Exception as error:
+                self._error = error
+            finally:
+                self.queue.task_done()
+
+    def _raise_error(self):
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise error
+
+    def submit(self, function, *args, block=None):
+        """Submit operation ``function(*args)``.
+
+        Args:
+            function (Callable):
+            *args:
+            block (bool, optional):
+                Overrides the policy. True blocks and False drops when the
+                queue is full.
+
+        Returns:
+            bool: False if the operation was dropped.
+        """
+        self._raise_error()
+        if block is None:
+            block = self.policy == 'block'
+        try:
+            self.queue.put((function, args), block=block)
+        except queue.Full:
+            self.dropped += 1
+            return False
+        return True
+
+    @property
+    def closed(self):
+        """True if the thread has been stopped."""
+        return not self._thread.is_alive()
+
+    def join(self):
+        """Wait until all submitted operations are executed."""
+        self.queue.join()
+        self._raise_error()
+
+    def close(self):
+        """Execute remaining operations and stop the thread."""
+        if self._thread.is_alive():
+            self.queue.put(None)
+            self._thread.join()
+            atexit.unregister(self.close)
+        self._raise_error()
+
+
+def concatenate_npy(directory, basename, filepath):
+    """Concatenate trajectory chunks or legacy ``basename_{index}.npy`` files
+    into single ``.npy`` file. Data is copied chunk by chunk into memory-mapped
+    output file so that memory usage does not depend on the size of the data.
+
+    Args:
+        directory (str|Path):
+        basename (str):
+        filepath (str|Path): Path of the output file.
+
+    Returns:
+        int: Number of frames
+    """
+    manifest = os.path.join(directory,
+                            basename + TrajectoryStore.manifest_suffix)
+    if os.path.exists(manifest):
+        reader = TrajectoryReader(directory, basename, cache_size=0)
+        sizes = [chunk['count'] for chunk in reader.manifest['chunks']]
+        chunks = (reader.chunk(index) for index in range(len(sizes)))
+        first = reader.frames[0] if len(reader) else None
+    else:
+        values = sorted(find_npy_files(directory, basename),
+                        key=lambda x: x[0])
+        chunks = [np.load(path, mmap_mode='r') for _, path in values]
+        sizes = [len(chunk) for chunk in chunks]
+        first = chunks[0][0] if chunks else None
+    if first is None:
+        raise FileNotFoundError('No data files named "{}" in "{}".'.format(
+            basename, directory))
+
+    output = np.lib.format.open_memmap(
+        filepath, mode='w+', dtype=first.dtype,
+        shape=(sum(sizes),) + first.shape)
+    start = 0
+    for chunk in chunks:
+        output[start:start + len(chunk)] = chunk
+        start += len(chunk)
+    output.flush()
+    del output
+    return start
+
+
 # CSV : Simulation data
 
 def save_csv(directory, basename):
@@ -114,6 +874,7 @@ def save_csv(directory, basename):
         >>> storage.send(False)  # False dumps data into buffers
         >>> storage.send(data)
         >>> storage.send(True)  # True dumps data into file
+        >>> storage.send(True)  # True instead of data dumps remaining data
     """
     filepath = os.path.join(directory, basename + '.csv')
     with StringIO() as buffer:
@@ -128,6 +889,8 @@ def save_csv(directory, basename):
 
         # Initial data
         data = yield  # dict
+        while data is True:
+            data = yield  # dict
         writer.writerow(data.keys())
         writer.writerow(data.values())
         dump = yield  # bool
@@ -136,12 +899,122 @@ def save_csv(directory, basename):
 
         while True:
             data = yield  # dict
+            if data is True:
+                dumper()
+                continue
             writer.writerow(data.values())
             dump = yield  # bool
             if dump:
                 dumper()
 
 
+# Columns : Simulation data in binary columnar format
+
+def save_columns(directory, basename, buffer_size=1024):
+    """Save dictionary data into binary columnar files. Values of each key
+    are appended into file ``{basename}_{key}.bin`` as raw array. Schema file
+    ``{basename}_schema.json`` contains the number of rows and the name,
+    dtype and filename of each column. Keys and dtypes are determined from
+    the first row.
+
+    Args:
+        directory (str|Path):
+        basename (str):
+        buffer_size (int): Number of rows buffered in memory.
+
+    Examples:
+        >>> storage = save_columns('.', 'basename')
+        >>> storage.send(None)
+        >>> storage.send(data)  # Send some data (dict)
+        >>> storage.send(False)  # False dumps data into buffers
+        >>> storage.send(data)
+        >>> storage.send(True)  # True dumps data into file
+        >>> storage.send(True)  # True instead of data dumps remaining data
+    """
+    schema_path = os.path.join(directory, basename + '_schema.json')
+
+    # Initial data
+    data = yield  # dict
+    while data is True:
+        data = yield  # dict
+    columns = []
+    for name, value in data.items():
+        dtype = np.asarray(value).dtype
+        if dtype.kind not in 'biuf':
+            raise ValueError('Value of "{}" of dtype {} is not '
+                             'numeric.'.format(name, dtype))
+        filename = '{}_{}.bin'.format(basename, name)
+        columns.append({'name': name, 'dtype': dtype.str,
+                        'filename': filename})
+        # Truncate existing file
+        open(os.path.join(directory, filename), 'wb').close()
+    names = [column['name'] for column in columns]
+    buffers = [np.empty(buffer_size, dtype=column['dtype'])
+               for column in columns]
+    rows = 0
+    buffered = 0
+
+    def dumper():
+        nonlocal rows, buffered
+        for column, buffer in zip(columns, buffers):
+            with open(os.path.join(directory, column['filename']), 'ab') as fp:
+                buffer[:buffered].tofile(fp)
+        rows += buffered
+        buffered = 0
+        save_json_atomic(schema_path, {'rows': rows, 'columns': columns})
+
+    while True:
+        if data is True:
+            dumper()
+            data = yield  # dict
+            continue
+        if list(data.keys()) != names:
+            raise ValueError('Keys of data {} should not change from {}'
+                             '.'.format(list(data.keys()), names))
+        for buffer, value in zip(buffers, data.values()):
+            buffer[buffered] = value
+        buffered += 1
+        dump = yield  # bool
+        if dump or buffered == buffer_size:
+            dumper()
+        data = yield  # dict
+
+
+def load_columns(directory, basename):
+    """Load data saved by :func:`save_columns`.
+
+    Args:
+        directory (str|Path):
+        basename (str):
+
+    Returns:
+        OrderedDict: Mapping of column name to numpy.ndarray.
+    """
+    with open(os.path.join(directory, basename + '_schema.json')) as fp:
+        schema = json.load(fp)
+    return OrderedDict(
+        (column['name'],
+         np.fromfile(os.path.join(directory, column['filename']),
+                     dtype=column['dtype'], count=schema['rows']))
+        for column in schema['columns'])
+
+
+def columns_to_csv(directory, basename, filepath):
+    """Export data saved by :func:`save_columns` into csv file.
+
+    Args:
+        directory (str|Path):
+        basename (str):
+        filepath (str|Path): Path of the output file.
+    """
+    columns = load_columns(directory, basename)
+    with open(filepath, 'w', newline='') as fp:
+        writer = csv.writer(fp)
+        writer.writerow(columns.keys())
+        writer.writerows(zip(*(column.tolist()
+                               for column in columns.values())))
+
+
 # JSON : Simulation metadata and Shapely geometries
 
 def geometry_mapping(geom):
@@ -1,9 +1,9 @@
-from collections import Callable, Collection, Generator
+from collections import Callable, Collection, Generator, Mapping
 
 import numba
 import numpy as np
 from configobj import ConfigObj
-from numba import typeof, void, boolean, float64
+from numba import typeof, void, boolean, float64, i8, f8
 from numba.types import UniTuple
 from traitlets.traitlets import HasTraits, Float, default, Unicode, \
     observe, Bool, Int, Type, Instance, TraitError, Union, List
@@ -11,11 +11,13 @@ from traittypes import Array
 
 from crowddynamics.config import load_config, BODY_TYPES_CFG, \
     BODY_TYPES_CFG_SPEC
-from crowddynamics.core.block_list import MutableBlockList
+from crowddynamics.core.block_list import SpatialHash, spatial_hash_insert, \
+    spatial_hash_nearest
 from crowddynamics.core.distance import distance_circles, \
     distance_circle_line, distance_three_circle_line
 from crowddynamics.core.distance import distance_three_circles
 from crowddynamics.core.rand import truncnorm
+from crowddynamics.core.sampling import poisson_disk_sample
 from crowddynamics.core.structures import obstacle_type_linear
 from crowddynamics.core.vector2D import unit_vector, rotate270
 from crowddynamics.exceptions import CrowdDynamicsException
@@ -455,6 +457,13 @@ AgentModelToType = {
     'circular': agent_type_circular,
     'three_circle': agent_type_three_circle,
 }
+# Fields of agents that are not changed by the simulation logic
+STATIC_FIELDS = (
+    'is_leader', 'familiar_exit', 'radius', 'r_t', 'r_s', 'r_ts', 'mass',
+    'inertia_rot', 'target_velocity', 'target_angular_velocity', 'tau_adj',
+    'tau_rot', 'k_soc', 'tau_0', 'mu', 'kappa', 'damping', 'std_rand_force',
+    'std_rand_torque',
+)
 
 
 def is_model(agents, model):
@@ -562,6 +571,188 @@ def overlapping_three_circle_line(agents, obstacles):
     return False
 
 
+@numba.jit(i8(typeof(agent_type_circular)[:], i8,
+              typeof(agent_type_circular)[:], f8[:, :],
+              i8[:], i8[:], i8[:, :], f8, typeof(obstacle_type_linear)[:],
+              boolean),
+           nopython=True, nogil=True, cache=True)
+def place_circular(agents, index, members, positions, head, successor, cells,
+                   cell_size, obstacles, paired):
+    """Place members to candidate positions where they do not overlap other
+    agents or obstacles. Each candidate position is tried once for the next
+    member that has not been placed or, if paired, only for the member with
+    the same index.
+
+    Args:
+        agents (numpy.ndarray): Agents that are already placed.
+        index (int): Index in agents where members are placed from.
+        members (numpy.ndarray): Agents to be placed.
+        positions (numpy.ndarray): Candidate positions.
+        head, successor, cells: Arrays of
+            :class:`crowddynamics.core.block_list.SpatialHash` of the
+            positions of the agents. Capacity must fit the placed members.
+        cell_size (float):
+        obstacles (numpy.ndarray):
+        paired (bool): Position k belongs to member k. Members whose
+            position is rejected are skipped.
+
+    Returns:
+        int: Number of members placed.
+    """
+    neighbours = np.zeros(len(successor), dtype=np.int64)
+    placed = 0
+    for k in range(len(positions)):
+        if placed == len(members):
+            break
+        m = k if paired else placed
+        agent = members[m:m + 1]
+        agent[0]['position'][:] = positions[k]
+
+        overlapping = False
+        count = spatial_hash_nearest(head, successor, cells, cell_size,
+                                     positions[k], 1, neighbours)
+        for n in range(count):
+            other = agents[neighbours[n]]
+            h, _ = distance_circles(other['position'], other['radius'],
+                                    agent[0]['position'], agent[0]['radius'])
+            if h < 0.0:
+                overlapping = True
+                break
+
+        if overlapping or overlapping_circle_line(agent, obstacles):
+            continue
+
+        agents[index + placed] = agent[0]
+        spatial_hash_insert(head, successor, cells, cell_size, positions[k],
+                            index + placed)
+        placed += 1
+    return placed
+
+
+@numba.jit(i8(typeof(agent_type_three_circle)[:], i8,
+              typeof(agent_type_three_circle)[:], f8[:, :],
+              i8[:], i8[:], i8[:, :], f8, typeof(obstacle_type_linear)[:],
+              boolean),
+           nopython=True, nogil=True, cache=True)
+def place_three_circle(agents, index, members, positions, head, successor,
+                       cells, cell_size, obstacles, paired):
+    """Place members to candidate positions where they do not overlap other
+    agents or obstacles. Same as :func:`place_circular` for three-circle
+    agents."""
+    neighbours = np.zeros(len(successor), dtype=np.int64)
+    placed = 0
+    for k in range(len(positions)):
+        if placed == len(members):
+            break
+        m = k if paired else placed
+        agent = members[m:m + 1]
+        agent[0]['position'][:] = positions[k]
+        shoulders(agent)
+
+        overlapping = False
+        count = spatial_hash_nearest(head, successor, cells, cell_size,
+                                     positions[k], 1, neighbours)
+        for n in range(count):
+            other = agents[neighbours[n]]
+            h, _, _, _ = distance_three_circles(
+                (other['position'], other['position_ls'],
+                 other['position_rs']),
+                (other['r_t'], other['r_s'], other['r_s']),
+                (agent[0]['position'], agent[0]['position_ls'],
+                 agent[0]['position_rs']),
+                (agent[0]['r_t'], agent[0]['r_s'], agent[0]['r_s']))
+            if h < 0.0:
+                overlapping = True
+                break
+
+        if overlapping or overlapping_three_circle_line(agent, obstacles):
+            continue
+
+        agents[index + placed] = agent[0]
+        spatial_hash_insert(head, successor, cells, cell_size, positions[k],
+                            index + placed)
+        placed += 1
+    return placed
+
+
+def agent_group_array(agent_type, size, attributes=None, validate=False):
+    """Vectorised construction of the array of a group of agents. Array is
+    filled column-wise instead of creating an agent type instance for each
+    agent.
+
+    - Fields that are not given have the default values of the agent type.
+      Attributes that are not fields of the agent type are ignored.
+    - ``body_type`` samples ``radius``, ``mass`` and ``target_velocity`` from
+      truncated normal distributions of the body type.
+    - ``r_t``, ``r_s``, ``r_ts`` and ``inertia_rot`` are derived from the
+      radius and the mass unless they are given.
+    - Shoulder positions of three-circle agents are derived from the
+      position and the orientation.
+
+    Examples:
+        >>> array = agent_group_array(ThreeCircle, 100000, {
+        >>>     'body_type': 'adult',
+        >>>     'orientation': lambda size: np.random.uniform(-np.pi, np.pi, size),
+        >>> })
+
+    Args:
+        agent_type (type): Subclass of AgentType.
+        size (int): Number of agents.
+        attributes (Mapping):
+            Mapping of field name to a value, array of values for each agent
+            or callable taking size as argument and returning the array.
+        validate (bool):
+            Validate the values of each agent using the traits of the agent
+            type. Slow, use only for small groups.
+
+    Returns:
+        numpy.ndarray: Array of dtype ``agent_type.dtype()``.
+    """
+    attributes = dict(attributes or {})
+    dtype = agent_type.dtype()
+    array = np.zeros(size, dtype=dtype)
+    array[:] = np.array(agent_type())
+
+    body_type = attributes.pop('body_type', None)
+    body = {}
+    if body_type is not None:
+        body = load_config(BODY_TYPES_CFG, BODY_TYPES_CFG_SPEC)[body_type]
+        for name in ('radius', 'mass', 'target_velocity'):
+            mean = body[name + '_mean']
+            scale = body[name + '_scale']
+            if mean > 0 and scale > 0:
+                array[name] = truncnorm(-3.0, 3.0, loc=mean, abs_scale=scale,
+                                        size=size)
+
+    for name, value in attributes.items():
+        # Attributes that are not fields of the agent type are ignored like
+        # in the construction of the agent types.
+        if name in dtype.names:
+            array[name] = value(size) if callable(value) else value
+
+    for name, ratio in (('r_t', 'ratio_rt'), ('r_s', 'ratio_rs'),
+                        ('r_ts', 'ratio_ts')):
+        if name in dtype.names and name not in attributes and \
+                body.get(ratio, 0) > 0:
+            array[name] = body[ratio] * array['radius']
+
+    if 'inertia_rot' not in attributes:
+        mass, radius = array['mass'], array['radius']
+        inertia = 4.0 * np.pi * (mass / 80.0) * (radius / 0.27) ** 2
+        array['inertia_rot'] = np.where((mass > 0) & (radius > 0), inertia,
+                                        array['inertia_rot'])
+
+    if 'position_ls' in dtype.names:
+        shoulders(array)
+
+    if validate:
+        agent = agent_type()
+        for i in range(size):
+            agent.from_array(array[i:i + 1])
+
+    return array
+
+
 class AgentGroup(HasTraits):
     """Group of agents
 
@@ -572,6 +763,9 @@ class AgentGroup(HasTraits):
         >>>             attributes=...,
         >>>         )
 
+    Attributes given as mapping of field names to columns are constructed
+    using :func:`agent_group_array` without creating agent type instances.
+
     """
     agent_type = Type(
         AgentType,
@@ -588,11 +782,18 @@ class AgentGroup(HasTraits):
     members = List(
         Instance(AgentType),
         help='')
+    validate = Bool(
+        default_value=False,
+        help='Validate the values of the agents when attributes is a '
+             'mapping of columns.')
 
     @observe('size', 'agent_type', 'attributes')
     def _observe_members(self, change):
         if self.size > 0 and self.attributes is not None and self.agent_type is not None:
-            if isinstance(self.attributes, Collection):
+            if isinstance(self.attributes, Mapping):
+                # Columns are constructed by to_array
+                self.members = []
+            elif isinstance(self.attributes, Collection):
                 self.members = [self.agent_type(**a) for a in self.attributes]
             elif isinstance(self.attributes, Generator):
                 self.members = [self.agent_type(**next(self.attributes)) for _ in range(self.size)]
@@ -601,6 +802,20 @@ class AgentGroup(HasTraits):
             else:
                 raise TraitError
 
+    def to_array(self):
+        """Array of the agents of the group.
+
+        Returns:
+            numpy.ndarray:
+        """
+        if isinstance(self.attributes, Mapping):
+            return agent_group_array(self.agent_type, self.size,
+                                     self.attributes, self.validate)
+        array = np.zeros(len(self.members), dtype=self.agent_type.dtype())
+        for i, member in enumerate(self.members):
+            array[i] = np.array(member)
+        return array
+
 
 class Agents(AgentsBase):
     """Set groups of agents
@@ -627,8 +842,37 @@ class Agents(AgentsBase):
         super().__init__(*args, **kwargs)
         self.index = 0
         self.array = np.zeros(0, dtype=self.agent_type.dtype())
-        # Block list for speeding up overlapping checks
-        self._neighbours = MutableBlockList(cell_size=self.cell_size)
+        # Spatial hash for speeding up overlapping checks
+        self._neighbours = SpatialHash(cell_size=self.cell_size)
+
+    def _resize(self, size):
+        """Grow self.array to fit size new agents"""
+        array = np.zeros(size, dtype=self.agent_type.dtype())
+        self.array = np.concatenate((self.array, array))
+        self._neighbours.reserve(self.array.size)
+
+    def _trim(self):
+        """Remove rows of the agents that were not placed from self.array"""
+        self.array = self.array[:self.index].copy()
+        self._neighbours.shrink(self.index)
+
+    def _place(self, members, positions, obstacles, paired=False):
+        """Place members to candidate positions without overlapping
+
+        Returns:
+            int: Number of members placed.
+        """
+        place = place_three_circle if is_model(members, 'three_circle') \
+            else place_circular
+        if obstacles is None:
+            obstacles = np.zeros(0, dtype=obstacle_type_linear)
+        placed = place(self.array, self.index, members, positions,
+                       self._neighbours.head, self._neighbours.successor,
+                       self._neighbours.cells, self._neighbours.cell_size,
+                       obstacles, paired)
+        self.index += placed
+        self._neighbours.size = self.index
+        return placed
 
     def add_non_overlapping_group(self, group, position_gen, obstacles=None):
         """Add group of agents
@@ -641,40 +885,67 @@ class Agents(AgentsBase):
         if self.agent_type is not group.agent_type:
             raise CrowdDynamicsException
 
-        # resize self.array to fit new agents
-        array = np.zeros(group.size, dtype=group.agent_type.dtype())
-        self.array = np.concatenate((self.array, array))
+        members = group.to_array()
+        self._resize(group.size)
 
         index = 0
         overlaps = 0
         overlaps_max = 10 * group.size
 
         while index < group.size and overlaps < overlaps_max:
-            new_agent = group.members[index]
-            new_agent.position = position_gen() if callable(position_gen) \
-                else next(position_gen)
-
-            # Overlapping check
-            neighbours = self._neighbours.nearest(new_agent.position, radius=1)
-            if new_agent.overlapping(self.array[neighbours]):
-                # Agent is overlapping other agent.
-                overlaps += 1
-                continue
-
-            if obstacles is not None and new_agent.overlapping_obstacles(obstacles):
-                # Agent is overlapping with an obstacle.
-                overlaps += 1
-                continue
-
-            # Agent can be successfully placed
-            self.array[self.index] = np.array(new_agent)
-            self._neighbours[new_agent.position] = self.index
-            self.index += 1
-            index += 1
-
-        # TODO: remove agents that didn't fit from self.array
-        if self.index + 1 < self.array.size:
-            pass
+            # Every candidate position results in either a placed agent or an
+            # overlap, therefore no more positions are drawn than needed.
+            size = min(group.size - index, overlaps_max - overlaps)
+            positions = np.array(
+                [position_gen() if callable(position_gen)
+                 else next(position_gen) for _ in range(size)],
+                dtype=np.float64).reshape(size, 2)
+
+            placed = self._place(members[index:], positions, obstacles)
+            index += placed
+            overlaps += size - placed
+
+        self._trim()
+
+        # Array should remain contiguous
+        assert self.array.flags.c_contiguous
+
+    def add_packed_group(self, group, geom, obstacles=None, **kwargs):
+        """Add group of agents densely packed inside the geometry using
+        :func:`crowddynamics.core.sampling.poisson_disk_sample`. Positions
+        are sampled in one pass instead of rejecting random positions. Agents
+        that do not fit inside the geometry or whose position overlaps the
+        obstacles are not added. Agents that are already placed are packed
+        around.
+
+        Args:
+            group (AgentGroup):
+            geom (Polygon|MultiPolygon):
+                Area for the agents, for example spawn area without the
+                obstacles :meth:`Field.spawn_area`.
+            obstacles (numpy.ndarray):
+                Obstacles outside the geometry that should be checked.
+            **kwargs: Arguments for the Poisson-disk sampling.
+
+        Returns:
+            int: Number of agents added.
+        """
+        if self.agent_type is not group.agent_type:
+            raise CrowdDynamicsException
+
+        members = group.to_array()
+        # Existing agents are packed around instead of rejecting positions
+        # that overlap them.
+        existing = self.array[:self.index]
+        positions = poisson_disk_sample(
+            geom, members['radius'], fixed_points=existing['position'],
+            fixed_radii=existing['radius'], **kwargs)
+        self._resize(len(positions))
+        # Positions are sized for the radii of the members
+        placed = self._place(members[:len(positions)], positions, obstacles,
+                             paired=True)
+        self._trim()
 
         # Array should remain contiguous
         assert self.array.flags.c_contiguous
+        return placed
@@ -120,7 +120,15 @@ class SimulationBase(CrowdDynamicsObject):
     def update(self):
         raise NotImplementedError
 
+    def close(self):
+        """Write remaining data and release resources after running."""
+        pass
+
     def run(self):
-        """Updates simulation until exit condition is met (returns True)."""
-        while self.exit_condition is None or not self.exit_condition(self):
-            self.update()
+        """Updates simulation until exit condition is met (returns True).
+        Simulation is closed when running finishes or raises an exception."""
+        try:
+            while self.exit_condition is None or not self.exit_condition(self):
+                self.update()
+        finally:
+            self.close()
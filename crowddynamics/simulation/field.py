@@ -1,20 +1,60 @@
-from functools import lru_cache
+import hashlib
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from functools import wraps
 
 import numpy as np
 from shapely.geometry import Polygon
 from shapely.geometry.base import BaseGeometry
-from traitlets import Instance, List, validate
+from traitlets import Instance, List, validate, observe
 
 from crowddynamics.core.geometry import union
 from crowddynamics.core.sampling import polygon_sample
 from crowddynamics.core.steering.obstacle_handling import \
     direction_map_obstacles, obstacle_handling
-from crowddynamics.core.steering.quickest_path import meshgrid, shortest_path
+from crowddynamics.core.steering.quickest_path import meshgrid, \
+    shortest_path_compact, target_label_map
 from crowddynamics.exceptions import ValidationError, CrowdDynamicsException, \
     InvalidType
 from crowddynamics.simulation.base import FieldBase
 
 
+def _shortest_path_target(step, domain, targets, obstacles, radius):
+    """Shortest path to targets as compact direction map and distance map.
+    Module level function so that it can be sent to worker processes."""
+    mgrid = meshgrid(step, *domain.bounds)
+    return shortest_path_compact(mgrid, domain, targets, obstacles, radius)
+
+
+def _direction_map_obstacles(step, domain, obstacles):
+    """Direction map away from the obstacles as compact direction map and
+    distance map."""
+    mgrid = meshgrid(step, *domain.bounds)
+    return direction_map_obstacles(mgrid, obstacles)
+
+
+def _cached(method):
+    """Cache the results of the method in the ``_cache`` of the field.
+    Unlike ``lru_cache`` on the method, the cache belongs to the instance and
+    does not keep the field alive."""
+    @wraps(method)
+    def wrapper(self, *args):
+        key = (method.__name__,) + args
+        if key not in self._cache:
+            self._cache[key] = method(self, *args)
+        return self._cache[key]
+    return wrapper
+
+
+def _timed(key, function, *args):
+    """Call function and measure the wall time."""
+    start = time.perf_counter()
+    result = function(*args)
+    return key, result, time.perf_counter() - start
+
+
 class Field(FieldBase):
     r"""Field is a collection of static geometric objects that can
     exist in crowd dynamics simulations. This module uses geometric types
@@ -84,9 +124,16 @@ class Field(FieldBase):
         Instance(BaseGeometry),
         help='List of spawns')
 
-    # TODO: invalidate caches if field changes?
     # TODO: implement direction and distance map as lazy properties
 
+    logger = logging.getLogger(__name__)
+
+    def __init__(self, *args, **kwargs):
+        # Results of the cached methods. Set before the traits because the
+        # observer of the geometry clears it.
+        self._cache = {}
+        super().__init__(*args, **kwargs)
+
     @validate('domain')
     def _valid_domain(self, proposal):
         value = proposal['value']
@@ -105,6 +152,11 @@ class Field(FieldBase):
             raise ValidationError('{} should not empty'.format(value))
         return value
 
+    @observe('domain', 'obstacles', 'targets')
+    def _observe_geometry(self, change):
+        """Maps solved for the previous geometry are no longer valid."""
+        self._cache.clear()
+
     def convex_hull(self):
         """Convex hull of union of all objects in the field."""
         field = BaseGeometry()
@@ -128,32 +180,88 @@ class Field(FieldBase):
         obstacles"""
         return self._samples(self.spawns[spawn_index], self.obstacles, radius)
 
-    @lru_cache()
+    def spawn_area(self, spawn_index: int, margin: float = 1e-6):
+        """Area of the spawn without the obstacles. Unlike the area sampled
+        by :meth:`sample_spawn` it is not convex hull and can be used with
+        :meth:`Agents.add_packed_group`. Obstacles are usually lines, so they
+        are buffered by small margin in order to cut the spawn area."""
+        spawn = self.spawns[spawn_index]
+        if not self.obstacles:
+            return spawn
+        return spawn - self.obstacles.buffer(margin)
+
+    def geometry_hash(self):
+        """SHA-1 hash of the geometries of the field. Used for checking that
+        saved simulation state belongs to the field.
+
+        Returns:
+            str:
+        """
+        sha1 = hashlib.sha1()
+        for name in ('domain', 'obstacles', 'targets', 'spawns'):
+            geoms = getattr(self, name)
+            if not isinstance(geoms, list):
+                geoms = [geoms]
+            sha1.update(name.encode())
+            for geom in geoms:
+                sha1.update(b'' if geom is None else geom.wkb)
+        return sha1.hexdigest()
+
+    @_cached
     def meshgrid(self, step):
         if self.domain is None:
             raise CrowdDynamicsException(
                 'Domain cannot be dicretized if it is None.')
         return meshgrid(step, *self.domain.bounds)
 
-    @lru_cache()
-    def shortest_path_target(self, step, index, radius):
+    def _targets(self, index):
         if isinstance(index, (int, np.int64)):
-            targets = self.targets[index]
+            return self.targets[index]
         elif index == 'closest':
-            targets = union(*self.targets)
+            return union(*self.targets)
         else:
             raise InvalidType('Index "{0}" should be integer or '
                               '"closest".'.format(index))
 
-        return shortest_path(self.meshgrid(step), self.domain, targets,
-                             self.obstacles, radius)
+    @_cached
+    def shortest_path_target(self, step, index, radius):
+        return _shortest_path_target(step, self.domain, self._targets(index),
+                                     self.obstacles, radius)
 
-    @lru_cache()
+    @_cached
     def direction_map_obstacles(self, step):
-        return direction_map_obstacles(self.meshgrid(step), self.obstacles)
+        return _direction_map_obstacles(step, self.domain, self.obstacles)
+
+    @_cached
+    def closest_target_labels(self, step, radius):
+        """Label map of the index of the closest target. Uses the same
+        distance map as ``shortest_path_target(step, 'closest', radius)``.
+
+        Args:
+            step (float): Step size of the meshgrid.
+            radius (float):
 
-    @lru_cache()
+        Returns:
+            TargetLabelMap:
+        """
+        if not self.targets:
+            raise CrowdDynamicsException('No targets are set.')
+        _, dmap = self.shortest_path_target(step, 'closest', radius)
+        return target_label_map(self.meshgrid(step), self.targets, dmap)
+
+    @_cached
     def navigation_to_target(self, index, step, radius, strength):
+        """Navigation to target.
+
+        Args:
+            index (int|str): Index of the target or ``'closest'``.
+            step (float): Step size of the meshgrid.
+            radius (float):
+            strength (float):
+
+        Returns:
+            Tuple[MeshGrid, DistanceMap, CompactDirectionMap]:
+        """
         if not self.targets:
             raise CrowdDynamicsException('No targets are set.')
 
@@ -162,3 +270,103 @@ class Field(FieldBase):
         dir_map = obstacle_handling(dmap_obs, dir_map_obs, dir_map_targets,
                                     radius, strength)
         return self.meshgrid(step), dmap_targets, dir_map
+
+    def solve_navigation_to_target(self, index, step, radius, strength):
+        """Same as ``navigation_to_target`` but the maps of the target are not
+        cached by the field, which allows the caller to manage their memory.
+        Maps of the target that are already cached, for example by
+        :meth:`precompute_navigation`, are removed from the cache and returned
+        instead of solving them again. The direction map away from the
+        obstacles is shared by all targets and is still cached.
+
+        Args:
+            index (int|str): Index of the target or ``'closest'``.
+            step (float): Step size of the meshgrid.
+            radius (float):
+            strength (float):
+
+        Returns:
+            Tuple[MeshGrid, DistanceMap, CompactDirectionMap]:
+        """
+        if not self.targets:
+            raise CrowdDynamicsException('No targets are set.')
+
+        cached = self._cache.pop(
+            ('navigation_to_target', index, step, radius, strength), None)
+        shortest_path = self._cache.pop(
+            ('shortest_path_target', step, index, radius), None)
+        if cached is not None:
+            return cached
+        if shortest_path is None:
+            shortest_path = _shortest_path_target(
+                step, self.domain, self._targets(index), self.obstacles,
+                radius)
+        dir_map_targets, dmap_targets = shortest_path
+        dir_map_obs, dmap_obs = self.direction_map_obstacles(step)
+        dir_map = obstacle_handling(dmap_obs, dir_map_obs, dir_map_targets,
+                                    radius, strength)
+        return self.meshgrid(step), dmap_targets, dir_map
+
+    def precompute_navigation(self, step, radius, strength, jobs=None,
+                              indices=None):
+        """Solve the distance and direction maps of the targets and the
+        obstacles concurrently in a process pool and fill the navigation
+        caches. Should be called before the simulation is started in order to
+        avoid solving the maps inside the simulation loop. Maps that are
+        already cached are not solved again.
+
+        Args:
+            step (float): Step size of the meshgrid.
+            radius (float):
+            strength (float):
+            jobs (int, optional):
+                Number of worker processes. Defaults to the number of CPUs.
+                Value of 1 solves the maps in the current process.
+            indices (Iterable[int|str], optional):
+                Indices of the targets to precompute. Defaults to all targets.
+
+        Returns:
+            dict: Mapping of the names of solved maps to wall times in seconds.
+        """
+        if not self.targets:
+            raise CrowdDynamicsException('No targets are set.')
+        indices = range(len(self.targets)) if indices is None else \
+            list(indices)
+        if jobs is None:
+            jobs = os.cpu_count() or 1
+
+        tasks = [(('direction_map_obstacles', step), _direction_map_obstacles,
+                  step, self.domain, self.obstacles)]
+        tasks.extend((('shortest_path_target', step, index, radius),
+                      _shortest_path_target, step, self.domain,
+                      self._targets(index), self.obstacles, radius)
+                     for index in indices if
+                     ('navigation_to_target', index, step, radius, strength)
+                     not in self._cache)
+        tasks = [task for task in tasks if task[0] not in self._cache]
+
+        start = time.perf_counter()
+        timings = {}
+
+        def collect(key, result, elapsed):
+            self._cache[key] = result
+            timings[key] = elapsed
+            self.logger.info('Solved %s (%d/%d) in %.3f s', key,
+                             len(timings), len(tasks), elapsed)
+
+        if jobs == 1:
+            for task in tasks:
+                collect(*_timed(*task))
+        else:
+            with ProcessPoolExecutor(max_workers=jobs) as executor:
+                futures = [executor.submit(_timed, *task) for task in tasks]
+                for future in as_completed(futures):
+                    collect(*future.result())
+
+        for index in indices:
+            self.navigation_to_target(index, step, radius, strength)
+
+        self.logger.info('Precomputed %d navigation maps in %.3f s '
+                         'using %d jobs', len(tasks),
+                         time.perf_counter() - start, jobs)
+        return timings
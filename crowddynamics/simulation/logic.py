@@ -1,30 +1,37 @@
 import os
-from collections import Callable
+import shutil
+from collections import Callable, OrderedDict
 
 import numpy as np
 from loggingtools.log_with import log_with
 from matplotlib.path import Path
+from shapely.geometry.base import BaseGeometry
 from shapely.geometry.polygon import Polygon
 from traitlets.traitlets import Float, Instance, Unicode, default, \
-    Int
+    Int, List, Dict, Bool, Enum
 
-from crowddynamics.core.evacuation import exit_detection
+from crowddynamics.core.evacuation import exit_detection, line_crossings, \
+    agents_closer_to_exits
 from crowddynamics.core.geometry import geom_to_linear_obstacles
 from crowddynamics.core.integrator import velocity_verlet_integrator
 from crowddynamics.core.interactions import agent_agent_block_list, \
     agent_obstacle
 from crowddynamics.core.motion.adjusting import force_adjust_agents, \
     torque_adjust_agents
-from crowddynamics.core.motion.fluctuation import force_fluctuation, \
-    torque_fluctuation
+from crowddynamics.core.motion.fluctuation import fluctuation_agents
+from crowddynamics.core.quantities import scatter_add
+from crowddynamics.core.rand import generator_state
 from crowddynamics.core.steering.collective_motion import \
     leader_follower_with_herding_interaction, leader_follower_interaction
-from crowddynamics.core.steering.navigation import getdefault
+from crowddynamics.core.steering.navigation import getdefault, \
+    getdefault_label
 from crowddynamics.core.steering.orientation import \
     orient_towards_target_direction
 from crowddynamics.core.structures import obstacle_type_linear
-from crowddynamics.io import save_npy, save_csv, save_geometry_json
-from crowddynamics.simulation.agents import is_model
+from crowddynamics.io import save_csv, save_geometry_json, TrajectoryStore, \
+    FrameEncoder, BackgroundWriter, save_columns
+from crowddynamics.simulation.agents import is_model, NO_TARGET, \
+    STATIC_FIELDS
 from crowddynamics.simulation.base import LogicNodeBase
 
 
@@ -53,6 +60,56 @@ class LogicNode(LogicNodeBase):
     def update(self):
         raise NotImplementedError
 
+    def get_state(self):
+        """State of the node for checkpointing. Nodes whose state is
+        determined by the simulation, agents and field return empty
+        dictionary.
+
+        Returns:
+            Dict[str, numpy.ndarray]:
+        """
+        return {}
+
+    def set_state(self, state):
+        """Restore state returned by ``get_state``.
+
+        Args:
+            state (Dict[str, numpy.ndarray]):
+        """
+        pass
+
+    def close(self):
+        """Write remaining data and release resources. Called every time
+        the simulation finishes running, therefore closing more than once
+        must be safe and the node should reopen its resources if it is
+        updated again."""
+        pass
+
+    def after_update(self):
+        """Called after all nodes have been updated and the iteration has
+        been counted, when the state of the simulation is consistent."""
+        pass
+
+    def reseed(self, seed):
+        """Reseed random number generators owned by the node. Called when
+        the random state of the simulation is reseeded, for example in the
+        forked variants.
+
+        Args:
+            seed (int):
+        """
+        pass
+
+    def forked(self, index):
+        """Called in the child process of a forked variant before the variant
+        is applied. Nodes that write files should reopen them in a location
+        of their own instead of writing into the files of the parent.
+
+        Args:
+            index (int): Index of the variant.
+        """
+        pass
+
 
 # Motion
 
@@ -76,14 +133,30 @@ class Integrator(LogicNode):
 
 
 class Fluctuation(LogicNode):
+    """Random fluctuation force and torque. Random numbers are drawn from
+    generator state of the node which is seeded from numpy on the first
+    update, reseeded by ``reseed`` and saved in checkpoints."""
+
+    def __init__(self, simulation, *args, **kwargs):
+        super().__init__(simulation, *args, **kwargs)
+        self.random_state = None
+
+    def get_state(self):
+        if self.random_state is None:
+            return {}
+        return {'random_state': self.random_state}
+
+    def set_state(self, state):
+        if 'random_state' in state:
+            self.random_state = state['random_state']
+
+    def reseed(self, seed):
+        self.random_state = generator_state(seed)
+
     def update(self):
-        agents = self.simulation.agents.array
-        force = force_fluctuation(agents['mass'], agents['std_rand_force'])
-        agents['force'] += force
-        if is_model(agents, 'three_circle'):
-            torque = torque_fluctuation(agents['inertia_rot'],
-                                        agents['std_rand_torque'])
-            agents['torque'] += torque
+        if self.random_state is None:
+            self.random_state = generator_state()
+        fluctuation_agents(self.simulation.agents.array, self.random_state)
 
 
 class Adjusting(LogicNode):
@@ -110,13 +183,33 @@ class AgentAgentInteractions(LogicNode):
     cell_size = Float(
         min=0,
         help='')
+    local_density = Bool(
+        default_value=False,
+        help='Estimate local density of the active agents on every update '
+             'into "density" attribute of this node, an array in the order '
+             'of the agents.')
+    density_radius = Float(
+        default_value=0.7,
+        min=0,
+        help='Radius of the Gaussian kernel of the local density. Three '
+             'times the radius must not exceed "cell_size".')
+
+    def __init__(self, simulation, *args, **kwargs):
+        super().__init__(simulation, *args, **kwargs)
+        self.density = None
 
     @default('cell_size')
     def _default_cell_size(self):
         return self.sight_soc + 2 * self.max_agent_radius
 
     def update(self):
-        agent_agent_block_list(self.simulation.agents.array, self.cell_size)
+        agents = self.simulation.agents.array
+        if not self.local_density:
+            self.density = None
+        elif self.density is None or len(self.density) != len(agents):
+            self.density = np.zeros(len(agents))
+        agent_agent_block_list(agents, self.cell_size, self.density,
+                               self.density_radius)
 
 
 class AgentObstacleInteractions(LogicNode):
@@ -133,6 +226,11 @@ class AgentObstacleInteractions(LogicNode):
 # Steering
 
 class Navigation(LogicNode):
+    """Sets the target direction of the agents from the direction maps of
+    their targets. Maps are solved lazily and only for the targets that have
+    agents. Solved maps are kept in a least recently used cache. Maps of the
+    targets that no longer have agents are evicted from the cache when their
+    total size exceeds the memory budget."""
     step = Float(
         default_value=0.1,
         min=0,
@@ -145,18 +243,91 @@ class Navigation(LogicNode):
         default_value=0.3,
         min=0, max=1,
         help='')
+    memory_budget = Int(
+        default_value=None,
+        allow_none=True,
+        min=0,
+        help='Maximum number of bytes used by the cached direction maps of '
+             'the targets without agents. If None, maps are never evicted '
+             'and they are cached by the field.')
+
+    def __init__(self, simulation, *args, **kwargs):
+        super().__init__(simulation, *args, **kwargs)
+        self.target_counts = np.zeros(0, dtype=np.int64)
+        self._maps = OrderedDict()
+        self.simulation.field.observe(
+            self._observe_field, names=['domain', 'obstacles', 'targets'])
+
+    def _observe_field(self, change):
+        """Drop the maps solved for the previous geometry of the field."""
+        self._maps.clear()
+
+    @property
+    def memory_usage(self):
+        """Number of bytes used by the cached direction maps."""
+        return sum(dir_map.nbytes for _, dir_map in self._maps.values())
+
+    def direction_map(self, target):
+        """Meshgrid and compact direction map of the target."""
+        if target in self._maps:
+            self._maps.move_to_end(target)
+            return self._maps[target]
+
+        field = self.simulation.field
+        if self.memory_budget is None:
+            solve = field.navigation_to_target
+        else:
+            solve = field.solve_navigation_to_target
+        mgrid, _, dir_map = solve(target, self.step, self.radius,
+                                  self.strength)
+        self._maps[target] = (mgrid, dir_map)
+        return mgrid, dir_map
+
+    def _in_use(self, target):
+        return target < len(self.target_counts) and \
+            bool(self.target_counts[target])
+
+    def evict(self):
+        """Evicts least recently used maps of the targets without agents until
+        the memory usage of these maps is within the budget. Maps of the
+        targets with agents are not counted towards the budget."""
+        if self.memory_budget is None:
+            return
+        usage = sum(dir_map.nbytes for target, (_, dir_map) in
+                    self._maps.items() if not self._in_use(target))
+        for target in list(self._maps):
+            if usage <= self.memory_budget:
+                break
+            if self._in_use(target):
+                continue
+            _, dir_map = self._maps.pop(target)
+            usage -= dir_map.nbytes
+
+    def get_state(self):
+        state = {'target_counts': self.target_counts}
+        for target, (_, dir_map) in self._maps.items():
+            state['map_{}'.format(target)] = dir_map
+        return state
+
+    def set_state(self, state):
+        self.target_counts = state['target_counts']
+        self._maps.clear()
+        mgrid = self.simulation.field.meshgrid(self.step)
+        for key, value in state.items():
+            if key.startswith('map_'):
+                self._maps[int(key[len('map_'):])] = (mgrid, value)
 
     def update(self):
         agents = self.simulation.agents.array
         field = self.simulation.field
 
-        for target in range(len(field.targets)):
-            has_target = agents['target'] == target
-            if not has_target.size:
-                continue
+        targets = agents['target']
+        self.target_counts = np.bincount(targets[targets >= 0],
+                                         minlength=len(field.targets))
 
-            mgrid, distance_map, direction_map = field.navigation_to_target(
-                target, self.step, self.radius, self.strength)
+        for target in np.flatnonzero(self.target_counts):
+            has_target = targets == target
+            mgrid, direction_map = self.direction_map(int(target))
 
             # Flip x and y to array index i and j
             indices = np.fliplr(mgrid.indicer(agents[has_target]['position']))
@@ -164,6 +335,37 @@ class Navigation(LogicNode):
                 indices, direction_map, agents[has_target]['target_direction'])
             agents['target_direction'][has_target] = new_direction
 
+        self.evict()
+
+
+class ClosestTarget(LogicNode):
+    """Sets the closest target for agents that do not have a target by looking
+    up the label map of the closest targets."""
+    step = Float(
+        default_value=0.1,
+        min=0,
+        help='Step size for meshgrid used for discretization.')
+    radius = Float(
+        default_value=0.5,
+        min=0,
+        help='')
+
+    def update(self):
+        agents = self.simulation.agents.array
+        field = self.simulation.field
+
+        no_target = (agents['target'] == NO_TARGET) & ~agents['is_follower']
+        if not np.any(no_target):
+            return
+
+        mgrid = field.meshgrid(self.step)
+        label_map = field.closest_target_labels(self.step, self.radius)
+
+        # Flip x and y to array index i and j
+        indices = np.fliplr(mgrid.indicer(agents[no_target]['position']))
+        agents['target'][no_target] = getdefault_label(
+            indices, label_map, agents[no_target]['target'])
+
 
 class LeaderFollower(LogicNode):
     sight = Float(
@@ -269,9 +471,10 @@ class SaveSimulationData(LogicNode):
     Saved once
     - Geometry
     - Metadata
+    - Static parameters of agents
 
     Saved continuously
-    - Agents
+    - Agents (chunked trajectory store)
     - Data
 
     Examples:
@@ -279,7 +482,9 @@ class SaveSimulationData(LogicNode):
         >>>     return (simulation.data['iterations'] + 1) % frequency == 0
         >>>
         >>> node = SaveSimulationData(save_condition=save_condition,
-        >>>                           base_directory='.')
+        >>>                           base_directory='.',
+        >>>                           fields=['position', 'velocity', 'active'],
+        >>>                           encodings={'position': 'int16'})
     """
     save_condition = Instance(
         Callable,
@@ -290,9 +495,68 @@ class SaveSimulationData(LogicNode):
         help='Path to the directory where simulation data should be saved.')
     save_directory = Unicode(
         help='Name of the directory to save current simulation.')
+    data_format = Enum(
+        ('columns', 'csv'),
+        default_value='columns',
+        help='Format of the simulation data. "columns" saves each key into '
+             'binary file which can be exported to csv later.')
+    chunk_size = Int(
+        default_value=100,
+        min=1,
+        help='Number of frames of agents in one chunk file.')
+    fields = List(
+        Unicode(),
+        default_value=None,
+        allow_none=True,
+        help='Fields of agents saved on every frame. If None, all fields '
+             'that are not static fields.')
+    static_fields = List(
+        Unicode(),
+        default_value=list(STATIC_FIELDS),
+        help='Fields of agents that are constant during the simulation and '
+             'saved once.')
+    encodings = Dict(
+        default_value={},
+        help='Mapping of field name to encoding "float32", "float16" or '
+             '"int16". Encoding "int16" is supported for position fields and '
+             'it is relative to the bounds of the domain.')
+    compression = Enum(
+        ('zlib', 'lzma'),
+        default_value=None,
+        allow_none=True,
+        help='Compression of the frames of agents. Frames are delta encoded '
+             'and compressed in blocks of keyframe interval.')
+    keyframe_interval = Int(
+        default_value=10,
+        min=1,
+        help='Number of frames between keyframes when compression is used.')
+    checkpoint_interval = Int(
+        default_value=0,
+        min=0,
+        help='Number of iterations between automatic checkpoints of the '
+             'simulation into "checkpoint" directory. Zero disables '
+             'checkpoints.')
+    background = Bool(
+        default_value=False,
+        help='Write data in a background thread.')
+    queue_size = Int(
+        default_value=16,
+        min=1,
+        help='Maximum number of frames waiting to be written in the '
+             'background.')
+    queue_policy = Enum(
+        BackgroundWriter.policies,
+        default_value='block',
+        help='Policy when the background writer falls behind. "block" waits '
+             'for the writer and "drop" drops the frame of agents. Frames when '
+             'data is saved and the rows of simulation data are never '
+             'dropped.')
 
     def __init__(self, simulation, *args, **kwargs):
         super().__init__(simulation, *args, **kwargs)
+        self._open()
+
+    def _open(self):
         os.makedirs(self.full_path, exist_ok=True)
 
         # Metadata
@@ -308,12 +572,43 @@ class SaveSimulationData(LogicNode):
                            geometries)
 
         # Data
-        self.save_data_csv = save_csv(self.full_path, 'data')
-        self.save_data_csv.send(None)
+        if self.data_format == 'columns':
+            self.save_data = save_columns(self.full_path, 'data')
+        else:
+            self.save_data = save_csv(self.full_path, 'data')
+        self.save_data.send(None)
 
         # Agents
-        self.save_agent_npy = save_npy(self.full_path, 'agents')
-        self.save_agent_npy.send(None)
+        dtype = self.simulation.agents.array.dtype
+        static_fields = [name for name in self.static_fields
+                         if name in dtype.names]
+        fields = self.fields
+        if fields is None:
+            fields = [name for name in dtype.names
+                      if name not in static_fields]
+
+        domain = self.simulation.field.domain
+        bounds = {}
+        if domain is not None:
+            minx, miny, maxx, maxy = domain.bounds
+            bounds = {name: ((minx, miny), (maxx, maxy)) for name in
+                      ('position', 'position_ls', 'position_rs')
+                      if name in fields}
+
+        self.static_encoder = FrameEncoder(dtype, static_fields)
+        self.encoder = FrameEncoder(dtype, fields, self.encodings, bounds)
+        self.trajectory = TrajectoryStore(
+            self.full_path, 'agents', self.chunk_size,
+            attrs={'encoding': self.encoder.to_dict()},
+            compression=self.compression,
+            keyframe_interval=self.keyframe_interval)
+        self._static_saved = False
+
+        self.writer = None
+        if self.background:
+            self.writer = BackgroundWriter(self.queue_size, self.queue_policy)
+        # Rows of data waiting to be submitted with the next frame
+        self._rows = []
 
     @property
     def full_path(self):
@@ -327,14 +622,68 @@ class SaveSimulationData(LogicNode):
     def add_to_simulation_logic(self):
         self.simulation.logic['Reset'].inject_before(self)
 
+    def forked(self, index):
+        """Save the variant into ``variant_{index}`` subdirectory. Files and
+        the background writer thread of the parent are left untouched."""
+        self.save_directory = os.path.join(self.save_directory,
+                                           'variant_{}'.format(index))
+        self._open()
+
     def update(self):
         save = self.save_condition(self.simulation)
+        agents = self.simulation.agents.array
 
-        self.save_agent_npy.send(self.simulation.agents.array)
-        self.save_agent_npy.send(save)
-
-        self.save_data_csv.send(self.simulation.data)
-        self.save_data_csv.send(save)
+        if not self._static_saved:
+            np.save(os.path.join(self.full_path, 'agents_static.npy'),
+                    self.static_encoder.encode(agents))
+            self._static_saved = True
+
+        # Encoding copies the frame
+        frame = self.encoder.encode(agents)
+        time = self.simulation.data['time_tot']
+        if self.writer is not None and self.writer.closed:
+            # Simulation is run again after closing
+            self.writer = BackgroundWriter(self.queue_size, self.queue_policy)
+        if self.writer is None:
+            self._write(frame, time, [(self.simulation.data, save)], save)
+        else:
+            # Rows of dropped frames are written with the next frame
+            self._rows.append((dict(self.simulation.data), save))
+            if self.writer.submit(self._write, frame, time, self._rows, save,
+                                  block=True if save else None):
+                self._rows = []
+
+    def after_update(self):
+        if self.checkpoint_interval and \
+                self.simulation.data['iterations'] % \
+                self.checkpoint_interval == 0:
+            self.simulation.checkpoint(
+                os.path.join(self.full_path, 'checkpoint'))
+
+    def _write(self, frame, time, rows, save):
+        if frame is not None:
+            self.trajectory.append(frame, time)
+            if save:
+                self.trajectory.flush(fsync=self.background)
+
+        for data, dump in rows:
+            self.save_data.send(data)
+            self.save_data.send(dump)
+
+    def close(self):
+        """Write remaining data and close the files. Closing again does
+        nothing and the files are reopened if the node is updated after
+        closing."""
+        if self.writer is None:
+            self.save_data.send(True)
+        elif not self.writer.closed:
+            if self._rows:
+                self.writer.submit(self._write, None, None, self._rows, False,
+                                   block=True)
+                self._rows = []
+            self.writer.submit(self.save_data.send, True, block=True)
+            self.writer.close()
+        self.trajectory.close()
 
 
 # States
@@ -374,14 +723,415 @@ class TargetReached(LogicNode):
         # We can only measure polygon targets atm
         for i, target in enumerate(self.simulation.field.targets):
             if isinstance(target, Polygon):
-                name = self.prefix.format(i)
+                name = self.prefix.format(index=i)
                 self.names.append(name)
                 self.paths.append(Path(np.asarray(target.exterior)))
                 self.reached_by.append(np.zeros(size, dtype=np.bool_))
                 self.simulation.data[name] = 0
 
+    def get_state(self):
+        return dict(zip(self.names, self.reached_by))
+
+    def set_state(self, state):
+        self.reached_by = [state[name] for name in self.names]
+
     def update(self):
         # TODO: update target reached
         for name, path, reached_by in zip(self.names, self.paths, self.reached_by):
-            reached_by |= path.contains_points(self.simulation.agents.array)
+            reached_by |= path.contains_points(
+                self.simulation.agents.array['position'])
             self.simulation.data[name] = np.sum(reached_by)
+
+
+class FlowCounter(LogicNode):
+    """Counts agents that cross lines between iterations. Crossings to the
+    left side of the line (from its start point to its end point) are
+    positive and to the right side negative. Lines default to the targets of
+    the field.
+
+    Data for each line ``line_{index}``
+
+    - ``_positive``, ``_negative``: Cumulative number of crossings.
+    - ``_flow``: Number of crossings per unit time during the last complete
+      interval.
+
+    Crossing events are recorded with their time, line, agent and sign.
+    Events are buffered in memory and appended into ``filepath`` as raw
+    array of ``event_type`` when the buffer is full and on close, so that
+    memory usage and the size of the checkpoints do not grow during the
+    simulation.
+    """
+    prefix = 'line_{index}'
+    event_type = np.dtype([('time', np.float64), ('line', np.int64),
+                           ('agent', np.int64), ('sign', np.int8)])
+
+    lines = List(
+        Instance(BaseGeometry),
+        default_value=None,
+        allow_none=True,
+        help='Lines to measure. If None, the targets of the field.')
+    interval = Int(
+        default_value=100,
+        min=1,
+        help='Number of iterations in the interval of the flow.')
+    filepath = Unicode(
+        default_value=None,
+        allow_none=True,
+        help='Path of the file where crossing events are written. If None, '
+             'only the latest events that fit in the buffer are kept.')
+    buffer_size = Int(
+        default_value=1024,
+        min=1,
+        help='Number of crossing events buffered in memory.')
+
+    def __init__(self, simulation, *args, **kwargs):
+        super().__init__(simulation, *args, **kwargs)
+        lines = self.lines
+        if lines is None:
+            lines = [target.boundary if isinstance(target, Polygon)
+                     else target for target in self.simulation.field.targets]
+
+        self.names = [self.prefix.format(index=i) for i in range(len(lines))]
+        segments = [geom_to_linear_obstacles(line) for line in lines]
+        self.segments = np.concatenate(segments) if segments else \
+            np.zeros(0, dtype=obstacle_type_linear)
+        self.line_index = np.repeat(np.arange(len(lines)),
+                                    [len(s) for s in segments])
+
+        self.counts = np.zeros((len(lines), 2), dtype=np.int64)
+        self.interval_counts = np.zeros(len(lines), dtype=np.int64)
+        self.interval_start = self.simulation.data['time_tot']
+        self.previous = None
+        self.previous_active = None
+        self.events = np.zeros(0, dtype=self.event_type)
+        self.events_written = 0
+        for name in self.names:
+            self.simulation.data[name + '_positive'] = 0
+            self.simulation.data[name + '_negative'] = 0
+            self.simulation.data[name + '_flow'] = 0.0
+
+    def crossing_events(self):
+        """Recorded crossing events, the events written into ``filepath``
+        followed by the buffered events.
+
+        Returns:
+            numpy.ndarray: Array of dtype ``event_type``.
+        """
+        if not self.events_written:
+            return self.events
+        written = np.fromfile(self.filepath, dtype=self.event_type,
+                              count=self.events_written)
+        return np.concatenate((written, self.events))
+
+    def flush_events(self):
+        """Append buffered events into ``filepath``. Without ``filepath``
+        events that do not fit in the buffer are discarded."""
+        if self.filepath is None:
+            self.events = self.events[-self.buffer_size:]
+            return
+        # First write replaces the file of the previous run
+        mode = 'ab' if self.events_written else 'wb'
+        with open(self.filepath, mode) as fp:
+            self.events.tofile(fp)
+        self.events_written += len(self.events)
+        self.events = np.zeros(0, dtype=self.event_type)
+
+    def get_state(self):
+        state = {'counts': self.counts,
+                 'interval_counts': self.interval_counts,
+                 'interval_start': np.array(self.interval_start),
+                 'events': self.events,
+                 'events_written': np.array(self.events_written)}
+        if self.previous is not None:
+            state['previous'] = self.previous
+            state['previous_active'] = self.previous_active
+        return state
+
+    def set_state(self, state):
+        self.counts = state['counts']
+        self.interval_counts = state['interval_counts']
+        self.interval_start = float(state['interval_start'])
+        self.events = state['events']
+        self.events_written = int(state['events_written'])
+        if self.filepath is not None and os.path.exists(self.filepath):
+            # Discard events written after the checkpoint
+            os.truncate(self.filepath,
+                        self.events_written * self.event_type.itemsize)
+        self.previous = state.get('previous')
+        self.previous_active = state.get('previous_active')
+
+    def update(self):
+        agents = self.simulation.agents.array
+        data = self.simulation.data
+        position = np.copy(agents['position'])
+        active = np.copy(agents['active'])
+
+        if self.previous is not None:
+            crossings = line_crossings(
+                self.previous, position, self.previous_active & active,
+                self.segments, self.line_index, len(self.names))
+            agent, line = np.nonzero(crossings)
+            if len(agent):
+                sign = crossings[agent, line]
+                events = np.zeros(len(agent), dtype=self.event_type)
+                events['time'] = data['time_tot']
+                events['line'] = line
+                events['agent'] = agent
+                events['sign'] = sign
+                self.events = np.concatenate((self.events, events))
+                if len(self.events) >= self.buffer_size:
+                    self.flush_events()
+                self.counts[:, 0] += np.bincount(
+                    line[sign > 0], minlength=len(self.names))
+                self.counts[:, 1] += np.bincount(
+                    line[sign < 0], minlength=len(self.names))
+                self.interval_counts += np.bincount(
+                    line, minlength=len(self.names))
+
+        if (data['iterations'] + 1) % self.interval == 0:
+            elapsed = data['time_tot'] - self.interval_start
+            flow = self.interval_counts / elapsed if elapsed > 0 else \
+                np.zeros(len(self.names))
+            for name, value in zip(self.names, flow):
+                data[name + '_flow'] = value
+            self.interval_counts[:] = 0
+            self.interval_start = data['time_tot']
+
+        for name, (positive, negative) in zip(self.names, self.counts):
+            data[name + '_positive'] = int(positive)
+            data[name + '_negative'] = int(negative)
+
+        self.previous = position
+        self.previous_active = active
+
+    def forked(self, index):
+        """Write the events of the variant into ``filepath`` suffixed with
+        ``_variant_{index}`` starting from a copy of the events so far."""
+        if self.filepath is not None:
+            root, ext = os.path.splitext(self.filepath)
+            filepath = '{}_variant_{}{}'.format(root, index, ext)
+            if self.events_written:
+                shutil.copyfile(self.filepath, filepath)
+            self.filepath = filepath
+
+    def close(self):
+        """Write buffered events into ``filepath`` if it is set."""
+        if self.filepath is not None:
+            self.flush_events()
+
+
+class ExitQueue(LogicNode):
+    """Maintains the number of active agents closer to each exit than the
+    agent in ``agents_closer_to_exit[i, e]``. Exits are the centroids of the
+    targets of the field. Ranks are updated incrementally from the order of
+    the previous iteration.
+    """
+    def __init__(self, simulation, *args, **kwargs):
+        super().__init__(simulation, *args, **kwargs)
+        self.c_doors = np.array(
+            [target.centroid.coords[0] for target in
+             self.simulation.field.targets], dtype=np.float64).reshape(-1, 2)
+        self._reset(len(self.simulation.agents.array))
+
+    def _reset(self, size):
+        self.order = np.tile(np.arange(size), (len(self.c_doors), 1))
+        self.agents_closer_to_exit = np.zeros((size, len(self.c_doors)),
+                                              dtype=np.int64)
+
+    def get_state(self):
+        return {'order': self.order}
+
+    def set_state(self, state):
+        self.order = state['order']
+        self.agents_closer_to_exit = np.zeros(
+            self.order.T.shape, dtype=np.int64)
+
+    def update(self):
+        agents = self.simulation.agents.array
+        if len(agents) != self.order.shape[1]:
+            self._reset(len(agents))
+        agents_closer_to_exits(self.c_doors, agents['position'],
+                               agents['active'], self.order,
+                               self.agents_closer_to_exit)
+
+
+# Measurements
+
+
+class GridAccumulator(LogicNode):
+    """Base class for accumulating quantities of active agents on a fixed grid
+    covering the domain. Values returned by ``values`` are summed into the
+    cells that contain the agents and converted into rasters by ``rasters``.
+    Rasters are written into compressed ``.npz`` file by ``save``.
+
+    Examples:
+        >>> node = DensityAccumulator(simulation, cell_size=0.5, interval=10,
+        >>>                           smoothing=0.1, filepath='density.npz')
+        >>> simulation.logic.add_children(node)
+    """
+    channels = 1
+
+    cell_size = Float(
+        default_value=0.5,
+        min=0,
+        help='Size of the cells of the grid.')
+    interval = Int(
+        default_value=1,
+        min=1,
+        help='Number of iterations between accumulations.')
+    smoothing = Float(
+        default_value=None,
+        allow_none=True,
+        min=0,
+        max=1,
+        help='Smoothing factor of exponential moving average. If None, only '
+             'time-averages are computed.')
+    filepath = Unicode(
+        default_value=None,
+        allow_none=True,
+        help='Path of the file where rasters are saved on close.')
+
+    def __init__(self, simulation, *args, **kwargs):
+        super().__init__(simulation, *args, **kwargs)
+        minx, miny, maxx, maxy = self.simulation.field.domain.bounds
+        self.origin = np.array((minx, miny))
+        self.shape = (max(int(np.ceil((maxx - minx) / self.cell_size)), 1),
+                      max(int(np.ceil((maxy - miny) / self.cell_size)), 1))
+        self.samples = 0
+        self.sums = np.zeros(self.shape + (self.channels,))
+        self.ema = None
+        if self.smoothing is not None:
+            self.ema = np.zeros_like(self.sums)
+
+    def values(self, agents):
+        """Values of the agents that are accumulated.
+
+        Args:
+            agents (numpy.ndarray): Active agents.
+
+        Returns:
+            numpy.ndarray: Array of shape (len(agents), channels).
+        """
+        raise NotImplementedError
+
+    def rasters(self, grid):
+        """Rasters computed from the accumulated values.
+
+        Args:
+            grid (numpy.ndarray): Average of the accumulated values per
+                sample of shape (nx, ny, channels).
+
+        Returns:
+            OrderedDict:
+        """
+        raise NotImplementedError
+
+    def get_state(self):
+        state = {'sums': self.sums, 'samples': np.array(self.samples)}
+        if self.ema is not None:
+            state['ema'] = self.ema
+        return state
+
+    def set_state(self, state):
+        self.sums = state['sums']
+        self.samples = int(state['samples'])
+        if self.ema is not None:
+            self.ema = state['ema']
+
+    def update(self):
+        if self.simulation.data['iterations'] % self.interval:
+            return
+        agents = self.simulation.agents.array
+        agents = agents[agents['active']]
+        values = np.ascontiguousarray(self.values(agents), dtype=np.float64)
+        if self.ema is None:
+            scatter_add(agents['position'], values, self.sums, self.origin,
+                        self.cell_size)
+        else:
+            grid = scatter_add(agents['position'], values,
+                               np.zeros_like(self.sums), self.origin,
+                               self.cell_size)
+            self.sums += grid
+            self.ema += self.smoothing * (grid - self.ema)
+        self.samples += 1
+
+    def results(self):
+        """Time-averaged rasters and their exponential moving averages with
+        suffix ``_ema``.
+
+        Returns:
+            OrderedDict:
+        """
+        results = OrderedDict([('origin', self.origin),
+                               ('cell_size', self.cell_size),
+                               ('samples', self.samples)])
+        results.update(self.rasters(self.sums / max(self.samples, 1)))
+        if self.ema is not None:
+            results.update(('{}_ema'.format(name), raster) for name, raster
+                           in self.rasters(self.ema).items())
+        return results
+
+    def save(self, filepath):
+        """Save rasters into compressed ``.npz`` file."""
+        np.savez_compressed(filepath, **self.results())
+
+    def forked(self, index):
+        """Save the rasters of the variant into ``filepath`` suffixed with
+        ``_variant_{index}``."""
+        if self.filepath is not None:
+            root, ext = os.path.splitext(self.filepath)
+            self.filepath = '{}_variant_{}{}'.format(root, index, ext)
+
+    def close(self):
+        """Save rasters into ``filepath`` if it is set."""
+        if self.filepath is not None:
+            self.save(self.filepath)
+
+
+def _divide(a, b):
+    """Division that is nan where ``b`` is zero."""
+    out = np.full(np.broadcast(a, b).shape, np.nan)
+    return np.divide(a, b, out=out, where=b > 0)
+
+
+class DensityAccumulator(GridAccumulator):
+    """Accumulates number of agents in the cells. Raster ``density`` is the
+    average number of agents per unit area."""
+    channels = 1
+
+    def values(self, agents):
+        return np.ones((len(agents), 1))
+
+    def rasters(self, grid):
+        return OrderedDict([('density', grid[..., 0] / self.cell_size ** 2)])
+
+
+class SpeedAccumulator(GridAccumulator):
+    """Accumulates number of agents and their speeds in the cells. Raster
+    ``speed`` is the average speed of the agents in the cell."""
+    channels = 2
+
+    def values(self, agents):
+        velocity = agents['velocity']
+        return np.stack((np.ones(len(agents)),
+                         np.hypot(velocity[:, 0], velocity[:, 1])), axis=1)
+
+    def rasters(self, grid):
+        return OrderedDict([('speed', _divide(grid[..., 1], grid[..., 0]))])
+
+
+class FlowAccumulator(GridAccumulator):
+    """Accumulates number of agents and their velocity vectors in the cells.
+    Raster ``velocity`` is the average velocity of the agents in the cell and
+    ``flow`` is the specific flow, i.e. density times velocity."""
+    channels = 3
+
+    def values(self, agents):
+        values = np.ones((len(agents), 3))
+        values[:, 1:] = agents['velocity']
+        return values
+
+    def rasters(self, grid):
+        return OrderedDict([
+            ('velocity', _divide(grid[..., 1:], grid[..., :1])),
+            ('flow', grid[..., 1:] / self.cell_size ** 2)])
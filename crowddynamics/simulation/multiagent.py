@@ -1,18 +1,44 @@
+import json
 import logging
 import multiprocessing
+import os
+import shutil
 from multiprocessing import Process, Event
 
-from anytree.iterators import PostOrderIter
+import numpy as np
+from anytree.iterators import PostOrderIter, PreOrderIter
 from loggingtools import log_with
 from traitlets import Instance
 
 from crowddynamics.exceptions import CrowdDynamicsException
+from crowddynamics.io import save_json_atomic
 from crowddynamics.simulation.agents import Agents
 from crowddynamics.simulation.base import SimulationBase
 from crowddynamics.simulation.field import Field
 from crowddynamics.simulation.logic import LogicNode
 
 
+# Simulation and arguments of fork inherited by the forked processes.
+_forked = None
+
+
+def _run_forked(index):
+    simulation, variants, run, seeds = _forked
+    np.random.seed(seeds[index])
+    for node in simulation._nodes():
+        node.reseed(int(seeds[index]))
+        node.forked(index)
+    variants[index](simulation)
+    return run(simulation)
+
+
+def run_simulation(simulation):
+    """Default function for running forked simulation. Runs the simulation
+    until exit condition and returns simulation data."""
+    simulation.run()
+    return simulation.data
+
+
 class MultiAgentSimulation(SimulationBase):
     r"""Constructing a multi-agent simulation
 
@@ -53,6 +79,181 @@ class MultiAgentSimulation(SimulationBase):
         for node in PostOrderIter(self.logic.root):
             node.update()
         self.data['iterations'] += 1
+        for node in PostOrderIter(self.logic.root):
+            node.after_update()
+
+    def close(self):
+        """Close the logic nodes."""
+        for node in self._nodes():
+            node.close()
+
+    def fork(self, variants, run=run_simulation, seeds=None, processes=None):
+        """Run variants of the simulation starting from the current state.
+        Each variant runs in its own child process forked from the current
+        process, therefore the state of the simulation is shared
+        copy-on-write and it is not copied or re-simulated. The state of this
+        simulation is not modified.
+
+        Child processes run the simulation with ``run``, thus the exit
+        condition should be set before forking or by the variants. Nodes that
+        write files reopen them for each variant (see
+        :meth:`LogicNode.forked`), for example :class:`SaveSimulationData`
+        saves into ``variant_{index}`` subdirectory of its save directory.
+
+        Variants can change the geometry of the field by assigning new
+        values to its traits, which clears the cached navigation maps of the
+        field and of :class:`Navigation`. Target indices of the agents are
+        not remapped, and nodes that read the geometry when they are created,
+        for example :class:`ExitQueue`, keep using the old geometry.
+
+        Examples:
+            >>> def close_door(simulation):
+            >>>     simulation.field.targets = simulation.field.targets[1:]
+            >>>     target = simulation.agents.array['target']
+            >>>     target[target > 0] -= 1
+            >>>
+            >>> simulation.exit_condition = lambda s: s.data['iterations'] > 1000
+            >>> results = simulation.fork([lambda s: None, close_door])
+
+        Args:
+            variants (List[Callable[[MultiAgentSimulation], None]]):
+                Functions that modify the logic, field or agents of the
+                simulation in the child process.
+            run (Callable[[MultiAgentSimulation], Any]):
+                Function that runs the simulation in the child process and
+                returns picklable result.
+            seeds (List[int], optional):
+                Seed of ``np.random`` and of the generators of the logic
+                nodes (see :meth:`LogicNode.reseed`) for each variant. By
+                default seeds are drawn using the current state of
+                ``np.random`` without advancing it.
+            processes (int, optional):
+                Maximum number of concurrent child processes. Defaults to
+                number of CPUs.
+
+        Returns:
+            list: Results of ``run`` for each variant.
+        """
+        global _forked
+        if 'fork' not in multiprocessing.get_all_start_methods():
+            raise CrowdDynamicsException(
+                'Forking is not supported on this platform.')
+        if seeds is None:
+            random_state = np.random.RandomState()
+            random_state.set_state(np.random.get_state())
+            seeds = random_state.randint(2 ** 32 - 1, size=len(variants))
+        if len(seeds) != len(variants):
+            raise CrowdDynamicsException(
+                'Number of seeds should match the number of variants.')
+
+        _forked = (self, variants, run, seeds)
+        try:
+            # Each task gets a new worker forked from the current state
+            context = multiprocessing.get_context('fork')
+            with context.Pool(processes, maxtasksperchild=1) as pool:
+                return pool.map(_run_forked, range(len(variants)),
+                                chunksize=1)
+        finally:
+            _forked = None
+
+    def _nodes(self):
+        return list(PreOrderIter(self.logic.root)) if self.logic else []
+
+    @log_with(qualname=True, timed=True, ignore={'self'})
+    def checkpoint(self, path):
+        """Save the state of the simulation into directory so that it can be
+        continued using ``restore``. Saved state consists of
+
+        - ``agents.npy``: Agent array
+        - ``state.npz``: Arrays of the states of the logic nodes and the state
+          of ``np.random``
+        - ``checkpoint.json``: Simulation data, the rest of the state of
+          ``np.random``, names of the logic nodes and the hash of the field
+          geometry.
+
+        State is written into temporary directory which replaces the existing
+        checkpoint when it is complete.
+
+        Args:
+            path (str|Path): Directory of the checkpoint.
+        """
+        path = os.path.abspath(path)
+        tmp = path + '.tmp'
+        if os.path.exists(tmp):
+            shutil.rmtree(tmp)
+        os.makedirs(tmp)
+
+        np.save(os.path.join(tmp, 'agents.npy'), self.agents.array)
+
+        nodes = self._nodes()
+        arrays = {}
+        for index, node in enumerate(nodes):
+            for key, value in node.get_state().items():
+                arrays['{}/{}'.format(index, key)] = value
+        name, keys, pos, has_gauss, cached_gaussian = np.random.get_state()
+        arrays['random'] = keys
+        np.savez(os.path.join(tmp, 'state.npz'), **arrays)
+
+        state = {
+            'data': {key: getattr(value, 'item', lambda: value)()
+                     for key, value in self.data.items()},
+            'random': [name, pos, has_gauss, cached_gaussian],
+            'nodes': [node.name for node in nodes],
+            'geometry_hash': self.field.geometry_hash(),
+        }
+        save_json_atomic(os.path.join(tmp, 'checkpoint.json'), state)
+
+        if os.path.exists(path):
+            old = path + '.old'
+            if os.path.exists(old):
+                # Left from interrupted checkpoint
+                shutil.rmtree(old)
+            os.replace(path, old)
+            os.replace(tmp, path)
+            shutil.rmtree(old)
+        else:
+            os.replace(tmp, path)
+
+    @log_with(qualname=True, timed=True, ignore={'self'})
+    def restore(self, path):
+        """Restore the state of the simulation from a checkpoint. Simulation
+        should be constructed the same way as the simulation that was
+        checkpointed.
+
+        Args:
+            path (str|Path): Directory of the checkpoint.
+
+        Raises:
+            CrowdDynamicsException:
+                If the field or the logic nodes do not match the checkpoint.
+        """
+        with open(os.path.join(path, 'checkpoint.json')) as fp:
+            state = json.load(fp)
+
+        if state['geometry_hash'] != self.field.geometry_hash():
+            raise CrowdDynamicsException(
+                'Geometry of the field does not match the checkpoint.')
+        nodes = self._nodes()
+        if state['nodes'] != [node.name for node in nodes]:
+            raise CrowdDynamicsException(
+                'Logic nodes {} do not match the nodes {} of the '
+                'checkpoint.'.format([node.name for node in nodes],
+                                     state['nodes']))
+
+        self.agents.array = np.load(os.path.join(path, 'agents.npy'))
+
+        with np.load(os.path.join(path, 'state.npz')) as arrays:
+            name, pos, has_gauss, cached_gaussian = state['random']
+            np.random.set_state((name, arrays['random'], pos, has_gauss,
+                                 cached_gaussian))
+            for index, node in enumerate(nodes):
+                prefix = '{}/'.format(index)
+                node.set_state({key[len(prefix):]: arrays[key]
+                                for key in arrays.files
+                                if key.startswith(prefix)})
+
+        self.data.clear()
+        self.data.update(state['data'])
 
 
 class MultiAgentProcess(Process):
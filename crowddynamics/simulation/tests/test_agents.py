@@ -3,12 +3,17 @@ from collections import Collection, Generator, Callable
 
 import numpy as np
 import pytest
+from shapely.geometry import Polygon, Point, LineString
 
+from crowddynamics.core.block_list import SpatialHash
+from crowddynamics.core.geometry import geom_to_linear_obstacles
 from crowddynamics.core.vector2D import unit_vector
+from traitlets import TraitError
+
 from crowddynamics.simulation.agents import (
     Circular, ThreeCircle, AgentGroup, Agents,
     AgentType, overlapping_circles,
-    overlapping_three_circles)
+    overlapping_three_circles, agent_group_array, place_circular)
 
 SIZE = 10
 XMIN = -10
@@ -89,3 +94,118 @@ def test_overlapping_three_circle(agents_three_circle):
     )
     overlapping_three_circles(agents_three_circle.array, x, r)
     assert True
+
+
+def column_attributes():
+    return {
+        'body_type': 'adult',
+        'orientation': lambda size: np.random.uniform(-np.pi, np.pi, size),
+        'velocity': lambda size: np.random.uniform(0.0, 1.0, (size, 2)),
+        'tau_adj': 0.4,
+    }
+
+
+@pytest.mark.parametrize('agent_type', (Circular, ThreeCircle))
+def test_agent_group_array(agent_type):
+    array = agent_group_array(agent_type, 1000, column_attributes())
+    assert array.dtype == agent_type.dtype()
+    assert len(array) == 1000
+
+    # Truncated normal distribution of adult radius 0.255 +- 0.035
+    radius = array['radius']
+    assert np.all((0.22 <= radius) & (radius <= 0.29))
+    assert np.allclose(array['r_t'], 0.5882 * radius)
+    assert np.allclose(array['r_s'], 0.3725 * radius)
+    assert np.allclose(array['r_ts'], 0.6275 * radius)
+    assert np.allclose(array['inertia_rot'], 4.0 * np.pi * (
+        array['mass'] / 80.0) * (radius / 0.27) ** 2)
+    assert np.all(array['tau_adj'] == 0.4)
+    assert np.all(array['active'])
+    assert np.all(array['k_soc'] == 1.5)
+
+    # Same values as the agent types
+    agent = agent_type(body_type='adult')
+    agent.from_array(array[:1])
+    assert np.array_equal(np.array(agent), array[:1])
+
+
+def test_agent_group_array_invalid():
+    with pytest.raises(TraitError):
+        agent_group_array(Circular, 10, {'mass': -1.0}, validate=True)
+
+
+@pytest.mark.parametrize('agent_type', (Circular, ThreeCircle))
+def test_agents_from_columns(agent_type):
+    agents = Agents(agent_type=agent_type)
+    group = AgentGroup(size=SIZE, agent_type=agent_type,
+                       attributes=column_attributes(), validate=True)
+    assert group.members == []
+    agents.add_non_overlapping_group(
+        group=group,
+        position_gen=lambda: np.random.uniform(XMIN, XMAX, 2))
+    array = agents.array[:agents.index]
+    assert np.all((XMIN <= array['position']) & (array['position'] <= XMAX))
+    if agent_type is ThreeCircle:
+        offset = array['position_rs'] - array['position']
+        assert np.allclose(np.hypot(offset[:, 0], offset[:, 1]),
+                           array['r_ts'])
+    for i, agent in enumerate(array):
+        others = np.delete(array, i)
+        if agent_type is Circular:
+            assert not overlapping_circles(others, agent['position'],
+                                           agent['radius'])
+
+
+@pytest.mark.parametrize('agent_type', (Circular, ThreeCircle))
+def test_add_packed_group(agent_type):
+    geom = Polygon([(0.0, 0.0), (0.0, 6.0), (6.0, 6.0), (6.0, 4.0),
+                    (2.0, 4.0), (2.0, 2.0), (6.0, 2.0), (6.0, 0.0)])
+    size = 1000
+    agents = Agents(agent_type=agent_type)
+    group = AgentGroup(size=size, agent_type=agent_type,
+                       attributes=column_attributes())
+    placed = agents.add_packed_group(group, geom)
+    # Area is too small for the whole group
+    assert 0 < placed < size
+    assert agents.index == placed
+    assert len(agents.array) == agents.index
+    # Second group is packed around the first one. Rows of the members that
+    # do not fit must not remain in the array.
+    group = AgentGroup(size=size, agent_type=agent_type,
+                       attributes=column_attributes())
+    agents.add_packed_group(group, geom)
+    assert agents.index >= placed
+    assert len(agents.array) == agents.index
+    assert np.all(agents.array['mass'] > 0)
+    array = agents.array
+    for agent in array:
+        assert geom.buffer(1e-9).contains(
+            Point(agent['position']).buffer(agent['radius']))
+    for i, agent in enumerate(array):
+        others = np.delete(array, i)
+        if agent_type is Circular:
+            assert not overlapping_circles(others, agent['position'],
+                                           agent['radius'])
+        else:
+            assert not overlapping_three_circles(
+                others,
+                (agent['position'], agent['position_ls'],
+                 agent['position_rs']),
+                (agent['r_t'], agent['r_s'], agent['r_s']))
+
+
+@pytest.mark.parametrize('paired, radius', [(True, (0.2, 0.3)),
+                                            (False, (0.1, 0.2))])
+def test_place_paired(paired, radius):
+    members = agent_group_array(Circular, 3, {'radius': (0.1, 0.2, 0.3)})
+    agents = np.zeros(3, dtype=members.dtype)
+    spatial_hash = SpatialHash(0.6, capacity=3)
+    positions = np.array(((0.0, 0.0), (2.0, 0.0), (4.0, 0.0)))
+    # Obstacle rejects the first position
+    obstacles = geom_to_linear_obstacles(LineString(((0.0, -1.0), (0.0, 1.0))))
+    placed = place_circular(agents, 0, members, positions, spatial_hash.head,
+                            spatial_hash.successor, spatial_hash.cells,
+                            spatial_hash.cell_size, obstacles, paired)
+    assert placed == 2
+    assert np.all(agents['radius'][:2] == radius)
+    assert np.all(agents['position'][:2] == positions[1:])
@@ -0,0 +1,81 @@
+import numpy as np
+import pytest
+from shapely.geometry import Polygon, LineString, Point
+
+from crowddynamics.core.sampling import poisson_disk_sample
+from crowddynamics.examples.fields import HallwayField
+from crowddynamics.simulation.field import Field
+
+
+@pytest.mark.parametrize('jobs', (1, 2))
+def test_precompute_navigation(jobs):
+    step, radius, strength = 0.2, 0.5, 0.3
+    field = HallwayField()
+    timings = field.precompute_navigation(step, radius, strength, jobs=jobs)
+    assert len(timings) == len(field.targets) + 1
+
+    expected = HallwayField()
+    for index in range(len(field.targets)):
+        _, dmap, dir_map = field.navigation_to_target(
+            index, step, radius, strength)
+        _, dmap2, dir_map2 = expected.navigation_to_target(
+            index, step, radius, strength)
+        assert np.allclose(dmap, dmap2)
+        assert np.allclose(dir_map, dir_map2, equal_nan=True)
+
+    # Cached maps are not solved again
+    assert not field.precompute_navigation(step, radius, strength, jobs=jobs)
+
+
+def test_closest_target_labels():
+    step, radius = 0.2, 0.5
+    field = HallwayField()
+    labels = field.closest_target_labels(step, radius)
+    mgrid = field.meshgrid(step)
+    x, _ = mgrid.values
+    assert labels.shape == mgrid.shape
+    assert np.all(labels[x < 0.4 * field.width] == 0)
+    assert np.all(labels[x > 0.6 * field.width] == 1)
+
+
+def test_solve_navigation_to_target():
+    step, radius, strength = 0.2, 0.5, 0.3
+    field = HallwayField()
+    for index in range(len(field.targets)):
+        _, dmap, dir_map = field.solve_navigation_to_target(
+            index, step, radius, strength)
+        _, dmap2, dir_map2 = field.navigation_to_target(
+            index, step, radius, strength)
+        assert dir_map is not dir_map2
+        assert np.allclose(dmap, dmap2)
+        assert np.allclose(dir_map, dir_map2, equal_nan=True)
+
+
+def test_spawn_area():
+    square = Polygon([(0.0, 0.0), (0.0, 10.0), (10.0, 10.0), (10.0, 0.0)])
+    wall = LineString([(5.0, 0.0), (5.0, 10.0)])
+    field = Field(domain=square, obstacles=wall, spawns=[square],
+                  targets=[LineString([(10.0, 0.0), (10.0, 10.0)])])
+    area = field.spawn_area(0)
+    assert not area.equals(square)
+    assert len(area.geoms) == 2
+
+    radii = np.full(500, 0.3)
+    points = poisson_disk_sample(area, radii)
+    assert len(points) > 0
+    for point, radius in zip(points, radii):
+        assert wall.distance(Point(point)) >= radius
+
+
+def test_geometry_change_clears_own_cache():
+    step, radius, strength = 0.2, 0.5, 0.3
+    field, other = HallwayField(), HallwayField()
+    for f in (field, other):
+        f.navigation_to_target(0, step, radius, strength)
+    cached = other.navigation_to_target(0, step, radius, strength)
+
+    field.targets = field.targets[::-1]
+    _, _, dir_map = field.navigation_to_target(0, step, radius, strength)
+    # Maps are solved for the new targets and the other field keeps its maps
+    assert not np.allclose(dir_map, cached[2], equal_nan=True)
+    assert other.navigation_to_target(0, step, radius, strength) is cached
@@ -0,0 +1,280 @@
+import threading
+
+import numpy as np
+import pytest
+from shapely.geometry import LineString, Polygon
+
+from crowddynamics.core.evacuation import agent_closer_to_exit
+from crowddynamics.examples.simulations import Hallway, Outdoor, \
+    RoomWithOneExit
+from crowddynamics.exceptions import InvalidValue
+from crowddynamics.io import TrajectoryReader, load_columns
+from crowddynamics.simulation.agents import Agents, AgentGroup, Circular, \
+    NO_TARGET
+import crowddynamics.simulation.field as field_module
+from crowddynamics.simulation.field import Field
+from crowddynamics.simulation.logic import ClosestTarget, SaveSimulationData, \
+    DensityAccumulator, SpeedAccumulator, FlowAccumulator, FlowCounter, \
+    ExitQueue
+from crowddynamics.simulation.multiagent import MultiAgentSimulation
+
+
+def test_closest_target():
+    field = Field(
+        domain=Polygon([(0, 0), (10, 0), (10, 4), (0, 4)]),
+        # Wall above the first target that the shortest paths go around
+        obstacles=LineString([(0, 1.5), (5, 1.5)]),
+        targets=[LineString([(0, 0), (0, 1)]),
+                 LineString([(10, 0), (10, 4)])])
+    agents = Agents(agent_type=Circular)
+    group = AgentGroup(size=4, agent_type=Circular,
+                       attributes=lambda: dict(body_type='adult',
+                                               orientation=0.0,
+                                               velocity=np.zeros(2),
+                                               angular_velocity=0.0,
+                                               target_direction=np.zeros(2),
+                                               target_orientation=0.0))
+    # Second agent is closer to the first target by straight line distance
+    # but closer to the second target by the geodesic distance
+    agents.add_non_overlapping_group(
+        group, position_gen=iter([(1.0, 0.5), (4.5, 3.5), (8.0, 2.0),
+                                  (8.0, 3.0)]))
+    simulation = MultiAgentSimulation(field=field, agents=agents)
+    simulation.logic = ClosestTarget(simulation, radius=0.3)
+
+    array = simulation.agents.array
+    assert len(array) == 4
+    array['target'] = NO_TARGET
+    array['target'][3] = 0
+    simulation.update()
+    assert np.array_equal(simulation.agents.array['target'], (0, 1, 1, 0))
+
+
+def test_navigation_lazy_lru(hallway):
+    navigation = hallway.logic['Navigation']
+    navigation.memory_budget = 2 ** 40
+
+    # Maps are solved only for the targets that have agents
+    hallway.agents.array['target'] = 0
+    hallway.update()
+    assert list(navigation._maps) == [0]
+    hallway.agents.array['target'] = 1
+    hallway.update()
+    assert list(navigation._maps) == [0, 1]
+    hallway.agents.array['target'] = 0
+    hallway.update()
+    assert list(navigation._maps) == [1, 0]
+
+    nbytes = navigation._maps[1][1].nbytes
+    assert navigation.memory_usage == 2 * nbytes
+
+    # Maps of the targets with agents do not count towards the budget
+    navigation.memory_budget = nbytes
+    navigation.evict()
+    assert list(navigation._maps) == [1, 0]
+    navigation.memory_budget = 0
+    navigation.evict()
+    assert list(navigation._maps) == [0]
+    hallway.agents.array['target'] = 1
+    hallway.update()
+    assert list(navigation._maps) == [1]
+
+
+def test_navigation_budget_precomputed(hallway, monkeypatch):
+    navigation = hallway.logic['Navigation']
+    field = hallway.field
+    field.precompute_navigation(navigation.step, navigation.radius,
+                                navigation.strength, jobs=1)
+
+    def solve(*args):
+        raise AssertionError('Precomputed map was solved again.')
+
+    monkeypatch.setattr(field_module, '_shortest_path_target', solve)
+    navigation.memory_budget = 0
+    hallway.update()
+    assert set(navigation._maps) == set(
+        np.unique(hallway.agents.array['target']))
+    # Maps taken by the navigation are not kept in the field cache
+    assert not any(key[0] == 'navigation_to_target' and key[1] in
+                   navigation._maps for key in field._cache)
+
+
+def test_navigation_checkpoint(hallway, tmpdir):
+    navigation = hallway.logic['Navigation']
+    navigation.memory_budget = 2 ** 40
+    hallway.update()
+    hallway.agents.array['target'] = 0
+    hallway.update()
+    assert list(navigation._maps) == [1, 0]
+    hallway.checkpoint(str(tmpdir))
+
+    restored = Hallway()
+    restored_navigation = restored.logic['Navigation']
+    restored_navigation.memory_budget = 2 ** 40
+    restored.restore(str(tmpdir))
+    assert np.array_equal(restored_navigation.target_counts,
+                          navigation.target_counts)
+    assert list(restored_navigation._maps) == list(navigation._maps)
+    for target, (_, dir_map) in navigation._maps.items():
+        np.testing.assert_array_equal(restored_navigation._maps[target][1],
+                                      dir_map)
+
+
+def test_background_drop_keeps_data(hallway, tmpdir):
+    save = SaveSimulationData(hallway,
+                              save_condition=lambda s:
+                              s.data['iterations'] == 9,
+                              base_directory=str(tmpdir),
+                              save_directory='run', background=True,
+                              queue_size=1, queue_policy='drop')
+    save.add_to_simulation_logic()
+    # Writer falls behind until the frame when data is saved
+    event = threading.Event()
+    save.writer.submit(event.wait, block=True)
+    for _ in range(9):
+        hallway.update()
+    event.set()
+    hallway.update()
+    save.close()
+
+    assert save.writer.dropped > 0
+    assert len(TrajectoryReader(save.full_path, 'agents')) == \
+        10 - save.writer.dropped
+    data = load_columns(save.full_path, 'data')
+    assert np.array_equal(data['iterations'], np.arange(10))
+
+
+def test_grid_accumulators(hallway, tmpdir):
+    density = DensityAccumulator(hallway, cell_size=1.0, smoothing=0.5,
+                                 filepath=str(tmpdir.join('density.npz')))
+    speed = SpeedAccumulator(hallway, cell_size=1.0, interval=2)
+    flow = FlowAccumulator(hallway, cell_size=1.0)
+    for node in (density, speed, flow):
+        hallway.logic.add_children(node)
+    for _ in range(10):
+        hallway.update()
+
+    assert density.samples == 10
+    assert speed.samples == 5
+    results = density.results()
+    assert np.isclose(np.sum(results['density']),
+                      np.sum(hallway.agents.array['active']))
+    assert results['density'].shape == results['density_ema'].shape
+    assert np.all(np.isnan(speed.results()['speed']) ==
+                  (speed.sums[..., 0] == 0))
+    assert flow.results()['velocity'].shape == flow.shape + (2,)
+
+    density.close()
+    data = np.load(str(tmpdir.join('density.npz')))
+    assert np.array_equal(data['density'], results['density'])
+    assert int(data['samples']) == 10
+
+
+def test_grid_accumulator_upper_bounds(hallway):
+    density = DensityAccumulator(hallway, cell_size=1.0)
+    minx, miny, maxx, maxy = hallway.field.domain.bounds
+    agents = hallway.agents.array
+    agents['active'] = False
+    agents['active'][0] = True
+    agents['position'][0] = (maxx, maxy)
+    density.update()
+    assert density.shape == (int(maxx - minx), int(maxy - miny))
+    assert density.sums[-1, -1, 0] == 1
+    assert np.sum(density.sums) == 1
+
+
+def test_flow_counter():
+    simulation = Outdoor()
+    line = LineString(((10.0, 0.0), (10.0, 20.0)))
+    counter = FlowCounter(simulation, lines=[line], interval=10)
+    simulation.logic.add_children(counter)
+    position = np.copy(simulation.agents.array['position'])
+    positive = negative = 0
+    for _ in range(30):
+        simulation.update()
+        current = simulation.agents.array['position']
+        for p0, p1 in zip(position, current):
+            if LineString((p0, p1)).crosses(line):
+                if p1[0] < 10.0:
+                    positive += 1
+                else:
+                    negative += 1
+        position = np.copy(current)
+
+    assert simulation.data['line_0_positive'] == positive
+    assert simulation.data['line_0_negative'] == negative
+    events = counter.crossing_events()
+    assert len(events) == positive + negative
+    assert np.sum(events['sign'] > 0) == positive
+    assert simulation.data['line_0_flow'] >= 0
+
+
+def test_flow_counter_events(hallway, tmpdir):
+    lines = [LineString(((x, 0.0), (x, 5.0))) for x in range(1, 40)]
+    filepath = str(tmpdir.join('events.bin'))
+
+    def add_counters(simulation):
+        simulation.logic.add_children(FlowCounter(
+            simulation, lines=lines, filepath=filepath, buffer_size=2))
+        simulation.logic.add_children(FlowCounter(
+            simulation, name='InMemory', lines=lines, buffer_size=10 ** 6))
+
+    add_counters(hallway)
+    counter = hallway.logic['FlowCounter']
+    in_memory = hallway.logic['InMemory']
+    for _ in range(15):
+        hallway.update()
+    hallway.checkpoint(str(tmpdir.join('checkpoint')))
+    for _ in range(15):
+        hallway.update()
+    events = in_memory.crossing_events()
+    assert counter.events_written > 0
+    assert len(counter.get_state()['events']) < 2
+    assert np.array_equal(counter.crossing_events(), events)
+
+    # Events written after the checkpoint are discarded on restore
+    restored = Hallway()
+    add_counters(restored)
+    restored.restore(str(tmpdir.join('checkpoint')))
+    for _ in range(15):
+        restored.update()
+    restored.close()
+    assert np.array_equal(restored.logic['FlowCounter'].crossing_events(),
+                          events)
+    assert np.array_equal(np.fromfile(filepath, FlowCounter.event_type),
+                          events)
+
+
+def test_local_density(hallway):
+    node = hallway.logic['AgentAgentInteractions']
+    node.local_density = True
+    hallway.agents.array['active'][::2] = False
+    active = np.copy(hallway.agents.array['active'])
+    hallway.update()
+    assert node.density.shape == (len(hallway.agents.array),)
+    assert np.all(node.density[active] >=
+                  1 / (np.pi * node.density_radius ** 2))
+    assert np.all(node.density[~active] == 0)
+
+    node.local_density = False
+    hallway.update()
+    assert node.density is None
+
+    node.local_density = True
+    node.density_radius = node.cell_size
+    with pytest.raises(InvalidValue):
+        hallway.update()
+
+
+def test_exit_queue():
+    simulation = RoomWithOneExit()
+    queue = ExitQueue(simulation)
+    simulation.logic.add_children(queue)
+    for _ in range(5):
+        simulation.update()
+    agents = simulation.agents.array
+    for e, c_door in enumerate(queue.c_doors):
+        active = agents['active']
+        expected = agent_closer_to_exit(c_door, agents['position'][active])
+        assert np.array_equal(
+            queue.agents_closer_to_exit[active, e], expected)
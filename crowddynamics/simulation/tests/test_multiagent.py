@@ -0,0 +1,168 @@
+import os
+import shutil
+
+import numpy as np
+import pytest
+
+from crowddynamics.examples.simulations import Hallway, Outdoor, \
+    RoomWithOneExit, FourExitsRandomPlacing
+from crowddynamics.io import TrajectoryReader, load_columns
+from crowddynamics.simulation.logic import DensityAccumulator, \
+    SaveSimulationData
+
+
+def add_save_data(simulation, tmpdir, **kwargs):
+    """Add SaveSimulationData that saves into "run" directory of tmpdir."""
+    node = SaveSimulationData(simulation, save_condition=lambda s: False,
+                              base_directory=str(tmpdir),
+                              save_directory='run', **kwargs)
+    node.add_to_simulation_logic()
+    return node
+
+
+def exit_at(iterations):
+    def variant(simulation):
+        simulation.exit_condition = \
+            lambda s: s.data['iterations'] == iterations
+    return variant
+
+
+def test_run_closes_nodes(hallway, tmpdir):
+    add_save_data(hallway, tmpdir, chunk_size=4)
+    filepath = str(tmpdir.join('density.npz'))
+    hallway.logic.add_children(DensityAccumulator(hallway, cell_size=1.0,
+                                                  filepath=filepath))
+    hallway.exit_condition = lambda s: s.data['iterations'] == 10
+    hallway.run()
+
+    reader = TrajectoryReader(str(tmpdir.join('run')), 'agents')
+    # Frames and data are saved although save condition never flushed
+    assert len(reader) == 10
+    data = load_columns(str(tmpdir.join('run')), 'data')
+    assert np.array_equal(data['iterations'], np.arange(10))
+    with np.load(filepath) as results:
+        assert 'density' in results
+
+
+def test_run_twice_background(hallway, tmpdir):
+    save = add_save_data(hallway, tmpdir, chunk_size=4, background=True,
+                         queue_size=1)
+    hallway.exit_condition = lambda s: s.data['iterations'] == 5
+    hallway.run()
+    # Continue running after the nodes have been closed
+    hallway.exit_condition = lambda s: s.data['iterations'] == 10
+    hallway.run()
+    save.close()
+
+    assert len(TrajectoryReader(save.full_path, 'agents')) == 10
+
+
+@pytest.mark.parametrize('simulation', (Outdoor, Hallway, RoomWithOneExit,
+                                        FourExitsRandomPlacing))
+def test_checkpoint_restore(simulation, tmpdir):
+    simu = simulation()
+    for _ in range(10):
+        simu.update()
+    simu.checkpoint(str(tmpdir))
+    for _ in range(10):
+        simu.update()
+
+    restored = simulation()
+    restored.restore(str(tmpdir))
+    assert restored.data['iterations'] == 10
+    for _ in range(10):
+        restored.update()
+    assert restored.data == simu.data
+    assert np.array_equal(restored.agents.array, simu.agents.array)
+
+
+def test_checkpoint_automatic(hallway, tmpdir):
+    save = add_save_data(hallway, tmpdir, checkpoint_interval=3)
+    for _ in range(7):
+        hallway.update()
+    checkpoint = os.path.join(save.full_path, 'checkpoint')
+    # Checkpoint of the iteration 6 was copied before it is overwritten
+    shutil.copytree(checkpoint, str(tmpdir.join('copy')))
+    # Stale directory from an interrupted checkpoint
+    os.makedirs(checkpoint + '.old')
+    for _ in range(5):
+        hallway.update()
+    assert not os.path.exists(checkpoint + '.old')
+
+    restored = Hallway()
+    add_save_data(restored, tmpdir.join('restored'), checkpoint_interval=3)
+    restored.restore(str(tmpdir.join('copy')))
+    assert restored.data['iterations'] == 6
+    restored.update()
+    assert not os.path.exists(
+        str(tmpdir.join('restored', 'run', 'checkpoint')))
+    for _ in range(5):
+        restored.update()
+    assert restored.data == hallway.data
+    assert np.array_equal(restored.agents.array, hallway.agents.array)
+
+
+def test_fork(hallway):
+    for _ in range(5):
+        hallway.update()
+    agents = np.copy(hallway.agents.array)
+
+    def run(simulation):
+        simulation.run()
+        return simulation.data['iterations'], simulation.agents.array
+
+    results = hallway.fork(
+        [exit_at(10), exit_at(15), exit_at(15), exit_at(15)],
+        run=run, seeds=[1, 2, 2, 3], processes=2)
+    assert [iterations for iterations, _ in results] == [10, 15, 15, 15]
+    assert np.array_equal(results[1][1], results[2][1])
+    # Different seeds give different fluctuation after the fork
+    assert not np.array_equal(results[2][1]['position'],
+                              results[3][1]['position'])
+    assert hallway.data['iterations'] == 5
+    assert np.array_equal(hallway.agents.array, agents)
+
+
+def test_fork_change_targets(hallway):
+    for _ in range(5):
+        hallway.update()
+    assert hallway.logic['Navigation']._maps
+
+    def swap_targets(simulation):
+        # Same simulation with the order of the targets swapped
+        exit_at(10)(simulation)
+        simulation.field.targets = simulation.field.targets[::-1]
+        target = simulation.agents.array['target']
+        target[target >= 0] = 1 - target[target >= 0]
+
+    def run(simulation):
+        simulation.run()
+        return simulation.agents.array
+
+    original, swapped = hallway.fork([exit_at(10), swap_targets], run=run,
+                                     seeds=[1, 1])
+    assert np.array_equal(original['position'], swapped['position'])
+    assert not np.array_equal(original['target'], swapped['target'])
+
+
+@pytest.mark.parametrize('background', (False, True))
+def test_fork_save(hallway, tmpdir, background):
+    add_save_data(hallway, tmpdir, chunk_size=4, background=background)
+    filepath = str(tmpdir.join('density.npz'))
+    hallway.logic.add_children(DensityAccumulator(
+        hallway, cell_size=1.0, filepath=filepath))
+    for _ in range(5):
+        hallway.update()
+
+    hallway.fork([exit_at(8), exit_at(10)], seeds=[1, 2], processes=2)
+    for index, frames in enumerate((3, 5)):
+        directory = str(tmpdir.join('run', 'variant_{}'.format(index)))
+        assert len(TrajectoryReader(directory, 'agents')) == frames
+        assert os.path.exists(
+            str(tmpdir.join('density_variant_{}.npz'.format(index))))
+
+    # Files of the original simulation are not touched by the variants
+    assert not os.path.exists(filepath)
+    hallway.update()
+    hallway.close()
+    assert len(TrajectoryReader(str(tmpdir.join('run')), 'agents')) == 6
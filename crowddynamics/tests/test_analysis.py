@@ -0,0 +1,95 @@
+import tempfile
+from collections import OrderedDict
+
+import numpy as np
+import pytest
+from shapely.geometry import Polygon, box
+
+from crowddynamics.analysis import analyse, count_in_regions, \
+    density_voronoi, line_crossing, mean_speed, REDUCERS
+from crowddynamics.io import TrajectoryStore, load_columns
+
+dtype = np.dtype([('position', np.float64, 2), ('velocity', np.float64, 2),
+                  ('active', np.bool_)])
+
+
+@pytest.fixture(scope='module')
+def trajectory():
+    # Agents move along x-axis from x=0 to x=2.9 and one agent stops at 1.5
+    frames = np.zeros((30, 4), dtype=dtype)
+    frames['active'] = True
+    frames['velocity'][:, :, 0] = 1.0
+    frames['position'][:, :, 0] = 0.1 * np.arange(30)[:, None]
+    frames['position'][:, :, 1] = np.arange(4) + 0.5
+    frames['active'][16:, 3] = False
+    with tempfile.TemporaryDirectory() as tmpdir:
+        with TrajectoryStore(tmpdir, 'agents', chunk_size=7,
+                             compression='zlib') as store:
+            for time, frame in enumerate(frames):
+                store.append(frame, 0.1 * time)
+        yield tmpdir, frames
+
+
+def test_reducers():
+    frame = np.zeros(3, dtype=dtype)
+    frame['active'] = True, True, False
+    frame['position'] = (0.5, 0.5), (1.5, 0.5), (0.5, 0.6)
+    frame['velocity'] = (1.0, 0.0), (0.0, 3.0), (5.0, 0.0)
+    assert count_in_regions(frame, None, [box(0, 0, 1, 1), box(1, 0, 2, 1)]) \
+        == OrderedDict([('0', 1), ('1', 1)])
+    assert mean_speed(frame, None) == 2.0
+    assert mean_speed(frame, None, box(1, 0, 2, 1)) == 3.0
+
+    previous = np.copy(frame)
+    frame['position'][:, 0] += 0.5
+    line = ((1.0, 0.0), (1.0, 1.0))
+    assert line_crossing(frame, previous, line) == \
+        OrderedDict([('positive', 0), ('negative', 1)])
+    assert line_crossing(previous, frame, line) == \
+        OrderedDict([('positive', 1), ('negative', 0)])
+    assert line_crossing(frame, previous, ((1.0, 0.6), (1.0, 1.0))) == \
+        OrderedDict([('positive', 0), ('negative', 0)])
+
+
+def test_density_voronoi():
+    # Agents on a regular grid have Voronoi cells of area 1
+    x, y = np.meshgrid(np.arange(10) + 0.5, np.arange(10) + 0.5)
+    frame = np.zeros(100, dtype=dtype)
+    frame['active'] = True
+    frame['position'] = np.stack((x.ravel(), y.ravel()), axis=1)
+    region = Polygon(((2, 2), (2, 6), (6, 6), (6, 2)))
+    assert np.isclose(density_voronoi(frame, None, region), 1.0)
+
+
+@pytest.mark.parametrize('processes, frames_per_task', [
+    (1, None), (2, None), (2, 4)])
+def test_analyse(trajectory, processes, frames_per_task):
+    tmpdir, frames = trajectory
+    reducers = OrderedDict([
+        ('active', ('active', {})),
+        ('count', ('count', {'regions': [box(0, 0, 1, 5), box(1, 0, 2, 5)]})),
+        ('flow', ('line_crossing', {'line': ((1.0, 0.0), (1.0, 5.0))})),
+        ('speed', ('mean_speed', {})),
+    ])
+    with tempfile.TemporaryDirectory() as output:
+        results = analyse(tmpdir, reducers, output=output,
+                          processes=processes, frames_per_task=frames_per_task)
+        assert list(results.keys()) == [
+            'frame', 'time', 'active', 'count_0', 'count_1', 'flow_positive',
+            'flow_negative', 'speed']
+        assert np.all(results['frame'] == np.arange(len(frames)))
+        assert np.allclose(results['time'], 0.1 * np.arange(len(frames)))
+        assert np.all(results['active'] == frames['active'].sum(axis=1))
+        assert np.all(results['count_0'][1:10] == 4)
+        assert np.sum(results['flow_negative']) == 4
+        assert np.sum(results['flow_positive']) == 0
+        assert np.allclose(results['speed'], 1.0)
+
+        columns = load_columns(output, 'analysis')
+        for key, values in results.items():
+            assert np.all(columns[key] == values)
+
+
+def test_registry():
+    assert set(REDUCERS) >= {'active', 'count', 'mean_speed',
+                             'density_voronoi', 'line_crossing'}
@@ -1,10 +1,16 @@
+import json
 import tempfile
+import threading
+from collections import OrderedDict
 import pytest
 
 import numpy as np
 import os
 
-from crowddynamics.io import save_npy, load_npy, load_npy_concatenated
+from crowddynamics.io import save_npy, load_npy, load_npy_concatenated, \
+    TrajectoryStore, load_manifest, FrameEncoder, BackgroundWriter, \
+    TrajectoryReader, concatenate_npy, encode_block, decode_block, \
+    save_columns, load_columns, columns_to_csv
 
 
 @pytest.mark.skip
@@ -37,3 +43,252 @@ def test_io():
 
         assert np.all(load_npy_concatenated(tmpdir, basename) ==
                       np.vstack((concatenated, concatenated)))
+
+
+@pytest.mark.parametrize('chunk_size', (1, 3, 10))
+def test_trajectory_store(chunk_size):
+    basename = 'agents'
+    dtype = np.dtype([('position', np.float64, 2), ('active', np.bool_)])
+    frames = np.zeros((7, 5), dtype=dtype)
+    frames['position'] = np.random.uniform(size=(7, 5, 2))
+    frames['active'] = np.random.uniform(size=(7, 5)) < 0.5
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        with TrajectoryStore(tmpdir, basename, chunk_size) as store:
+            for time, frame in enumerate(frames):
+                store.append(frame, 0.1 * time)
+            assert len(store) == len(frames)
+
+        manifest = load_manifest(tmpdir, basename)
+        assert manifest['frames'] == len(frames)
+        assert len(manifest['chunks']) == -(-len(frames) // chunk_size)
+
+        for chunk in manifest['chunks']:
+            data = np.load(os.path.join(tmpdir, chunk['filename']))
+            start, count = chunk['start'], chunk['count']
+            assert data.shape == (chunk_size, 5)
+            assert np.all(data[:count] == frames[start:start + count])
+            time = np.load(os.path.join(tmpdir, chunk['time_filename']))
+            assert np.allclose(time, 0.1 * np.arange(start, start + count))
+
+
+def test_trajectory_store_manifest_times():
+    # Manifest contains the times of the current chunk only
+    frame = np.zeros(5)
+    with tempfile.TemporaryDirectory() as tmpdir:
+        with TrajectoryStore(tmpdir, 'agents', chunk_size=3) as store:
+            for time in range(7):
+                store.append(frame, time)
+                store.flush()
+                chunks = load_manifest(tmpdir, 'agents')['chunks']
+                assert all('time' not in chunk for chunk in chunks[:-1])
+                assert chunks[-1]['time'] == list(range(time // 3 * 3,
+                                                        time + 1))
+            store.append(frame)
+        np.testing.assert_array_equal(TrajectoryReader(tmpdir, 'agents').time,
+                                      list(range(7)) + [np.nan])
+
+
+def test_frame_encoder():
+    dtype = np.dtype([('position', np.float64, 2), ('velocity', np.float64, 2),
+                      ('mass', np.float64), ('active', np.bool_)])
+    frame = np.zeros(10, dtype=dtype)
+    frame['position'] = np.random.uniform(-5.0, 15.0, size=(10, 2))
+    frame['velocity'] = np.random.uniform(-1.0, 1.0, size=(10, 2))
+    frame['active'] = np.random.uniform(size=10) < 0.5
+
+    encoder = FrameEncoder(dtype, ['position', 'velocity', 'active'],
+                           {'position': 'int16', 'velocity': 'float16'},
+                           {'position': ((-5.0, -5.0), (15.0, 15.0))})
+    assert encoder.dtype.itemsize == 2 * 2 + 2 * 2 + 1
+    encoder = FrameEncoder.from_dict(
+        json.loads(json.dumps(encoder.to_dict())))
+
+    decoded = encoder.decode(encoder.encode(frame))
+    assert decoded.dtype.names == ('position', 'velocity', 'active')
+    assert np.allclose(decoded['position'], frame['position'],
+                       atol=20.0 / 65535)
+    assert np.allclose(decoded['velocity'], frame['velocity'], atol=1e-3)
+    assert np.all(decoded['active'] == frame['active'])
+
+
+@pytest.mark.parametrize('fields, encodings, bounds', [
+    (['position'], {'velocity': 'float32'}, None),
+    (['position'], {'position': 'float8'}, None),
+    (['position'], {'position': 'int16'}, None),
+    (['active'], {'active': 'float16'}, None),
+])
+def test_frame_encoder_invalid(fields, encodings, bounds):
+    dtype = np.dtype([('position', np.float64, 2), ('active', np.bool_)])
+    with pytest.raises(ValueError):
+        FrameEncoder(dtype, fields, encodings, bounds)
+
+
+def test_background_writer_block():
+    results = []
+    writer = BackgroundWriter(maxsize=2, policy='block')
+    for i in range(100):
+        assert writer.submit(results.append, i)
+    writer.close()
+    assert results == list(range(100))
+    assert writer.dropped == 0
+
+
+def test_background_writer_drop():
+    results = []
+    event = threading.Event()
+    writer = BackgroundWriter(maxsize=2, policy='drop')
+    writer.submit(event.wait)
+    submitted = [writer.submit(results.append, i) for i in range(10)]
+    assert writer.submit(results.append, 10, block=False) is False
+    event.set()
+    writer.submit(results.append, 11, block=True)
+    writer.close()
+    assert writer.dropped == submitted.count(False) + 1
+    assert results == [i for i, ok in enumerate(submitted) if ok] + [11]
+
+
+def test_background_writer_error():
+    def error():
+        raise ValueError
+
+    writer = BackgroundWriter()
+    writer.submit(error)
+    with pytest.raises(ValueError):
+        writer.join()
+    writer.close()
+
+
+@pytest.fixture(scope='module', params=(None, 'zlib', 'lzma'))
+def trajectory(request):
+    dtype = np.dtype([('position', np.float64, 2), ('active', np.bool_)])
+    frames = np.zeros((23, 5), dtype=dtype)
+    frames['position'] = np.random.uniform(size=(23, 5, 2))
+    frames['active'] = np.random.uniform(size=(23, 5)) < 0.5
+    with tempfile.TemporaryDirectory() as tmpdir:
+        with TrajectoryStore(tmpdir, 'agents', chunk_size=10,
+                             compression=request.param,
+                             keyframe_interval=4) as store:
+            for time, frame in enumerate(frames):
+                store.append(frame, 0.1 * time)
+                if time == 5:
+                    # Flush in the middle of a block
+                    store.flush()
+        yield tmpdir, frames, request.param
+
+
+def test_trajectory_reader(trajectory):
+    tmpdir, frames, compression = trajectory
+    reader = TrajectoryReader(tmpdir, 'agents')
+    assert len(reader) == len(frames)
+
+    for t in (0, 9, 10, 22, -1):
+        assert np.all(reader.frames[t] == frames[t])
+    assert np.all(reader.frames[3:7] == frames[3:7])
+    if compression is None:
+        assert isinstance(reader.frames[3:7], np.memmap)
+    assert np.all(reader.frames[5:21] == frames[5:21])
+    assert len(reader.frames[5:5]) == 0
+    assert np.all(reader.agents[2][8:13] == frames[8:13, 2])
+    assert np.all(reader.column('position')[12] == frames[12]['position'])
+
+    assert reader.frame_at(0.0) == 0
+    assert reader.frame_at(1.05) == 10
+    assert reader.frame_at(100.0) == len(frames) - 1
+    with pytest.raises(IndexError):
+        reader.frame_at(-1.0)
+    with pytest.raises(IndexError):
+        reader.frames[len(frames)]
+
+
+def test_trajectory_reader_empty():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        TrajectoryStore(tmpdir, 'agents').close()
+        reader = TrajectoryReader(tmpdir, 'agents')
+        assert len(reader) == 0
+        assert len(reader.frames[:]) == 0
+        assert len(reader.column('position')[0:0]) == 0
+        with pytest.raises(IndexError):
+            reader.frames[0]
+        with pytest.raises(IndexError):
+            reader.frame_at(0.0)
+
+
+def test_concatenate_npy(trajectory):
+    tmpdir, frames, _ = trajectory
+    filepath = os.path.join(tmpdir, 'concatenated.npy')
+    assert concatenate_npy(tmpdir, 'agents', filepath) == len(frames)
+    assert np.all(np.load(filepath) == frames)
+
+
+def test_concatenate_npy_legacy():
+    data = np.random.uniform(size=(3, 4))
+    with tempfile.TemporaryDirectory() as tmpdir:
+        storage = save_npy(tmpdir, 'basename')
+        storage.send(None)
+        for dump in (False, True, False, True):
+            storage.send(data)
+            storage.send(dump)
+        filepath = os.path.join(tmpdir, 'out', 'concatenated.npy')
+        os.makedirs(os.path.dirname(filepath))
+        concatenate_npy(tmpdir, 'basename', filepath)
+        assert np.all(np.load(filepath) == load_npy_concatenated(
+            tmpdir, 'basename'))
+
+
+@pytest.mark.parametrize('compression', ('zlib', 'lzma'))
+@pytest.mark.parametrize('dtype', (
+    np.dtype([('position', np.int16, 2), ('velocity', np.float16, 2),
+              ('active', np.bool_), ('target', np.int64)]),
+    np.dtype(np.float64),
+))
+def test_encode_block(compression, dtype):
+    frames = np.zeros((7, 11), dtype=dtype)
+    for column in ([frames] if dtype.names is None else
+                   (frames[name] for name in dtype.names)):
+        column[...] = np.random.uniform(-1000, 1000, size=column.shape)
+    data = encode_block(frames, compression)
+    decoded = decode_block(data, dtype, frames.shape, compression)
+    assert decoded.tobytes() == frames.tobytes()
+
+
+def test_save_columns():
+    rows = [OrderedDict([('iterations', i), ('time_tot', 0.1 * i),
+                         ('inactive', np.int64(i // 2)), ('done', i > 5)])
+            for i in range(10)]
+    with tempfile.TemporaryDirectory() as tmpdir:
+        storage = save_columns(tmpdir, 'data', buffer_size=3)
+        storage.send(None)
+        for i, row in enumerate(rows):
+            storage.send(row)
+            storage.send(i == 4)
+
+        # Rows are written when buffer is full or dump is requested
+        columns = load_columns(tmpdir, 'data')
+        assert list(columns.keys()) == list(rows[0].keys())
+        assert len(columns['iterations']) == 8
+        assert columns['iterations'].dtype == np.int64
+        assert columns['done'].dtype == np.bool_
+
+        # True instead of a row dumps the remaining rows
+        storage.send(True)
+        assert len(load_columns(tmpdir, 'data')['iterations']) == 10
+
+        storage.send(rows[0])
+        storage.send(True)
+        columns = load_columns(tmpdir, 'data')
+        assert np.all(columns['iterations'] ==
+                      [row['iterations'] for row in rows + rows[:1]])
+        assert np.allclose(columns['time_tot'],
+                           [row['time_tot'] for row in rows + rows[:1]])
+
+        filepath = os.path.join(tmpdir, 'data.csv')
+        columns_to_csv(tmpdir, 'data', filepath)
+        with open(filepath) as fp:
+            lines = fp.read().splitlines()
+        assert lines[0] == 'iterations,time_tot,inactive,done'
+        assert lines[1] == '0,0.0,0,False'
+        assert len(lines) == 12
+
+        with pytest.raises(ValueError):
+            storage.send({'iterations': 0})
@@ -0,0 +1,72 @@
+import numpy as np
+import pytest
+
+from crowddynamics.examples.simulations import Hallway, Outdoor, \
+    RoomWithOneExit
+from crowddynamics.io import FrameEncoder, encode_block, decode_block
+
+KEYFRAME_INTERVAL = 10
+
+
+def simulate_frames(simulation_cls, iterations=100):
+    simulation = simulation_cls()
+    frames = []
+    for _ in range(iterations):
+        simulation.update()
+        frames.append(np.copy(simulation.agents.array))
+    minx, miny, maxx, maxy = simulation.field.domain.bounds
+    return np.array(frames), ((minx, miny), (maxx, maxy))
+
+
+@pytest.fixture(scope='module', params=(Hallway, Outdoor, RoomWithOneExit))
+def frames(request):
+    return simulate_frames(request.param)
+
+
+def encoded_frames(frames, encoding):
+    frames, bounds = frames
+    fields = ['position', 'velocity', 'target_direction', 'active']
+    if encoding == 'float64':
+        encoder = FrameEncoder(frames.dtype, fields)
+    else:
+        encoder = FrameEncoder(frames.dtype, fields,
+                               {'position': 'int16', 'velocity': 'float16',
+                                'target_direction': 'float16'},
+                               {'position': bounds})
+    return encoder.encode(frames)
+
+
+def blocks(frames):
+    return [frames[i:i + KEYFRAME_INTERVAL]
+            for i in range(0, len(frames), KEYFRAME_INTERVAL)]
+
+
+@pytest.mark.parametrize('encoding', ('float64', 'quantised'))
+@pytest.mark.parametrize('compression', ('zlib', 'lzma'))
+def test_encode_block(benchmark, frames, compression, encoding):
+    encoded = encoded_frames(frames, encoding)
+
+    def f():
+        return [encode_block(block, compression) for block in blocks(encoded)]
+
+    data = benchmark(f)
+    size = sum(map(len, data))
+    benchmark.extra_info['ratio'] = encoded.nbytes / size
+    benchmark.extra_info['MB/s'] = \
+        encoded.nbytes / 1e6 / benchmark.stats.stats.mean
+    assert True
+
+
+@pytest.mark.parametrize('encoding', ('float64', 'quantised'))
+@pytest.mark.parametrize('compression', ('zlib', 'lzma'))
+def test_decode_block(benchmark, frames, compression, encoding):
+    encoded = encoded_frames(frames, encoding)
+    data = [(encode_block(block, compression), block.shape)
+            for block in blocks(encoded)]
+
+    def f():
+        return [decode_block(d, encoded.dtype, shape, compression)
+                for d, shape in data]
+
+    decoded = benchmark(f)
+    assert np.concatenate(decoded).tobytes() == encoded.tobytes()
@@ -150,12 +150,15 @@ def add_direction_map(fig: Figure, mgrid, direction_map, freq=2, **kwargs):
     Args:
         fig: 
         mgrid: 
-        direction_map: 
+        direction_map (DirectionMap|CompactDirectionMap):
         **kwargs: 
         
     """
     X, Y = mgrid.values
-    U, V = direction_map
+    if isinstance(direction_map, np.ndarray) and direction_map.ndim == 3:
+        U, V = direction_map[..., 0], direction_map[..., 1]
+    else:
+        U, V = direction_map
 
     x0 = X[::freq, ::freq].flatten()
     y0 = Y[::freq, ::freq].flatten()